@@ -0,0 +1,782 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from basic_classes import *
+
+
+def build_school(database, students, batches=10):
+    """
+    Fill the database with a synthetic school.
+    :param database: Database to fill
+    :param students: Number of students
+    :param batches: Number of batches the students are spread over
+    :return:
+    """
+    for i in range(batches):
+        batch = Batch(f'batch{i}')
+        batch.add_subject(Subject('Math'))
+        database.add_batch(batch)
+    for i in range(students):
+        database.add_student(Student(f'student{i}', 'password', 'John', 'Doe', database.get_batch(f'batch{i % batches}'),
+                                     1000 + i, i, 1234567890), status=i % 2 == 0)
+
+
+def benchmark_save_latency(sizes=(1000, 5000, 20000), saves=200):
+    """
+    Average latency of one update_student() + save() with full snapshots, with the journal and with SQLite.
+    """
+    configurations = {'snapshot': {}, 'journal': {'journal': True}, 'sqlite': {'backend': 'sqlite'}}
+    print(f"{'students':>10}" + "".join(f"{name + ' (ms)':>15}" for name in configurations))
+    for size in sizes:
+        timings = []
+        for options in configurations.values():
+            with tempfile.TemporaryDirectory() as directory:
+                database = Database(os.path.join(directory, 'bench.bin'), **options)
+                build_school(database, size)
+                database.checkpoint()
+                start = time.perf_counter()
+                for i in range(saves):
+                    database.update_student(f'student{i % size}', fee=2000 + i)
+                    database.save()
+                timings.append((time.perf_counter() - start) / saves * 1000)
+        print(f"{size:>10}" + "".join(f"{timing:>15.3f}" for timing in timings))
+
+
+def benchmark_load_time(sizes=(5000, 20000, 50000)):
+    """
+    Time to load the database and serve the first get_student(), pickle snapshot vs columnar snapshot.
+    """
+    print(f"{'students':>10} {'pickle (ms)':>15} {'columnar (ms)':>15}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            pickle_file = os.path.join(directory, 'bench.bin')
+            columnar_file = os.path.join(directory, 'bench.col')
+            database = Database(pickle_file)
+            build_school(database, size)
+            database.save()
+            Database.convert_to_columnar(pickle_file, columnar_file)
+            timings = []
+            for file in (pickle_file, columnar_file):
+                start = time.perf_counter()
+                Database(file).get_student(f'student{size // 2}')
+                timings.append((time.perf_counter() - start) * 1000)
+        print(f"{size:>10} {timings[0]:>15.3f} {timings[1]:>15.3f}")
+
+
+def benchmark_group_commit(students=5000, signups=200, threads=20, window=0.01):
+    """
+    Concurrent signups (add_student + blocking save) with synchronous saves and with the background saver.
+    """
+    import threading
+
+    print(f"{'saver':>12} {'signups/s':>12} {'flushes':>10} {'mean batch':>12}")
+    for save_window in (None, window):
+        with tempfile.TemporaryDirectory() as directory:
+            database = Database(os.path.join(directory, 'bench.bin'), save_window=save_window)
+            build_school(database, students)
+            database.save()
+
+            def signup(worker):
+                for i in range(worker, signups, threads):
+                    database.add_student(Student(f'new{i}', 'password', 'John', 'Doe', database.get_batch('batch0'),
+                                                 1000, i, 1))
+                    database.save()
+
+            workers = [threading.Thread(target=signup, args=(worker,)) for worker in range(threads)]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - start
+            metrics = database.save_metrics()
+            database.close()
+        name = 'background' if save_window else 'synchronous'
+        print(f"{name:>12} {signups / elapsed:>12.1f} {metrics.get('flushes', signups):>10} "
+              f"{metrics.get('mean_batch_size', 1):>12.1f}")
+
+
+def benchmark_sharded_save(sizes=(5000, 20000), batches=50, saves=50):
+    """
+    Average latency of one update_student() + save() touching one batch, full pickle snapshot vs sharded snapshot,
+    and time to load the database and serve the first get_student().
+    """
+    print(f"{'students':>10} {'pickle save (ms)':>18} {'sharded save (ms)':>18} {'pickle load (ms)':>18} "
+          f"{'sharded load (ms)':>18}")
+    for size in sizes:
+        saves_ms, loads_ms = [], []
+        for snapshot_format in ('pickle', 'sharded'):
+            with tempfile.TemporaryDirectory() as directory:
+                file = os.path.join(directory, 'bench.bin')
+                database = Database(file, snapshot_format=snapshot_format)
+                build_school(database, size, batches)
+                database.save()
+                start = time.perf_counter()
+                for i in range(saves):
+                    database.update_student('student0', fee=2000 + i)
+                    database.save()
+                saves_ms.append((time.perf_counter() - start) / saves * 1000)
+                start = time.perf_counter()
+                Database(file, snapshot_format=snapshot_format).get_student(f'student{size // 2}')
+                loads_ms.append((time.perf_counter() - start) * 1000)
+        print(f"{size:>10} {saves_ms[0]:>18.3f} {saves_ms[1]:>18.3f} {loads_ms[0]:>18.3f} {loads_ms[1]:>18.3f}")
+
+
+def benchmark_concurrent_readers(students=5000, readers=16, writers=2, duration=3.0):
+    """
+    Reader threads (get_all_students + get_total_fees) and writer threads (update_student, add/remove_student +
+    save) running together, without and with mvcc. Reports operations per second and reader errors.
+    """
+    import threading
+
+    print(f"{'mode':>8} {'reads/s':>10} {'writes/s':>10} {'saves/s':>10} {'read errors':>12}")
+    for mvcc in (False, True):
+        with tempfile.TemporaryDirectory() as directory:
+            database = Database(os.path.join(directory, 'bench.bin'), mvcc=mvcc)
+            build_school(database, students)
+            database.save()
+            stop = threading.Event()
+            counts = {'reads': 0, 'writes': 0, 'saves': 0, 'errors': 0}
+
+            def read():
+                reads = errors = 0
+                while not stop.is_set():
+                    try:
+                        database.get_all_students()
+                        database.get_total_fees()
+                        reads += 1
+                    except RuntimeError:  # Table changed size during iteration
+                        errors += 1
+                counts['reads'] += reads
+                counts['errors'] += errors
+
+            def write(worker):
+                writes = saves = 0
+                while not stop.is_set():
+                    username = f'extra{worker}-{writes}'
+                    database.add_student(Student(username, 'password', 'John', 'Doe', database.get_batch('batch0'),
+                                                 1000, writes, 1))
+                    database.update_student(f'student{writes % students}', fee=2000 + writes)
+                    database.remove_student(username)
+                    writes += 3
+                    if writes % 30 == 0:
+                        database.save()
+                        saves += 1
+                counts['writes'] += writes
+                counts['saves'] += saves
+
+            threads = [threading.Thread(target=read) for _ in range(readers)]
+            threads += [threading.Thread(target=write, args=(worker,)) for worker in range(writers)]
+            for thread in threads:
+                thread.start()
+            time.sleep(duration)
+            stop.set()
+            for thread in threads:
+                thread.join()
+        print(f"{'mvcc' if mvcc else 'plain':>8} {counts['reads'] / duration:>10.1f} "
+              f"{counts['writes'] / duration:>10.1f} {counts['saves'] / duration:>10.1f} {counts['errors']:>12}")
+
+
+def benchmark_mvcc_writes(sizes=(5000, 50000), writes=1000):
+    """
+    Time of add_student and update_student calls without and with mvcc: each write publishes a read view, which
+    records the changed entries instead of copying the tables.
+    """
+    print(f"{'students':>10} {'mode':>8} {'adds (ms)':>12} {'updates (ms)':>14}")
+    for size in sizes:
+        for mvcc in (False, True):
+            with tempfile.TemporaryDirectory() as directory:
+                database = Database(os.path.join(directory, 'bench.bin'), mvcc=mvcc)
+                build_school(database, size)
+                database.get_all_students()  # Builds the indexes
+                start = time.perf_counter()
+                for i in range(writes):
+                    database.add_student(Student(f'extra{i}', 'password', 'John', 'Doe',
+                                                 database.get_batch(f'batch{i % 10}'), 1000, i, 1))
+                adds = time.perf_counter() - start
+                start = time.perf_counter()
+                for i in range(writes):
+                    database.update_student(f'student{i}', fee=2000 + i, status=True)
+                updates = time.perf_counter() - start
+            print(f"{size:>10} {'mvcc' if mvcc else 'plain':>8} {adds * 1000:>12.1f} {updates * 1000:>14.1f}")
+
+
+def benchmark_dashboard(sizes=(1000, 20000, 100000), repeats=100):
+    """
+    Time of the eight admin dashboard aggregate calls, with the maintained counters, against one full
+    recount of the tables (what every call used to cost).
+    """
+    print(f"{'students':>10} {'dashboard (ms)':>16} {'recount (ms)':>14}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            database = Database(os.path.join(directory, 'bench.bin'))
+            build_school(database, size)
+            start = time.perf_counter()
+            for _ in range(repeats):
+                for status in (True, False):
+                    database.get_teacher_count(status=status)
+                    database.get_student_count(status=status)
+                    database.get_total_salary(status=status)
+                    database.get_total_fees(status=status)
+            dashboard = (time.perf_counter() - start) / repeats * 1000
+            start = time.perf_counter()
+            database.verify_totals()
+            recount = (time.perf_counter() - start) * 1000
+        print(f"{size:>10} {dashboard:>16.4f} {recount:>14.3f}")
+
+
+def benchmark_batch_breakdown(sizes=(10000, 100000), batches=50, repeats=20):
+    """
+    Time of get_fees_by_batch() + get_student_count_by_batch() (approved and pending), Python scan against the
+    NumPy columns (columns=True), and the cost of one add/update/remove with the columns kept in sync.
+    """
+    print(f"{'students':>10} {'python (ms)':>12} {'numpy (ms)':>12} {'write python (ms)':>18} "
+          f"{'write numpy (ms)':>17}")
+    for size in sizes:
+        reads, writes = [], []
+        for columns in (False, True):
+            with tempfile.TemporaryDirectory() as directory:
+                database = Database(os.path.join(directory, 'bench.bin'), columns=columns)
+                build_school(database, size, batches)
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    for status in (True, False):
+                        database.get_fees_by_batch(status)
+                        database.get_student_count_by_batch(status)
+                reads.append((time.perf_counter() - start) / repeats * 1000)
+                start = time.perf_counter()
+                for i in range(1000):
+                    database.add_student(Student(f'extra{i}', 'password', 'John', 'Doe', database.get_batch('batch0'),
+                                                 1000, i, 1))
+                    database.update_student(f'extra{i}', fee=2000, status=True)
+                    database.remove_student(f'extra{i}')
+                writes.append((time.perf_counter() - start) / 1000 * 1000)
+        print(f"{size:>10} {reads[0]:>12.3f} {reads[1]:>12.3f} {writes[0]:>18.4f} {writes[1]:>17.4f}")
+
+
+def benchmark_attendance(sizes=(10000, 50000), batches=50, days=200):
+    """
+    Marking a school year of whole-class attendance and computing the daily and per-student totals, a dict of
+    dates per student (what Student used to keep) against the per-batch bitsets of AttendanceStore. Also reports
+    the memory held by the attendance (tracemalloc, measured in a separate run).
+    """
+    import datetime
+    import tracemalloc
+
+    def mark(store, rosters, dates):
+        if store == 'dict':
+            attendance = [{username: {} for username in roster} for roster in rosters]
+            for day in dates:
+                for batch, roster in zip(attendance, rosters):
+                    for i, username in enumerate(roster):
+                        batch[username][day] = (i + day.day) % 7 != 0
+        else:
+            attendance = [AttendanceStore() for _ in rosters]
+            for day in dates:
+                for batch, roster in zip(attendance, rosters):
+                    batch.mark_many(day, {username: (i + day.day) % 7 != 0 for i, username in enumerate(roster)})
+        return attendance
+
+    print(f"{'students':>10} {'store':>8} {'mark (ms)':>12} {'day totals (ms)':>16} {'student totals (ms)':>20} "
+          f"{'memory (MB)':>12}")
+    for size in sizes:
+        rosters = [[f'student{i}' for i in range(batch, size, batches)] for batch in range(batches)]
+        dates = [datetime.date(2024, 1, 1) + datetime.timedelta(day) for day in range(days)]
+        for store in ('dict', 'bitmap'):
+            tracemalloc.start()
+            attendance = mark(store, rosters, dates)
+            memory = tracemalloc.get_traced_memory()[0] / 2 ** 20
+            tracemalloc.stop()
+            del attendance
+            start = time.perf_counter()
+            attendance = mark(store, rosters, dates)
+            marking = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            for day in dates:
+                if store == 'dict':
+                    [sum(student[day] for student in batch.values()) for batch in attendance]
+                else:
+                    [batch.day_total(day) for batch in attendance]
+            day_totals = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            for batch in attendance:
+                if store == 'dict':
+                    {username: sum(days.values()) for username, days in batch.items()}
+                else:
+                    batch.student_totals()
+            student_totals = (time.perf_counter() - start) * 1000
+            print(f"{size:>10} {store:>8} {marking:>12.1f} {day_totals:>16.2f} {student_totals:>20.1f} "
+                  f"{memory:>12.1f}")
+
+
+def benchmark_test_statistics(sizes=(10000, 50000), batches=50, subjects=5, tests=4, repeats=5):
+    """
+    Results day: statistics of every test of every batch. Reading the marks student by student
+    (Teacher.access_test_results) into the statistics module, against get_test_statistics() over the mark
+    arrays, with NumPy and without it.
+    """
+    import random
+    import statistics
+    from unittest import mock
+
+    print(f"{'students':>10} {'per student (ms)':>17} {'arrays (ms)':>12} {'arrays, no numpy (ms)':>22}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            database = Database(os.path.join(directory, 'bench.bin'))
+            for i in range(batches):
+                batch = Batch(f'batch{i}')
+                for j in range(subjects):
+                    batch.add_subject(Subject(f'subject{j}'))
+                database.add_batch(batch)
+            for i in range(size):
+                database.add_student(Student(f'student{i}', 'password', 'John', f'Doe{i}',
+                                             database.get_batch(f'batch{i % batches}'), 1000, i, 1))
+            class_tests = [ClassTest(f'test{j}', Subject(f'subject{k}')) for k in range(subjects) for j in range(tests)]
+            for i in range(batches):
+                batch = database.get_batch(f'batch{i}')
+                for test in class_tests:
+                    Teacher.assign_test_to_class(batch, test)
+                    for student in batch.students:
+                        Teacher.update_student_marks(student, test, random.randint(0, 100))
+            start = time.perf_counter()
+            for _ in range(repeats):
+                for i in range(batches):
+                    for test in class_tests:
+                        marks = list(Teacher.access_test_results(database.get_batch(f'batch{i}'), test).values())
+                        statistics.fmean(marks), statistics.median(marks), statistics.pstdev(marks)
+                        statistics.quantiles(marks, n=4)
+            per_student = (time.perf_counter() - start) / repeats * 1000
+            timings = []
+            for numpy in (np, None):
+                with mock.patch('basic_classes.np', numpy):
+                    start = time.perf_counter()
+                    for _ in range(repeats):
+                        for test in class_tests:
+                            database.get_test_statistics(test.subject, test.name)
+                    timings.append((time.perf_counter() - start) / repeats * 1000)
+        print(f"{size:>10} {per_student:>17.1f} {timings[0]:>12.1f} {timings[1]:>22.1f}")
+
+
+def benchmark_import(rows=100000, batches=50, baseline_rows=2000):
+    """
+    Bulk import throughput (rows/s) of import_students() from CSV and JSON Lines files, with the pickle backend,
+    the journal and SQLite, against adding the students one by one with a save() after each (as the signup form
+    does), measured on baseline_rows rows.
+    """
+    import json
+
+    print(f"{'source':>12} {'backend':>10} {'rows':>8} {'rows/s':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        files = {'csv': os.path.join(directory, 'students.csv'), 'jsonl': os.path.join(directory, 'students.jsonl')}
+        with open(files['csv'], 'w') as csv_file, open(files['jsonl'], 'w') as jsonl_file:
+            csv_file.write("username,password,first_name,last_name,batch,fee,roll,contact\n")
+            for i in range(rows):
+                row = {"username": f"student{i}", "password": "password", "first_name": "John", "last_name": "Doe",
+                       "batch": f"batch{i % batches}", "fee": 1000 + i % 500, "roll": i, "contact": 1234567890}
+                csv_file.write(",".join(str(value) for value in row.values()) + "\n")
+                jsonl_file.write(json.dumps(row) + "\n")
+        configurations = {'pickle': {}, 'journal': {'journal': True}, 'sqlite': {'backend': 'sqlite'}}
+        for name, options in configurations.items():
+            database = Database(os.path.join(directory, 'baseline.bin'), **options)
+            build_school(database, 0, batches)
+            start = time.perf_counter()
+            for i in range(baseline_rows):
+                database.add_student(Student(f'student{i}', 'password', 'John', 'Doe',
+                                             database.get_batch(f'batch{i % batches}'), 1000, i, 1234567890))
+                database.save()
+            print(f"{'one by one':>12} {name:>10} {baseline_rows:>8} "
+                  f"{baseline_rows / (time.perf_counter() - start):>10.0f}")
+            database.reset()
+            for source, file in files.items():
+                database = Database(os.path.join(directory, f'{source}.bin'), **options)
+                build_school(database, 0, batches)
+                start = time.perf_counter()
+                report = database.import_students(file)
+                elapsed = time.perf_counter() - start
+                print(f"{source:>12} {name:>10} {report['imported']:>8} {report['imported'] / elapsed:>10.0f}")
+                database.reset()
+
+
+def benchmark_export(rows=100000, batches=50):
+    """
+    Time to first byte, total time and peak memory (tracemalloc) of a CSV export of the approved students' fees:
+    building the whole list and the whole response (as the rendered fee page does) against streaming
+    export_rows() through a csv writer, with the pickle backend, a columnar snapshot and SQLite.
+    """
+    import csv
+    import tracemalloc
+
+    class Echo:
+        def write(self, value):
+            return value
+
+    columns = ['username', 'first_name', 'last_name', 'fee']
+
+    def whole(database):
+        writer = csv.writer(Echo())
+        lines = [writer.writerow(columns)]
+        lines += [writer.writerow([s.username, s.first_name, s.last_name, s.fee])
+                  for s in database.get_all_students(True)]
+        yield "".join(lines)
+
+    def streamed(database):
+        writer = csv.writer(Echo())
+        yield writer.writerow(columns)
+        for row in database.export_rows('students', columns, True):
+            yield writer.writerow(row)
+
+    print(f"{'backend':>10} {'response':>10} {'first byte ms':>14} {'total ms':>10} {'peak MB':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        pickle_path, columnar_path = os.path.join(directory, 'pickle.bin'), os.path.join(directory, 'columnar.bin')
+        database = Database(pickle_path)
+        build_school(database, rows, batches)
+        database.save()
+        Database.convert_to_columnar(pickle_path, columnar_path)
+        sqlite = Database(os.path.join(directory, 'export.sqlite3'), backend='sqlite')
+        build_school(sqlite, rows, batches)
+        sqlite.save()
+        sqlite.close()
+        configurations = {'pickle': (pickle_path, {}), 'columnar': (columnar_path, {'snapshot_format': 'columnar'}),
+                          'sqlite': (os.path.join(directory, 'export.sqlite3'), {'backend': 'sqlite'})}
+        for name, (path, options) in configurations.items():
+            for response, content in (('whole', whole), ('streamed', streamed)):
+                database = Database(path, **options)  # Reopened so that nothing is cached from the last run
+                tracemalloc.start()
+                start = time.perf_counter()
+                chunks = content(database)
+                next(chunks)
+                first = time.perf_counter() - start
+                for _ in chunks:
+                    pass
+                total = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f"{name:>10} {response:>10} {first * 1000:>14.1f} {total * 1000:>10.1f} {peak / 2 ** 20:>9.1f}")
+                if name == 'sqlite':
+                    database.close()
+
+
+def benchmark_pages(sizes=(10000, 100000), page_size=50, repeats=200):
+    """
+    Latency of one page of the approved students list: the whole list (get_all_students, as the list views did)
+    against the first and a middle page of page() (keyset pagination on the ordered index), with the pickle backend
+    and SQLite.
+    """
+    print(f"{'students':>10} {'backend':>8} {'whole list ms':>14} {'first page ms':>14} {'middle page ms':>15}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            for name, options in (('pickle', {}), ('sqlite', {'backend': 'sqlite'})):
+                database = Database(os.path.join(directory, f'{name}{size}'), **options)
+                build_school(database, size, 50)
+                database.page("students", size=page_size)  # Builds the ordered index
+
+                page = {"next": None}
+                for _ in range(size // 4 // page_size):  # Half of the size / 2 approved students
+                    page = database.page("students", size=page_size, after=page["next"])
+                middle = page["next"]
+
+                def timed(function):
+                    start = time.perf_counter()
+                    for _ in range(repeats):
+                        function()
+                    return (time.perf_counter() - start) / repeats * 1000
+
+                whole = timed(lambda: database.get_all_students(True))
+                first = timed(lambda: database.page("students", size=page_size))
+                deep = timed(lambda: database.page("students", size=page_size, after=middle))
+                print(f"{size:>10} {name:>8} {whole:>14.3f} {first:>14.3f} {deep:>15.3f}")
+                if name == 'sqlite':
+                    database.close()
+
+
+def benchmark_take_attendance(students=500, repeats=5):
+    """
+    Latency of a take-attendance submit for one class, on the Django test database: one Attendance.save() per
+    student, indexing the unevaluated roster queryset (as the views did), against save_class_attendance
+    (one bulk_create in one transaction).
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'schoolmanagement.settings')
+    import datetime
+    import django
+    django.setup()
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import RequestFactory
+    from django.test.utils import CaptureQueriesContext
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)  # The views open their Database in the working directory
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            from school import models, views
+            User.objects.bulk_create(User(username=f'student{i}', first_name='John', last_name='Doe')
+                                     for i in range(students))
+            models.StudentExtra.objects.bulk_create(models.StudentExtra(user=user, roll=str(i + 1), cl_id='one')
+                                                    for i, user in enumerate(User.objects.order_by('id')))
+            date = datetime.date(2024, 1, 1)
+            statuses = ['Present', 'Absent'] * (students // 2)
+            request = RequestFactory().post('/', {'date': '2024-01-01', 'present_status': statuses,
+                                                  'roll': [str(i + 1) for i in range(students)]})
+
+            def one_by_one():
+                roster = models.StudentExtra.objects.all().filter(cl='one')
+                for i in range(len(statuses)):
+                    models.Attendance(cl='one', date=date, present_status=statuses[i], roll=roster[i].roll).save()
+
+            print(f"{'students':>10} {'submit':>12} {'queries':>8} {'ms':>10}")
+            for name, submit in (('one by one', one_by_one),
+                                 ('bulk', lambda: views.save_class_attendance(request, 'one', date))):
+                elapsed = []
+                for _ in range(repeats):
+                    models.Attendance.objects.all().delete()
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        submit()
+                        elapsed.append(time.perf_counter() - start)
+                print(f"{students:>10} {name:>12} {len(queries):>8} {min(elapsed) * 1000:>10.1f}")
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            os.chdir(cwd)
+
+
+def benchmark_attendance_lookup(years=3, classes=10, students=40, lookups=500):
+    """
+    Latency of the view-attendance query (filter on date and cl) on the Django test database filled with a few
+    years of attendance, with the unique (cl, date, roll) index of the Attendance model and on a copy of the table
+    without it.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'schoolmanagement.settings')
+    import datetime
+    import random
+    import django
+    django.setup()
+    from django.db import connection
+    from school import models
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        start_date = datetime.date(2021, 1, 1)
+        days = [start_date + datetime.timedelta(days=i) for i in range(365 * years)]
+        batch = []
+        for day in days:
+            for cl in range(classes):
+                batch += [models.Attendance(cl=f'class{cl}', date=day, roll=str(roll), present_status='Present')
+                          for roll in range(1, students + 1)]
+            if len(batch) >= 50000:
+                models.Attendance.objects.bulk_create(batch)
+                batch = []
+        models.Attendance.objects.bulk_create(batch)
+        probes = [(random.choice(days), f'class{random.randrange(classes)}') for _ in range(lookups)]
+        # The same rows in a table without the index
+        table = models.Attendance._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE attendance_plain AS SELECT * FROM {table}")
+
+        print(f"{'rows':>10} {'index':>8} {'ms / lookup':>12}  plan")
+        for name, table in (('unique', table), ('none', 'attendance_plain')):
+            sql = f"SELECT id, roll, date, cl, present_status FROM {table} WHERE date = %s AND cl = %s"
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql, probes[0])
+                plan = cursor.fetchall()[-1][-1]
+                start = time.perf_counter()
+                for probe in probes:
+                    cursor.execute(sql, probe)
+                    cursor.fetchall()
+                elapsed = (time.perf_counter() - start) / lookups
+            print(f"{len(days) * classes * students:>10} {name:>8} {elapsed * 1000:>12.3f}  {plan}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def benchmark_student_lookups(students=50000, lookups=200):
+    """
+    Latency of the StudentExtra queries of the class views (the students of a class by roll, the approved students
+    of a class, a roll in a class) on the Django test database filled with students spread over the ten classes,
+    with the (cl, status) and unique (cl, roll) indexes of the model and on a copy of the table without them.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'schoolmanagement.settings')
+    import random
+    import django
+    django.setup()
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from school import models
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        classes = [name for name, _ in models.classes]
+        users = User.objects.bulk_create(User(username=f'student{i}') for i in range(students))
+        models.StudentExtra.objects.bulk_create(
+            (models.StudentExtra(user=user, roll=str(i // len(classes) + 1), cl_id=classes[i % len(classes)],
+                                 status=i % 2 == 0) for i, user in enumerate(users)), batch_size=5000)
+        # The same rows in a table without the indexes
+        table = models.StudentExtra._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE studentextra_plain AS SELECT * FROM {table}")
+            cursor.execute("ANALYZE")
+        queries = {
+            'class': ("SELECT id, roll, user_id FROM {} WHERE cl = %s ORDER BY roll",
+                      lambda: (random.choice(classes),)),
+            'approved': ("SELECT id, roll, user_id FROM {} WHERE cl = %s AND status = %s",
+                         lambda: (random.choice(classes), True)),
+            'roll': ("SELECT id, user_id FROM {} WHERE cl = %s AND roll = %s",
+                     lambda: (random.choice(classes), str(random.randint(1, students // len(classes))))),
+        }
+
+        print(f"{'students':>10} {'query':>10} {'index':>8} {'ms / lookup':>12}  plan")
+        for query, (sql, probe) in queries.items():
+            probes = [probe() for _ in range(lookups)]
+            for name, table_name in (('indexed', table), ('none', 'studentextra_plain')):
+                with connection.cursor() as cursor:
+                    cursor.execute("EXPLAIN QUERY PLAN " + sql.format(table_name), probes[0])
+                    plan = '; '.join(row[-1] for row in cursor.fetchall())
+                    start = time.perf_counter()
+                    for params in probes:
+                        cursor.execute(sql.format(table_name), params)
+                        cursor.fetchall()
+                    elapsed = (time.perf_counter() - start) / lookups
+                print(f"{students:>10} {query:>10} {name:>8} {elapsed * 1000:>12.3f}  {plan}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+MEMORY_PROBE = """
+import datetime, sys, tracemalloc
+from basic_classes import *
+
+students, subjects, days = int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3])
+batch = Batch('batch')
+for i in range(subjects):
+    batch.add_subject(Subject(f'subject{i}'))
+tracemalloc.start()
+for i in range(students):
+    student = Student(f'student{i}', 'password', 'John', 'Doe', batch, 1000, i, 1234567890)
+    for day in range(days):
+        Teacher.update_student_attendance(student, datetime.date(2024, 1, 1) + datetime.timedelta(day), True)
+    batch.add_student(student)
+for subject in batch.subjects:
+    Teacher.assign_assignment_to_class(batch, subject, Assignment('Homework', subject, datetime.date(2024, 2, 1)))
+    Teacher.assign_test_to_class(batch, ClassTest('Midterm', subject))
+print(tracemalloc.get_traced_memory()[0] / students)
+"""
+
+
+ASSIGNMENT_PROBE = """
+import datetime, sys, tracemalloc
+from basic_classes import *
+
+students, subjects, assignments = int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3])
+batch = Batch('batch')
+for i in range(subjects):
+    batch.add_subject(Subject(f'subject{i}'))
+for i in range(students):
+    batch.add_student(Student(f'student{i}', 'password', 'John', 'Doe', batch, 1000, i, 1234567890))
+tracemalloc.start()
+for subject in batch.subjects:
+    for i in range(assignments):
+        Teacher.assign_assignment_to_class(batch, subject, Assignment(f'Homework{i}', subject,
+                                                                      datetime.date(2024, 2, 1)))
+print(tracemalloc.get_traced_memory()[0] / students)
+"""
+
+
+def benchmark_memory(students=20000, subjects=5, days=20, before_revision=None, probe=MEMORY_PROBE,
+                     introduced_by='class User(_Slotted)'):
+    """
+    Memory per student (tracemalloc) of a synthetic school: students with attendance, one assignment and one
+    test per subject. Compares basic_classes.py at before_revision (default: the version before the one
+    introducing introduced_by, the slotted classes) with the working tree, each measured in a fresh interpreter.
+    With probe=ASSIGNMENT_PROBE, only the memory of days assignments per subject is measured.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if before_revision is None:
+        introduced = subprocess.run(['git', 'log', '--reverse', '--format=%H', '-S', introduced_by, '--',
+                                     'basic_classes.py'], cwd=root, capture_output=True, text=True).stdout.split()
+        before_revision = f'{introduced[0]}~1' if introduced else 'HEAD'
+    print(f"{'version':>10} {'bytes/student':>15}")
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'basic_classes.py'), 'w') as f:
+            f.write(subprocess.run(['git', 'show', f'{before_revision}:basic_classes.py'], cwd=root,
+                                   capture_output=True, text=True, check=True).stdout)
+        for name, path in (('before', directory), ('after', root)):
+            result = subprocess.run([sys.executable, '-c', probe, str(students), str(subjects), str(days)],
+                                    cwd=path, capture_output=True, text=True, check=True)
+            print(f"{name:>10} {float(result.stdout):>15.0f}")
+
+
+MOVE_PROBE = """
+import sys, tempfile, time
+sys.path.insert(0, '.')
+from basic_classes import *
+
+students, moves = int(sys.argv[1]), int(sys.argv[2])
+with tempfile.TemporaryDirectory() as directory:
+    database = Database(directory + '/bench.bin')
+    for name in ('batch0', 'batch1'):
+        database.add_batch(Batch(name))
+    for i in range(students):
+        database.add_student(Student(f'student{i}', 'password', 'John', 'Doe', database.get_batch('batch0'), 1000, i,
+                                     1))
+    batches = [database.get_batch('batch0'), database.get_batch('batch1')]
+    start = time.perf_counter()
+    for i in range(moves):
+        # Move students from the back of one roster to the other (a list scans the whole roster to find them)
+        database.update_student(f'student{students - 1 - i % students}', batch=batches[(i // students + 1) % 2])
+    moved = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in reversed(range(students)):
+        database.remove_student(f'student{i}')
+    print(moved * 1000, (time.perf_counter() - start) * 1000)
+"""
+
+
+def benchmark_batch_moves(sizes=(10000, 50000), moves=10000, before_revision=None):
+    """
+    Time to move students between two batches with update_student() and to remove every student, comparing
+    basic_classes.py at before_revision (default: the version whose batches kept their students in a list) with
+    the working tree, each run in a fresh interpreter.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if before_revision is None:
+        introduced = subprocess.run(['git', 'log', '--reverse', '--format=%H', '-S', 'class Roster', '--',
+                                     'basic_classes.py'], cwd=root, capture_output=True, text=True).stdout.split()
+        before_revision = f'{introduced[0]}~1' if introduced else 'HEAD'
+    print(f"{'students':>10} {'version':>8} {f'{moves} moves (ms)':>18} {'remove all (ms)':>16}")
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'basic_classes.py'), 'w') as f:
+            f.write(subprocess.run(['git', 'show', f'{before_revision}:basic_classes.py'], cwd=root,
+                                   capture_output=True, text=True, check=True).stdout)
+        for size in sizes:
+            for name, path in (('before', directory), ('after', root)):
+                result = subprocess.run([sys.executable, '-c', MOVE_PROBE, str(size), str(moves)], cwd=path,
+                                        capture_output=True, text=True, check=True)
+                moved, removed = map(float, result.stdout.split()[-2:])
+                print(f"{size:>10} {name:>8} {moved:>18.1f} {removed:>16.1f}")
+
+
+if __name__ == '__main__':
+    benchmark_save_latency()
+    benchmark_load_time()
+    benchmark_group_commit()
+    benchmark_sharded_save()
+    benchmark_concurrent_readers()
+    benchmark_mvcc_writes()
+    benchmark_dashboard()
+    benchmark_memory()
+    benchmark_memory(days=4, probe=ASSIGNMENT_PROBE, introduced_by='class AssignmentStore')
+    benchmark_batch_breakdown()
+    benchmark_attendance()
+    benchmark_batch_moves()
+    benchmark_test_statistics()
+    benchmark_import()
+    benchmark_export()
+    benchmark_pages()
+    benchmark_take_attendance()
+    benchmark_attendance_lookup()
+    benchmark_student_lookups()
@@ -1,6 +1,18 @@
 import unittest
+import unittest.mock
 from basic_classes import *
+from storage.saver import BackgroundSaver
+from storage.shared import read_version
+from storage.sqlite import SQLiteDatabase
+import base64
+import copy
+import csv
 import datetime
+import io
+import json
+import multiprocessing
+import os
+import threading
 
 
 class DatabaseTests(unittest.TestCase):
@@ -206,5 +218,1673 @@ class DatabaseTests(unittest.TestCase):
             self.database.update_batch('nonexistent_batch', students=[], subjects=[])
 
 
+class SlotsTests(unittest.TestCase):
+    def setUp(self):
+        # legacy_database.bin was written by the version whose classes had a __dict__
+        with open(os.path.join(os.path.dirname(__file__), 'legacy_database.bin'), 'rb') as f:
+            content = f.read()
+        with open('testLegacy.bin', 'wb') as f:
+            f.write(content)
+
+    def tearDown(self):
+        Database('testLegacy.bin').reset()
+
+    def test_objects_have_no_dict(self):
+        subject = Subject('Math')
+        batch = Batch('batch1')
+        batch.add_subject(subject)
+        objects = (Student('student1', 'password', 'John', 'Doe', batch, 1000, 1, 1),
+                   Teacher('teacher1', 'password', 'Jane', 'Doe', 1, 5000),
+                   Assignment('Homework', subject, datetime.date(2024, 1, 1)), ClassTest('Midterm', subject))
+        for obj in objects:
+            self.assertFalse(hasattr(obj, '__dict__'), type(obj).__name__)
+
+    def test_legacy_pickle_loads(self):
+        database = Database('testLegacy.bin')
+        student = database.get_student('student1')
+        math = Subject('Math')
+        self.assertEqual(student.getpassword(), 'secret')
+        self.assertIs(student.batch, database.get_batch('batch1'))
+        self.assertIsInstance(student.batch.students, Roster)
+        self.assertIn(student, student.batch.students)
+        self.assertTrue(student.view_attendance()[datetime.date(2020, 5, 8)])
+        self.assertEqual(student.view_assignments()[math][0].name, 'Homework')
+        self.assertEqual(student.view_tests()[math]['Midterm'], 90)
+        teacher = database.get_teacher('teacher1')
+        self.assertEqual((teacher.getpassword(), teacher.salary, teacher.join_date),
+                         ('secret2', 5000, datetime.date(2020, 1, 1)))
+        self.assertTrue(database.login('student1', 'secret', as_student=True))
+
+    def test_round_trip(self):
+        database = Database('testLegacy.bin')
+        database.get_student('student1').view_assignments()[Subject('Math')][0].submit()
+        database.save()
+        database = Database('testLegacy.bin')
+        student = database.get_student('student1')
+        self.assertEqual(student.getpassword(), 'secret')
+        self.assertTrue(student.view_assignments()[Subject('Math')][0]._submitted)
+        self.assertEqual(copy.copy(student).getpassword(), 'secret')
+
+
+class JournalTests(unittest.TestCase):
+    def setUp(self):
+        self.database = Database('testJournal.bin', journal=True, checkpoint_interval=100)
+        self.database.reset()
+        self.batch = Batch('batch1')
+        self.batch.add_subject(Subject('Math'))
+        self.database.add_batch(self.batch)
+        self.database.add_batch(Batch('batch2'))
+        self.database.checkpoint()
+
+    def tearDown(self):
+        self.database.reset()
+
+    def reopen(self):
+        return Database('testJournal.bin', journal=True, checkpoint_interval=100)
+
+    def test_changes_are_replayed_from_journal(self):
+        self.database.add_student(Student('student1', 'password', 'John', 'Doe', self.batch, 1000, 1, 1234567890))
+        self.database.add_teacher(Teacher('teacher1', 'password', 'Jane', 'Doe', 5000, 12345), status=True)
+        self.database.update_student('student1', fee=2000, batch=self.database.get_batch('batch2'), status=True)
+        self.database.save()
+
+        database = self.reopen()
+        student = database.get_student('student1')
+        self.assertEqual(student.get_fee(), 2000)
+        self.assertIs(student.batch, database.get_batch('batch2'))
+        self.assertEqual(database.get_batch('batch2').students, [student])
+        self.assertEqual(database.get_batch('batch1').students, [])
+        self.assertEqual(database.get_total_salary(), 12345)
+
+    def test_save_appends_instead_of_rewriting_snapshot(self):
+        snapshot_size = os.path.getsize('testJournal.bin')
+        self.database.add_student(Student('student1', 'password', 'John', 'Doe', self.batch, 1000, 1, 1234567890))
+        self.database.save()
+        self.assertEqual(os.path.getsize('testJournal.bin'), snapshot_size)
+        self.assertGreater(os.path.getsize('testJournal.bin.log'), 0)
+
+    def test_unsaved_changes_are_not_persisted(self):
+        self.database.add_student(Student('student1', 'password', 'John', 'Doe', self.batch, 1000, 1, 1234567890))
+        self.assertIsNone(self.reopen().get_student('student1'))
+
+    def test_checkpoint_compacts_journal(self):
+        for i in range(150):
+            self.database.add_student(Student(f'student{i}', 'password', 'John', 'Doe', self.batch, 1000, i, 1))
+            self.database.save()
+        self.assertLess(self.database._journal_records, 100)
+        self.database.remove_student('student0')
+        self.database.save()
+
+        database = self.reopen()
+        self.assertEqual(database.get_student_count(), 149)
+        self.assertIsNone(database.get_student('student0'))
+
+    def test_direct_changes_are_written_by_a_checkpoint(self):
+        self.database.add_student(Student('student1', 'password', 'John', 'Doe', self.batch, 1000, 1, 1234567890))
+        self.database.save()
+        with self.database.transaction():
+            Teacher.update_student_attendance(self.database.get_student('student1'), datetime.date(2024, 1, 1), True)
+        self.database.save()
+        self.assertEqual(self.database._journal_records, 0)  # Checkpointed
+        Teacher.update_student_attendance(self.database.get_student('student1'), datetime.date(2024, 1, 2), False)
+        self.database.mark_dirty('batch1')
+        self.database.save()
+
+        attendance = self.reopen().get_student('student1').view_attendance()
+        self.assertEqual(attendance, {datetime.date(2024, 1, 1): True, datetime.date(2024, 1, 2): False})
+
+    def test_torn_record_is_ignored(self):
+        self.database.add_student(Student('student1', 'password', 'John', 'Doe', self.batch, 1000, 1, 1234567890))
+        self.database.save()
+        self.database.add_student(Student('student2', 'password', 'John', 'Doe', self.batch, 1000, 2, 1234567890))
+        self.database.save()
+        with open('testJournal.bin.log', 'r+b') as f:
+            f.truncate(os.path.getsize('testJournal.bin.log') - 5)
+
+        database = self.reopen()
+        self.assertIsNotNone(database.get_student('student1'))
+        self.assertIsNone(database.get_student('student2'))
+
+
+class BackgroundSaverTests(unittest.TestCase):
+    def setUp(self):
+        Database('testSaver.bin').reset()
+        self.database = Database('testSaver.bin', save_window=0.05)
+        self.database.add_batch(Batch('batch1'))
+        self.database.save()
+
+    def tearDown(self):
+        self.database.close()
+        self.database.reset()
+
+    def test_concurrent_saves_are_coalesced(self):
+        def signup(i):
+            self.database.add_student(Student(f'student{i}', 'password', 'John', 'Doe',
+                                              self.database.get_batch('batch1'), 1000, i, 1))
+            self.database.save()
+
+        threads = [threading.Thread(target=signup, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        metrics = self.database.save_metrics()
+        self.assertEqual(metrics["requests"], 21)
+        self.assertLess(metrics["flushes"], 21)
+        self.assertGreater(metrics["max_batch_size"], 1)
+        self.assertEqual(Database('testSaver.bin').get_student_count(), 20)
+
+    def test_save_without_waiting(self):
+        self.database.add_student(Student('student1', 'password', 'John', 'Doe',
+                                          self.database.get_batch('batch1'), 1000, 1, 1))
+        self.database.save(wait=False)
+        self.database.close()
+        self.assertIsNotNone(Database('testSaver.bin').get_student('student1'))
+
+    def test_failed_flushes_reach_their_waiters(self):
+        failing = [True]
+
+        def flush():
+            if failing[0]:
+                raise OSError("disk full")
+
+        saver = BackgroundSaver(flush, 0)
+        saver.start()
+        first = saver.request(wait=True)
+        for _ in range(11):  # More failed flushes than any fixed history would keep
+            with self.assertRaises(OSError):
+                saver.wait(saver.request(wait=True))
+        with self.assertRaises(OSError):
+            saver.wait(first)
+        failing[0] = False
+        saver.wait(saver.request(wait=True))
+        saver.stop()
+        self.assertEqual(saver._waiters, {})
+
+    def test_stopped_saver_is_released_at_exit(self):
+        with unittest.mock.patch('atexit.unregister') as unregister:
+            self.database.close()
+        unregister.assert_called_once()
+
+
+class ColumnarSnapshotTests(unittest.TestCase):
+    def setUp(self):
+        database = Database('testPickle.bin')
+        database.reset()
+        for name in ('batch1', 'batch2'):
+            batch = Batch(name)
+            batch.add_subject(Subject('Math'))
+            database.add_batch(batch)
+        for i in range(20):
+            database.add_student(Student(f'student{i}', 'password', 'John', f'Doe{i}',
+                                         database.get_batch('batch1' if i % 2 else 'batch2'), 1000 + i, str(i),
+                                         1234567890), status=i % 3 == 0)
+        database.add_teacher(Teacher('teacher1', 'password', 'Jane', 'Doe', 5000, 12345), status=True)
+        Teacher.update_student_attendance(database.get_student('student1'), datetime.date(2024, 1, 1), True)
+        database.save()
+        Database.convert_to_columnar('testPickle.bin', 'testColumnar.bin')
+        self.database = Database('testColumnar.bin', snapshot_format='columnar')
+
+    def tearDown(self):
+        Database('testPickle.bin').reset()
+        self.database.reset()
+
+    def test_snapshot_is_memory_mapped_columnar(self):
+        self.assertTrue(ColumnarSnapshot.is_columnar('testColumnar.bin'))
+        snapshot = ColumnarSnapshot('testColumnar.bin')
+        row = snapshot.find('students', 'student7')
+        self.assertEqual(snapshot.value('students', row, 'fee'), 1007)
+        self.assertEqual(snapshot.value('students', row, 'roll'), '7')
+        self.assertEqual(snapshot.value('students', row, 'batch'), 'batch1')
+        self.assertIsNone(snapshot.find('students', 'nobody'))
+
+    def test_aggregates_do_not_load_students(self):
+        self.assertEqual(self.database.get_student_count(status=True), 7)
+        self.assertEqual(self.database.get_total_fees(status=True), sum(1000 + i for i in range(0, 20, 3)))
+        self.assertEqual(self.database.get_total_salary(), 12345)
+        self.assertEqual(self.database._Database__students_table._loaded, {})
+
+    def test_students_are_loaded_on_demand(self):
+        student = self.database.get_student('student1')
+        self.assertEqual(student.last_name, 'Doe1')
+        self.assertIs(student.batch, self.database.get_batch('batch1'))
+        self.assertTrue(student.view_attendance()[datetime.date(2024, 1, 1)])
+        self.assertIs(self.database.get_student('student1'), student)
+        self.assertEqual([s.username for s in self.database.get_batch('batch1').students],
+                         [f'student{i}' for i in range(1, 20, 2)])
+        self.assertTrue(self.database.login('student1', 'password', as_student=True))
+
+    def test_changes_survive_columnar_save(self):
+        self.database.update_student('student1', fee=5000, batch=self.database.get_batch('batch2'), status=True)
+        self.database.remove_student('student2')
+        self.database.add_student(Student('new', 'password', 'New', 'Student', self.database.get_batch('batch1'),
+                                          10, '99', 1))
+        self.database.save()
+
+        database = Database('testColumnar.bin', snapshot_format='columnar')
+        self.assertEqual(database.get_student_count(), 20)
+        self.assertIsNone(database.get_student('student2'))
+        self.assertEqual(database.get_student('student1').get_fee(), 5000)
+        self.assertIn('student1', [s.username for s in database.get_batch('batch2').students])
+        self.assertEqual(database.get_batch('batch1').students[-1].username, 'new')
+
+
+class ShardedSnapshotTests(unittest.TestCase):
+    def setUp(self):
+        self.database = Database('testSharded.bin', snapshot_format='sharded')
+        self.database.reset()
+        for name in ('batch 1', 'batch/2'):
+            batch = Batch(name)
+            batch.add_subject(Subject('Math'))
+            self.database.add_batch(batch)
+        for i in range(10):
+            self.database.add_student(Student(f'student{i}', 'password', 'John', 'Doe',
+                                              self.database.get_batch('batch 1' if i % 2 else 'batch/2'), 1000 + i,
+                                              str(i), 1234567890), status=True)
+        self.database.add_teacher(Teacher('teacher1', 'password', 'Jane', 'Doe', 5000, 12345), status=True)
+        self.database.save()
+
+    def tearDown(self):
+        self.database.reset()
+        self.assertEqual([file for file in os.listdir('.') if file.startswith('testSharded.bin')], [])
+
+    def segment_times(self):
+        return {file: os.stat(file).st_mtime_ns for file in os.listdir('.') if file.startswith('testSharded.bin')}
+
+    def test_one_segment_per_batch(self):
+        self.assertTrue(os.path.exists('testSharded.bin.teachers'))
+        self.assertTrue(os.path.exists('testSharded.bin.batch-batch%201'))
+        self.assertTrue(os.path.exists('testSharded.bin.batch-batch%2F2'))
+
+    def test_save_only_writes_dirty_segments(self):
+        before = self.segment_times()
+        for file in before:
+            os.utime(file, ns=(0, 0))
+        self.database.update_student('student1', fee=5000)
+        self.database.save()
+        changed = sorted(file for file, mtime in self.segment_times().items() if mtime != 0)
+        self.assertEqual(changed, ['testSharded.bin.batch-batch%201', 'testSharded.bin.totals'])
+
+        for file in changed:
+            os.utime(file, ns=(0, 0))
+        Teacher.update_student_attendance(self.database.get_student('student2'), datetime.date(2024, 1, 1), True)
+        self.database.mark_dirty('batch/2')
+        self.database.save()
+        changed = [file for file, mtime in self.segment_times().items() if mtime != 0]
+        self.assertEqual(changed, ['testSharded.bin.batch-batch%2F2'])
+
+    def test_direct_changes_in_a_transaction_are_saved(self):
+        day = datetime.date(2024, 1, 1)
+        for shared in (False, True) if fcntl is not None else (False,):
+            database = Database('testSharded.bin', snapshot_format='sharded', shared=shared)
+            with database.transaction():
+                Teacher.update_student_attendance(database.get_student('student2'), day, shared)
+            database.save()
+            database.close()
+            database = Database('testSharded.bin', snapshot_format='sharded')
+            self.assertEqual(dict(database.get_student('student2').view_attendance()), {day: shared})
+            # Only the segments read in the block are rewritten
+            self.assertEqual(database._Database__unloaded, {'batch 1'})
+        for file in ('testSharded.bin.version', 'testSharded.bin.lock'):
+            if os.path.exists(file):
+                os.remove(file)
+
+    def test_segments_are_loaded_on_demand(self):
+        database = Database('testSharded.bin', snapshot_format='sharded')
+        self.assertEqual(database._Database__unloaded, {'batch 1', 'batch/2'})
+        self.assertTrue(database.login('teacher1', 'password', as_teacher=True))
+        student = database.get_student('student3')
+        self.assertEqual(student.get_fee(), 1003)
+        self.assertIs(student.batch, database.get_batch('batch 1'))
+        self.assertEqual(database._Database__unloaded, {'batch/2'})
+        self.assertEqual(database.get_student_count(), 10)
+
+    def test_changes_survive_reload(self):
+        self.database.update_student('student1', batch=self.database.get_batch('batch/2'))
+        self.database.remove_student('student2')
+        self.database.save()
+
+        database = Database('testSharded.bin', snapshot_format='sharded')
+        self.assertIsNone(database.get_student('student2'))
+        self.assertIs(database.get_student('student1').batch, database.get_batch('batch/2'))
+        self.assertEqual(len(database.get_batch('batch/2').students), 5)
+        self.assertEqual(len(database.get_batch('batch 1').students), 4)
+        self.assertEqual(database.get_student_count(status=True), 9)
+
+    def test_journal_with_sharded_snapshot(self):
+        database = Database('testSharded.bin', snapshot_format='sharded', journal=True)
+        database.update_student('student4', fee=7000)
+        database.save()
+        database = Database('testSharded.bin', snapshot_format='sharded', journal=True)
+        self.assertEqual(database.get_student('student4').get_fee(), 7000)
+        database.checkpoint()
+        self.assertEqual(Database('testSharded.bin', snapshot_format='sharded').get_student('student4').get_fee(),
+                         7000)
+
+    def test_crash_before_the_log_is_truncated(self):
+        database = Database('testSharded.bin', snapshot_format='sharded', journal=True)
+        database.add_teacher(Teacher('teacher2', 'password', 'John', 'Doe', 5000, 1000), status=True)
+        database.save()
+        with open('testSharded.bin.log', 'rb') as f:
+            log = f.read()
+        database.checkpoint()  # Only the teachers and totals segments changed
+        with open('testSharded.bin.log', 'wb') as f:  # As if the checkpoint crashed before truncating the log
+            f.write(log)
+
+        database = Database('testSharded.bin', snapshot_format='sharded', journal=True)
+        self.assertEqual(database.get_teacher_count(), 2)
+        self.assertEqual(database.get_total_salary(), 13345)
+
+
+def shared_worker(worker, count):
+    # One process of SharedDatabaseTests.test_processes_do_not_lose_updates
+    database = Database('testShared.bin', journal=True, checkpoint_interval=20, shared=True)
+    for i in range(count):
+        database.add_student(Student(f'worker{worker}-{i}', 'password', 'John', 'Doe', database.get_batch('batch1'),
+                                     1000, f'{worker}-{i}', 1234567890))
+        with database.transaction():
+            counter = database.get_student('counter')
+            database.update_student('counter', fee=counter.get_fee() + 1)
+    database.close()
+
+
+@unittest.skipIf(fcntl is None or 'fork' not in multiprocessing.get_all_start_methods(), "needs fcntl and fork")
+class SharedDatabaseTests(unittest.TestCase):
+    def setUp(self):
+        self.database = Database('testShared.bin', journal=True, checkpoint_interval=20, shared=True)
+        self.database.reset()
+        self.database.add_batch(Batch('batch1'))
+        self.database.add_student(Student('counter', 'password', 'John', 'Doe', self.database.get_batch('batch1'),
+                                          1, '0', 1234567890))
+
+    def tearDown(self):
+        self.database.reset()
+        self.database.close()
+        for file in ('testShared.bin.version', 'testShared.bin.lock'):
+            if os.path.exists(file):
+                os.remove(file)
+
+    def test_changes_are_visible_after_refresh(self):
+        other = Database('testShared.bin', journal=True, shared=True)
+        self.assertFalse(other.refresh())
+        self.database.update_student('counter', fee=50)
+        self.assertEqual(other.get_student('counter').get_fee(), 1)
+        self.assertTrue(other.refresh())
+        self.assertEqual(other.get_student('counter').get_fee(), 50)
+        self.assertFalse(other.refresh())
+
+        # A write from a stale copy is applied on top of the latest state
+        self.database.add_student(Student('student1', 'password', 'John', 'Doe', self.database.get_batch('batch1'),
+                                          1000, '1', 1234567890))
+        other.update_student('counter', fee=60)
+        self.database.refresh()
+        self.assertIsNotNone(self.database.get_student('student1'))
+        self.assertEqual(self.database.get_student('counter').get_fee(), 60)
+        other.close()
+
+    def test_save_after_a_transaction_writes_nothing(self):
+        other = Database('testShared.bin', journal=True, shared=True)
+        self.database.update_student('counter', fee=50)
+        version = self.database._version
+        self.assertTrue(other.refresh())
+        self.database.save()
+        self.assertEqual(read_version(self.database.version_file), version)
+        self.assertFalse(other.refresh())
+
+        # Changes reported with mark_dirty are still written
+        Teacher.update_student_attendance(self.database.get_student('counter'), datetime.date(2024, 1, 1), True)
+        self.database.mark_dirty('batch1')
+        self.database.save()
+        self.assertTrue(other.refresh())
+        self.assertEqual(other.get_student('counter').view_attendance(), {datetime.date(2024, 1, 1): True})
+        self.database.save()
+        self.assertFalse(other.refresh())
+        other.close()
+
+    def test_failed_change_is_not_kept(self):
+        with self.assertRaises(ValueError):
+            with self.database.transaction():
+                self.database.update_student('counter', fee=99)
+                raise ValueError("rolled back")
+        self.assertTrue(self.database.refresh())
+        self.assertEqual(self.database.get_student('counter').get_fee(), 1)
+
+    def test_direct_changes_in_a_transaction_are_saved(self):
+        day = datetime.date(2024, 1, 1)
+        with self.database.transaction():
+            Teacher.update_student_attendance(self.database.get_student('counter'), day, True)
+        other = Database('testShared.bin', journal=True, shared=True)
+        self.assertEqual(other.get_student('counter').view_attendance(), {day: True})
+
+        # Still there once another process wrote and this one reloaded
+        other.update_student('counter', fee=50)
+        self.assertTrue(self.database.refresh())
+        self.assertEqual(self.database.get_student('counter').view_attendance(), {day: True})
+        other.close()
+
+    def test_processes_do_not_lose_updates(self):
+        workers, count = 4, 25
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=shared_worker, args=(worker, count)) for worker in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+            self.assertEqual(process.exitcode, 0)
+
+        self.assertTrue(self.database.refresh())
+        self.assertEqual(self.database.get_student_count(), 1 + workers * count)
+        self.assertEqual(self.database.get_student('counter').get_fee(), 1 + workers * count)
+        self.assertEqual(len(self.database.get_batch('batch1').students), 1 + workers * count)
+
+
+class AggregateTests(unittest.TestCase):
+    def setUp(self):
+        self.database = Database('testAggregates.bin', journal=True)
+        self.database.reset()
+        for name in ('batch1', 'batch2'):
+            self.database.add_batch(Batch(name))
+        for i in range(20):
+            self.database.add_student(Student(f'student{i}', 'password', 'John', 'Doe',
+                                              self.database.get_batch('batch1' if i % 2 else 'batch2'), 100 * i,
+                                              str(i), 1234567890), status=i % 4 == 0)
+        for i in range(5):
+            self.database.add_teacher(Teacher(f'teacher{i}', 'password', 'Jane', 'Doe', 12345, 1000 * (i + 1)),
+                                      status=i % 2 == 0)
+
+    def tearDown(self):
+        self.database.reset()
+
+    def assertTotals(self, database):
+        self.assertTrue(database.verify_totals())
+        students = [(s, True) for s in database.get_all_students(True)] + \
+                   [(s, False) for s in database.get_all_students(False)]
+        teachers = [(t, True) for t in database.get_all_teachers(True)] + \
+                   [(t, False) for t in database.get_all_teachers(False)]
+        for status in (True, False):
+            self.assertEqual(database.get_student_count(status), sum(1 for _, st in students if st == status))
+            self.assertEqual(database.get_total_fees(status), sum(s.fee for s, st in students if st == status))
+            self.assertEqual(database.get_teacher_count(status), sum(1 for _, st in teachers if st == status))
+            self.assertEqual(database.get_total_salary(status), sum(t.salary for t, st in teachers if st == status))
+
+    def test_totals_follow_changes(self):
+        self.assertTotals(self.database)
+        self.assertEqual(self.database.get_student_count(True), 5)
+        self.assertEqual(self.database.get_total_fees(True), 100 * (0 + 4 + 8 + 12 + 16))
+        self.assertEqual(self.database.get_total_salary(False), 2000 + 4000)
+
+        self.database.update_student('student1', fee=5000, status=True)
+        self.database.update_student('student2', batch=self.database.get_batch('batch1'))
+        self.database.remove_student('student4')
+        self.database.update_teacher('teacher1', salary=9000, status=True)
+        self.database.remove_teacher('teacher0')
+        self.assertTotals(self.database)
+        self.assertEqual(self.database.get_total_fees(True), 100 * (0 + 8 + 12 + 16) + 5000)
+        self.assertEqual(self.database.get_total_salary(True), 3000 + 5000 + 9000)
+
+    def test_dashboard_calls_do_not_scan(self):
+        with unittest.mock.patch.object(Database, '_Database__scan', side_effect=AssertionError("table scanned")):
+            for status in (True, False):
+                self.database.get_student_count(status)
+                self.database.get_teacher_count(status)
+                self.database.get_total_fees(status)
+                self.database.get_total_salary(status)
+
+    def test_totals_after_reload(self):
+        self.database.update_student('student3', fee=7000, status=True)
+        self.database.save()
+        self.assertTotals(Database('testAggregates.bin', journal=True))
+
+    def test_update_with_unknown_batch_changes_nothing(self):
+        with self.assertRaises(ValueError):
+            self.database.update_student('student0', fee=5000, batch=Batch('nonexistent_batch'))
+        self.assertEqual(self.database.get_student('student0').get_fee(), 0)
+        self.assertEqual(self.database.get_student('student0').batch.name, 'batch2')
+        self.assertIn('student0', [student.username for student in self.database.get_all_students(True)])
+        self.assertTotals(self.database)
+
+    def test_direct_changes_are_detected(self):
+        self.database.get_student('student0').fee = 1
+        self.assertFalse(self.database.verify_totals())
+
+
+class IndexTests(unittest.TestCase):
+    def setUp(self):
+        self.database = Database('testIndexes.bin', journal=True)
+        self.database.reset()
+        for name in ('batch1', 'batch2'):
+            self.database.add_batch(Batch(name))
+        for i in range(12):
+            self.database.add_student(Student(f'student{i}', 'password', 'John', 'Doe',
+                                              self.database.get_batch('batch1' if i % 2 else 'batch2'), 1000,
+                                              str(i // 2), 1000 + i % 3), status=i % 3 == 0)
+
+    def tearDown(self):
+        self.database.reset()
+
+    def usernames(self, students):
+        return sorted(student.username for student in students)
+
+    def assertIndexes(self, database):
+        students = {s.username: (s, True) for s in database.get_all_students(True)}
+        students.update({s.username: (s, False) for s in database.get_all_students(False)})
+        self.assertEqual(len(students), database.get_student_count())
+        for batch in ('batch1', 'batch2'):
+            for status in (True, False):
+                self.assertEqual(self.usernames(database.get_batch_students(batch, status)),
+                                 sorted(u for u, (s, st) in students.items() if s.batch.name == batch and st == status))
+            for student, _ in students.values():
+                if student.batch.name == batch:
+                    self.assertIs(database.get_student_by_roll(batch, student.roll), student)
+        for contact in (1000, 1001, 1002):
+            self.assertEqual(self.usernames(database.get_students_by_contact(contact)),
+                             sorted(u for u, (s, _) in students.items() if s.contact == contact))
+
+    def test_updates_keep_the_order(self):
+        self.database.save()
+        for mvcc in (False, True):
+            database = Database('testIndexes.bin', journal=True, mvcc=mvcc)
+            approved = [s.username for s in database.get_all_students(True)]
+            self.assertEqual(approved, ['student0', 'student3', 'student6', 'student9'])
+            database.update_student('student0', fee=20, first_name='Jim')
+            self.assertEqual([s.username for s in database.get_all_students(True)], approved)
+            self.assertEqual([s.username for s in database.get_students_by_contact(1000)], approved)
+            database.update_student('student3', batch=database.get_batch('batch2'))
+            self.assertEqual([s.username for s in database.get_all_students(True)], approved)
+            self.assertEqual([s.username for s in database.get_batch_students('batch2', True)],
+                             ['student0', 'student6', 'student3'])
+            database.update_student('student0', fee=1000, first_name='John')
+            database.update_student('student3', batch=database.get_batch('batch1'))
+            database.save()
+
+    def test_lookups(self):
+        self.assertEqual(self.usernames(self.database.get_batch_students('batch2', True)),
+                         ['student0', 'student6'])
+        self.assertEqual(self.database.get_student_by_roll('batch1', '2').username, 'student5')
+        self.assertIsNone(self.database.get_student_by_roll('batch1', '99'))
+        self.assertEqual(self.usernames(self.database.find_students('contact', 1001)),
+                         ['student1', 'student10', 'student4', 'student7'])
+        self.assertEqual(len(self.database.get_batch_students('batch1')), 6)
+        with self.assertRaises(ValueError):
+            self.database.find_students('fee', 1000)
+        self.assertIndexes(self.database)
+
+    def test_indexes_follow_changes(self):
+        self.database.update_student('student1', status=True, roll='40', contact=5)
+        self.database.update_student('student2', batch=self.database.get_batch('batch1'))
+        self.database.remove_student('student3')
+        self.database.add_student(Student('new', 'password', 'New', 'Student', self.database.get_batch('batch2'),
+                                          10, '50', 1002), status=True)
+        self.assertIs(self.database.get_student_by_roll('batch1', '40'), self.database.get_student('student1'))
+        self.assertIsNone(self.database.get_student_by_roll('batch1', '0'))
+        self.assertIn('student1', self.usernames(self.database.get_batch_students('batch1', True)))
+        self.assertEqual(self.usernames(self.database.get_students_by_contact(5)), ['student1'])
+        self.assertIndexes(self.database)
+
+    def test_indexes_are_rebuilt_on_load(self):
+        self.database.update_student('student1', status=True, roll='40')
+        self.database.save()
+        database = Database('testIndexes.bin', journal=True)
+        self.assertIsNone(database._Database__indexes)
+        self.assertEqual(database.get_student_by_roll('batch1', '40').username, 'student1')
+        self.assertIndexes(database)
+
+    def test_mvcc_indexes(self):
+        self.database.save()
+        database = Database('testIndexes.bin', journal=True, mvcc=True)
+        view = database.snapshot()
+        database.update_student('student1', status=True)
+        self.assertNotIn('student1', view.indexes['batch_status'].get(('batch1', True), {}))
+        self.assertIn('student1', self.usernames(database.get_batch_students('batch1', True)))
+        self.assertIndexes(database)
+
+
+@unittest.skipIf(np is None, "needs NumPy")
+class ColumnStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.database = Database('testColumns.bin', columns=True)
+        self.database.reset()
+        self.plain = Database('testColumnsPlain.bin')
+        self.plain.reset()
+        for database in (self.database, self.plain):
+            for name in ('batch1', 'batch2', 'empty'):
+                database.add_batch(Batch(name))
+            for i in range(1500):
+                database.add_student(Student(f'student{i}', 'password', 'John', 'Doe',
+                                             database.get_batch('batch1' if i % 3 else 'batch2'), 10 * i, str(i),
+                                             1234567890), status=i % 2 == 0)
+            database.add_teacher(Teacher('teacher1', 'password', 'Jane', 'Doe', 1, 5000), status=True)
+
+    def tearDown(self):
+        self.database.reset()
+        self.plain.reset()
+
+    def assertSameBreakdowns(self):
+        self.assertTrue(self.database.verify_totals())
+        for status in (True, False, None):
+            self.assertEqual(self.database.get_fees_by_batch(status), self.plain.get_fees_by_batch(status))
+            self.assertEqual(self.database.get_student_count_by_batch(status),
+                             self.plain.get_student_count_by_batch(status))
+
+    def test_breakdowns(self):
+        self.assertEqual(self.database.get_student_count_by_batch(), {'batch1': 1000, 'batch2': 500, 'empty': 0})
+        self.assertEqual(self.database.get_fees_by_batch(True)['batch2'], sum(10 * i for i in range(0, 1500, 6)))
+        self.assertSameBreakdowns()
+
+    def test_columns_follow_changes(self):
+        for database in (self.database, self.plain):
+            database.update_student('student1', fee=99999, status=True, batch=database.get_batch('empty'))
+            database.remove_student('student2')
+            database.add_student(Student('new', 'password', 'New', 'Student', database.get_batch('batch2'), 7, '0',
+                                         1), status=True)
+            database.update_teacher('teacher1', salary=6000)
+        columns = self.database._Database__columns
+        self.assertEqual(columns.students.size, 1500)  # The row of student2 was reused
+        self.assertEqual(columns.teachers.sum('salary', True), 6000)
+        self.assertSameBreakdowns()
+
+    def test_columns_are_rebuilt_from_columnar_snapshot(self):
+        self.database.save()
+        Database.convert_to_columnar('testColumns.bin', 'testColumnsSnapshot.bin')
+        database = Database('testColumnsSnapshot.bin', columns=True)
+        self.assertEqual(database.get_fees_by_batch(None), self.plain.get_fees_by_batch(None))
+        self.assertEqual(database._Database__students_table._loaded, {})
+        self.assertTrue(database.verify_totals())
+        database.reset()
+
+
+class WithoutNumPyTests(unittest.TestCase):
+    """NumPy is optional: without it columns=True is refused and the aggregates are computed in Python."""
+
+    def setUp(self):
+        for target in ('basic_classes.np', 'storage.columns.np'):
+            patcher = unittest.mock.patch(target, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.database = Database('testNoNumPy.bin')
+        self.database.reset()
+        for name in ('batch1', 'batch2', 'empty'):
+            self.database.add_batch(Batch(name))
+        for i in range(30):
+            self.database.add_student(Student(f'student{i}', 'password', 'John', 'Doe',
+                                              self.database.get_batch('batch1' if i % 3 else 'batch2'), 10 * i,
+                                              str(i), 1234567890), status=i % 2 == 0)
+
+    def tearDown(self):
+        self.database.reset()
+
+    def test_columns_need_numpy(self):
+        with self.assertRaises(ValueError):
+            Database('testNoNumPy.bin', columns=True)
+
+    def test_breakdowns(self):
+        self.assertEqual(self.database.get_student_count_by_batch(), {'batch1': 20, 'batch2': 10, 'empty': 0})
+        self.assertEqual(self.database.get_fees_by_batch(True), {'batch1': sum(10 * i for i in range(2, 30, 6)) +
+                                                                 sum(10 * i for i in range(4, 30, 6)),
+                                                                 'batch2': sum(10 * i for i in range(0, 30, 6)),
+                                                                 'empty': 0})
+
+    def test_test_statistics(self):
+        math = Subject('Math')
+        batch = self.database.get_batch('batch1')
+        batch.add_subject(math)
+        test = ClassTest('Midterm', math)
+        Teacher.assign_test_to_class(batch, test)
+        for i, student in enumerate(batch.students):
+            Teacher.update_student_marks(student, test, i % 5 * 10)
+        stats = self.database.get_test_statistics(math, 'Midterm', percentiles=(50,), bins=2)['batch1']
+        self.assertEqual((stats["count"], stats["mean"], stats["median"]), (20, 20, 20))
+        self.assertEqual(stats["histogram"]["counts"], [8, 12])
+
+
+class MVCCTests(unittest.TestCase):
+    def setUp(self):
+        self.database = Database('testMVCC.bin', mvcc=True)
+        self.database.reset()
+        self.database.add_batch(Batch('batch1'))
+        for i in range(10):
+            self.database.add_student(Student(f'student{i}', 'password', 'John', 'Doe',
+                                              self.database.get_batch('batch1'), 1000, str(i), 1234567890))
+        self.database.save()
+
+    def tearDown(self):
+        self.database.reset()
+
+    def test_snapshot_is_isolated_from_later_writes(self):
+        view = self.database.snapshot()
+        roster = self.database.get_batch('batch1').students
+        self.database.add_student(Student('new', 'password', 'New', 'Student', self.database.get_batch('batch1'),
+                                          10, '99', 1))
+        self.database.update_student('student1', status=True)
+        self.database.remove_student('student2')
+
+        self.assertNotIn('new', view.students)
+        self.assertIn('student2', view.students)
+        self.assertFalse(view.students['student1']["status"])
+        self.assertEqual(len(roster), 10)
+        self.assertEqual(len(view.students), 10)
+        self.assertEqual(len(view.indexes['batch_status'][('batch1', False)]), 10)
+        self.assertIsNotNone(self.database.get_student('new'))
+        self.assertIsNone(self.database.get_student('student2'))
+        self.assertEqual(self.database.get_student_count(status=True), 1)
+        with self.assertRaises(TypeError):
+            view.students['other'] = None
+
+    def test_updates_change_a_copy(self):
+        self.database.add_teacher(Teacher('teacher1', 'password', 'Jane', 'Doe', 12345, 5000))
+        view = self.database.snapshot()
+        self.database.update_student('student3', fee=3000, first_name='Jane')
+        self.database.update_teacher('teacher1', salary=6000)
+        self.assertEqual(view.teachers['teacher1']["teacher"].salary, 5000)
+        self.assertEqual(self.database.get_teacher('teacher1').salary, 6000)
+        self.assertEqual(view.students['student3']["student"].get_fee(), 1000)
+        self.assertEqual(view.students['student3']["student"].first_name, 'John')
+        student = self.database.get_student('student3')
+        self.assertEqual((student.get_fee(), student.first_name), (3000, 'Jane'))
+        self.assertIs(self.database.get_batch('batch1').students.get('student3'), student)
+
+    def test_old_views_survive_many_writes(self):
+        old = self.database.snapshot()
+        students = list(old.students)
+        batch = self.database.get_batch('batch1')
+        for i in range(400):
+            self.database.add_student(Student(f'new{i}', 'password', 'John', 'Doe', batch, 10, str(i), 1))
+            self.database.update_student(f'student{i % 10}', fee=2000 + i)
+            if i % 2:
+                self.database.remove_student(f'new{i - 1}')
+        middle = self.database.snapshot()
+        middle_students = {username: entry["student"].get_fee() for username, entry in middle.students.items()}
+        self.database.remove_student('student0')
+        self.database.add_student(Student('student0', 'password', 'John', 'Doe', batch, 10, '0', 1))
+        for i in range(100):
+            self.database.update_student(f'student{i % 10}', fee=3000 + i)
+            self.database.update_student(f'new{2 * i + 1}', status=True)
+
+        self.assertEqual(list(old.students), students)
+        self.assertEqual([old.students[username]["student"].get_fee() for username in students], [1000] * 10)
+        self.assertEqual(list(old.indexes['batch_status'][('batch1', False)]), students)
+        self.assertNotIn(('batch1', True), old.indexes['batch_status'])
+        self.assertEqual({username: entry["student"].get_fee() for username, entry in middle.students.items()},
+                         middle_students)
+        self.assertEqual(len(middle.students), 210)
+        view = self.database.snapshot()
+        self.assertEqual(list(view.students), students[1:] + [f'new{i}' for i in range(1, 400, 2)] + ['student0'])
+        self.assertEqual(len(view.students), 210)
+        self.assertEqual(self.database.get_student_count(status=True), 100)
+        approved = [username for username, entry in view.students.items() if entry["status"]]
+        self.assertEqual(sorted(view.indexes['batch_status'][('batch1', True)]), sorted(approved))
+        page = self.database.page("students", status=False, size=300)
+        self.assertEqual(len(page["items"]), 110)
+
+    def test_readers_during_writes(self):
+        errors = []
+        stop = threading.Event()
+
+        def read():
+            try:
+                while not stop.is_set():
+                    students = self.database.get_all_students(status=False)
+                    self.database.get_total_fees(status=False)
+                    self.assertGreaterEqual(len(students), 10)
+                    for student in self.database.get_batch('batch1').students:
+                        self.assertEqual(student.get_fee(), 1000)
+            except Exception as error:
+                errors.append(error)
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        for i in range(300):
+            self.database.add_student(Student(f'new{i}', 'password', 'John', 'Doe', self.database.get_batch('batch1'),
+                                              1000, str(i), 1))
+            if i % 3 == 0:
+                self.database.remove_student(f'new{i}')
+        stop.set()
+        for reader in readers:
+            reader.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.database.get_student_count(), 210)
+
+    def test_save_does_not_wait_for_writers(self):
+        self.database.update_student('student3', fee=3000)
+        started, release = threading.Event(), threading.Event()
+
+        def write():
+            with self.database.transaction():
+                started.set()
+                release.wait(5)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        started.wait(5)
+        self.database.save()
+        self.assertTrue(writer.is_alive())
+        release.set()
+        writer.join()
+        self.assertEqual(Database('testMVCC.bin').get_student('student3').get_fee(), 3000)
+
+
+class StorageModeTests(unittest.TestCase):
+    """The same changes, saved and reloaded, with every supported combination of the storage options."""
+
+    def tearDown(self):
+        for file in ('testModes.bin', 'testModes.bin.version', 'testModes.bin.lock'):
+            if os.path.exists(file):
+                os.remove(file)
+
+    def modes(self):
+        for snapshot_format in Database.SNAPSHOT_FORMATS:
+            for journal in (False, True):
+                for shared in (False, True) if fcntl is not None else (False,):
+                    for mvcc in (False, True):
+                        for columns in (False, True) if np is not None else (False,):
+                            for save_window in (None,) if shared else (None, 0.01):
+                                yield {'snapshot_format': snapshot_format, 'journal': journal, 'shared': shared,
+                                       'mvcc': mvcc, 'columns': columns, 'save_window': save_window}
+        yield {'backend': 'sqlite'}
+
+    def change(self, database):
+        for name in ('batch1', 'batch2'):
+            database.add_batch(Batch(name))
+        for i in range(6):
+            database.add_student(Student(f'student{i}', 'password', 'John', 'Doe', database.get_batch('batch1'), 1000,
+                                         str(i), 1234567890), status=i % 2 == 0)
+        database.add_teacher(Teacher('teacher1', 'password', 'Jane', 'Doe', 5000, 12345), status=True)
+        database.save()
+        database.update_student('student1', fee=3000)
+        database.update_student('student2', batch=database.get_batch('batch2'))
+        database.remove_student('student3')
+        database.update_teacher('teacher1', salary=20000)
+        with database.transaction():
+            Teacher.update_student_attendance(database.get_student('student0'), datetime.date(2024, 1, 1), True)
+        database.save()
+
+    def check(self, database):
+        self.assertEqual(database.get_student_count(), 5)
+        self.assertEqual(database.get_student('student1').get_fee(), 3000)
+        self.assertIs(database.get_student('student2').batch, database.get_batch('batch2'))
+        self.assertIsNone(database.get_student('student3'))
+        self.assertEqual(database.get_total_salary(), 20000)
+        self.assertEqual(database.get_student('student0').view_attendance(), {datetime.date(2024, 1, 1): True})
+        self.assertEqual([student.username for student in database.get_all_students()],
+                         ['student0', 'student2', 'student4'])
+        self.assertTrue(database.verify_totals())
+
+    def test_changes_survive_a_reload(self):
+        for options in self.modes():
+            with self.subTest(**options):
+                database = Database('testModes.bin', **options)
+                database.reset()
+                try:
+                    self.change(database)
+                    database.close()
+                    for _ in range(2):  # From the journal (if any), then from the checkpoint
+                        database = Database('testModes.bin', **options)
+                        self.check(database)
+                        database.checkpoint()
+                        database.close()
+                finally:
+                    database.reset()
+                    database.close()
+
+    def test_unsupported_combinations_are_rejected(self):
+        if fcntl is not None:
+            with self.assertRaises(ValueError):
+                Database('testModes.bin', shared=True, save_window=0.01)
+        if np is None:
+            with self.assertRaises(ValueError):
+                Database('testModes.bin', columns=True)
+        with self.assertRaises(ValueError):
+            Database('testModes.bin', backend='sqlite', mvcc=True)
+        with self.assertRaises(TypeError):  # The other options are those of the pickle backend
+            Database('testModes.bin', backend='sqlite', journal=True)
+        with self.assertRaises(ValueError):
+            Database('testModes.bin', backend='mysql')
+
+
+class AttendanceStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.database = Database('testAttendance.bin', journal=True)
+        self.database.reset()
+        for name in ('batch1', 'batch2'):
+            self.database.add_batch(Batch(name))
+        for i in range(6):
+            self.database.add_student(Student(f'student{i}', 'password', 'John', 'Doe',
+                                              self.database.get_batch('batch1'), 1000, i, 1))
+        self.day = datetime.date(2024, 1, 8)
+
+    def tearDown(self):
+        self.database.reset()
+
+    def test_student_view(self):
+        student = self.database.get_student('student1')
+        Teacher.update_student_attendance(student, self.day, True)
+        self.assertEqual(dict(student.view_attendance()), {self.day: True})
+        self.assertFalse(Teacher.get_student_attendance(student, self.day + datetime.timedelta(1)))
+        self.assertEqual(len(student.view_attendance()), 2)
+        del student.view_attendance()[self.day]
+        self.assertNotIn(self.day, student.view_attendance())
+        self.assertEqual(self.database.get_batch('batch1').attendance.day_total(self.day), (0, 0))
+
+    def test_class_totals(self):
+        batch = self.database.get_batch('batch1')
+        for offset in range(3):
+            day = self.day + datetime.timedelta(offset)
+            Teacher.update_class_attendance(batch, day, {s: i % 2 == offset % 2 for i, s in enumerate(batch.students)})
+        self.assertEqual(batch.attendance.day_total(self.day), (3, 6))
+        self.assertEqual(batch.attendance.range_total(self.day + datetime.timedelta(1)), (6, 12))
+        self.assertEqual(batch.attendance.student_total('student0'), (2, 3))
+        self.assertEqual(batch.attendance.student_total('student1', end=self.day), (0, 1))
+        self.assertEqual(batch.attendance.student_totals(), {s.username: batch.attendance.student_total(s.username)
+                                                             for s in batch.students})
+        self.assertEqual(batch.attendance.student_totals(end=self.day)['student0'], (1, 1))
+        # Re-submitting the attendance of a day overwrites it
+        Teacher.update_class_attendance(batch, self.day, {s: True for s in batch.students})
+        self.assertEqual(batch.attendance.day_total(self.day), (6, 6))
+
+    def test_remove_and_move(self):
+        batch1 = self.database.get_batch('batch1')
+        Teacher.update_class_attendance(batch1, self.day, {s: True for s in batch1.students})
+        self.database.remove_student('student0')
+        self.assertEqual(batch1.attendance.day_total(self.day), (5, 5))
+        # The seat of the removed student is reused without inheriting its attendance
+        self.database.add_student(Student('new', 'password', 'John', 'Doe', batch1, 1000, 9, 1))
+        self.assertEqual(dict(self.database.get_student('new').view_attendance()), {})
+        self.database.update_student('student1', batch=self.database.get_batch('batch2'))
+        self.assertEqual(batch1.attendance.day_total(self.day), (4, 4))
+        self.assertEqual(self.database.get_batch('batch2').attendance.day_total(self.day), (1, 1))
+        self.assertTrue(self.database.get_student('student1').view_attendance()[self.day])
+
+    def test_persistence(self):
+        batch2 = self.database.get_batch('batch2')
+        self.database.add_student(Student('late', 'password', 'John', 'Doe', batch2, 1000, 1, 1,
+                                          attendance={self.day: True}))
+        batch1 = self.database.get_batch('batch1')
+        Teacher.update_class_attendance(batch1, self.day, {s: s.roll < 2 for s in batch1.students})
+        self.database.checkpoint()
+        self.database.add_student(Student('later', 'password', 'John', 'Doe', batch2, 1000, 2, 1,
+                                          attendance={self.day: False}))
+        self.database.save()  # 'later' is only in the journal
+        database = Database('testAttendance.bin', journal=True)
+        self.assertEqual(database.get_batch('batch1').attendance.day_total(self.day), (2, 6))
+        self.assertEqual(dict(database.get_student('late').view_attendance()), {self.day: True})
+        self.assertEqual(dict(database.get_student('later').view_attendance()), {self.day: False})
+
+
+class RosterTests(unittest.TestCase):
+    def setUp(self):
+        self.database = Database('testRoster.bin', journal=True)
+        self.database.reset()
+        for name in ('batch1', 'batch2'):
+            self.database.add_batch(Batch(name))
+        for i in range(5):
+            self.database.add_student(Student(f'student{i}', 'password', 'John', 'Doe',
+                                              self.database.get_batch('batch1'), 1000, i, 1))
+
+    def tearDown(self):
+        self.database.reset()
+
+    def usernames(self, batch_name):
+        return [student.username for student in self.database.get_batch(batch_name).students]
+
+    def test_order_and_membership(self):
+        batch = self.database.get_batch('batch1')
+        self.assertEqual(self.usernames('batch1'), [f'student{i}' for i in range(5)])
+        self.assertEqual(len(batch.students), 5)
+        self.assertIn(self.database.get_student('student3'), batch.students)
+        self.assertIn('student3', batch.students)
+        self.assertEqual(batch.students[-1].username, 'student4')
+        self.assertEqual(batch.students[0].username, 'student0')
+        self.assertEqual([s.username for s in batch.students[1:3]], ['student1', 'student2'])
+        self.assertEqual([batch.students[i].username for i in range(-5, 5)], self.usernames('batch1') * 2)
+        with self.assertRaises(IndexError):
+            batch.students[5]
+        with self.assertRaises(IndexError):
+            batch.students[-6]
+        with self.assertRaises(TypeError):
+            batch.students['student1']
+        with self.assertRaises(IndexError):
+            self.database.get_batch('batch2').students[0]
+        with self.assertRaises(ValueError):
+            batch.add_student(Student('student2', 'password', 'John', 'Doe', batch, 1000, 9, 1))
+
+    def test_move_and_remove(self):
+        self.database.update_student('student1', batch=self.database.get_batch('batch2'))
+        self.database.update_student('student3', batch=self.database.get_batch('batch2'))
+        self.database.remove_student('student2')
+        self.assertEqual(self.usernames('batch1'), ['student0', 'student4'])
+        self.assertEqual(self.usernames('batch2'), ['student1', 'student3'])
+        self.assertNotIn('student1', self.database.get_batch('batch1').students)
+        with self.assertRaises(ValueError):
+            self.database.get_batch('batch1').students.remove(self.database.get_student('student1'))
+        # Order survives the snapshot and the journal
+        self.database.checkpoint()
+        self.database.update_student('student0', batch=self.database.get_batch('batch2'))
+        self.database.save()
+        database = Database('testRoster.bin', journal=True)
+        self.assertEqual([s.username for s in database.get_batch('batch2').students],
+                         ['student1', 'student3', 'student0'])
+        self.assertIsInstance(database.get_batch('batch2').students, Roster)
+
+
+class AssignmentStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.database = Database('testAssignments.bin', journal=True)
+        self.database.reset()
+        self.math, self.physics = Subject('Math'), Subject('Physics')
+        for name in ('batch1', 'batch2'):
+            batch = Batch(name)
+            batch.add_subject(self.math)
+            batch.add_subject(self.physics)
+            self.database.add_batch(batch)
+        for i in range(4):
+            self.database.add_student(Student(f'student{i}', 'password', 'John', 'Doe',
+                                              self.database.get_batch('batch1'), 1000, i, 1))
+        self.homework = Assignment('Homework', self.math, datetime.date(2024, 2, 1))
+        Teacher.assign_assignment_to_class(self.database.get_batch('batch1'), self.math, self.homework)
+
+    def tearDown(self):
+        self.database.reset()
+
+    def test_shared_assignment(self):
+        views = [student.view_assignments() for student in self.database.get_batch('batch1').students]
+        for assignments in views:
+            self.assertEqual(assignments[self.physics], [])  # Subjects no longer share one list
+            self.assertEqual(len(assignments[self.math]), 1)
+            self.assertIs(assignments[self.math][0].assignment, self.homework)
+        student = self.database.get_student('student0')
+        student.view_tests()[self.math]['Midterm'] = 90
+        self.assertEqual(self.database.get_student('student1').view_tests()[self.math], {})
+        self.assertEqual(student.view_tests()[self.physics], {})
+
+    def test_submissions(self):
+        store = self.database.get_batch('batch1').assignments
+        assignment = self.database.get_student('student2').view_assignments()[self.math][0]
+        Student.submit_assignment(assignment)
+        self.assertTrue(assignment._submitted)
+        self.assertIsNotNone(assignment.submitted_at)
+        self.assertFalse(self.database.get_student('student1').view_assignments()[self.math][0]._submitted)
+        self.assertEqual(store.submitted_by(self.homework), ['student2'])
+        self.assertEqual(sorted(store.pending(self.homework)), ['student0', 'student1', 'student3'])
+        # Students who join later were not given the assignment
+        self.database.add_student(Student('late', 'password', 'John', 'Doe', self.database.get_batch('batch1'),
+                                          1000, 9, 1))
+        self.assertEqual(self.database.get_student('late').view_assignments()[self.math], [])
+        with self.assertRaises(ValueError):
+            store.submit(self.homework, 'late')
+        self.assertNotIn('late', store.pending(self.homework))
+
+    def test_move_remove_and_persistence(self):
+        Student.submit_assignment(self.database.get_student('student1').view_assignments()[self.math][0])
+        self.database.update_student('student1', batch=self.database.get_batch('batch2'))
+        self.database.remove_student('student0')
+        self.assertEqual(sorted(self.database.get_batch('batch1').assignments.pending(self.homework)),
+                         ['student2', 'student3'])
+        self.assertEqual(self.database.get_batch('batch2').assignments.submitted_by(self.homework), ['student1'])
+        self.database.checkpoint()
+        new = Student('new', 'password', 'John', 'Doe', self.database.get_batch('batch1'), 1000, 9, 1)
+        self.database.get_batch('batch1').assignments.assign(self.homework, ['new'])
+        self.database.get_batch('batch1').assignments.submit(self.homework, 'new', 1700000000.0)
+        self.database.add_student(new)
+        self.database.save()  # 'new' is only in the journal
+        database = Database('testAssignments.bin', journal=True)
+        self.assertTrue(database.get_student('student1').view_assignments()[self.math][0]._submitted)
+        self.assertEqual(database.get_student('new').view_assignments()[self.math][0].submitted_at, 1700000000.0)
+        self.assertEqual(sorted(database.get_batch('batch1').assignments.pending(self.homework)),
+                         ['student2', 'student3'])
+
+
+class MarkStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.database = Database('testMarks.bin', journal=True)
+        self.database.reset()
+        self.math, self.physics = Subject('Math'), Subject('Physics')
+        for name in ('batch1', 'batch2'):
+            batch = Batch(name)
+            batch.add_subject(self.math)
+            batch.add_subject(self.physics)
+            self.database.add_batch(batch)
+        for i in range(5):
+            self.database.add_student(Student(f'student{i}', 'password', 'John', f'Doe{i}',
+                                              self.database.get_batch('batch1'), 1000, i, 1))
+        self.midterm, self.final = ClassTest('Midterm', self.math), ClassTest('Final', self.physics)
+        for test in (self.midterm, self.final):
+            Teacher.assign_test_to_class(self.database.get_batch('batch1'), test)
+        for i, student in enumerate(self.database.get_batch('batch1').students):
+            if i < 4:  # student4 has not been marked yet
+                Teacher.update_student_marks(student, self.midterm, 60 + 10 * i)
+            Teacher.update_student_marks(student, self.final, 50 + i)
+
+    def tearDown(self):
+        self.database.reset()
+
+    def test_marks(self):
+        student = self.database.get_student('student2')
+        self.assertEqual(student.view_tests()[self.math], {'Midterm': 80})
+        self.assertEqual(student.access_test_results(self.final), 52)
+        self.assertIsNone(self.database.get_student('student4').access_test_results(self.midterm))
+        self.assertEqual(Teacher.access_test_results(self.database.get_batch('batch1'), self.midterm),
+                         {'John Doe0': 60, 'John Doe1': 70, 'John Doe2': 80, 'John Doe3': 90, 'John Doe4': None})
+        # A student joining later was not given the tests
+        self.database.add_student(Student('late', 'password', 'John', 'Doe', self.database.get_batch('batch1'),
+                                          1000, 9, 1))
+        self.assertEqual(dict(self.database.get_student('late').view_tests()[self.math]), {})
+        with self.assertRaises(KeyError):
+            self.database.get_student('late').view_tests()[self.math]['Midterm']
+
+    def test_statistics(self):
+        batch = self.database.get_batch('batch1')
+        stats = Teacher.get_test_statistics(batch, test=self.midterm, percentiles=(50, 90), bins=3)
+        self.assertEqual((stats["count"], stats["mean"], stats["median"]), (4, 75, 75))
+        self.assertAlmostEqual(stats["std"], 125 ** 0.5)
+        self.assertAlmostEqual(stats["percentiles"][90], 87)
+        self.assertEqual(stats["histogram"]["counts"], [1, 1, 2])  # The last bin includes its upper edge
+        self.assertEqual(stats["histogram"]["edges"], [60, 70, 80, 90])
+        self.assertEqual(Teacher.get_test_statistics(batch, subject=self.physics)["mean"], 52)
+        self.assertEqual(Teacher.get_test_statistics(batch)["count"], 9)
+        everything = self.database.get_test_statistics(self.math, 'Midterm', percentiles=(50, 90), bins=3)
+        self.assertEqual(everything['batch1'], stats)
+        self.assertEqual(everything['batch2']["count"], 0)
+        with unittest.mock.patch('basic_classes.np', None):  # Without NumPy
+            self.assertEqual(Teacher.get_test_statistics(batch, test=self.midterm, percentiles=(50, 90), bins=3),
+                             stats)
+
+    def test_move_remove_and_persistence(self):
+        self.database.update_student('student1', batch=self.database.get_batch('batch2'))
+        self.database.remove_student('student0')
+        self.assertEqual(Teacher.get_test_statistics(self.database.get_batch('batch1'), test=self.midterm)["mean"],
+                         85)
+        self.assertEqual(self.database.get_student('student1').access_test_results(self.midterm), 70)
+        self.database.checkpoint()
+        new = Student('new', 'password', 'John', 'Doe', self.database.get_batch('batch1'), 1000, 9, 1)
+        self.database.get_batch('batch1').marks.set_mark(self.math, 'Midterm', 'new', 40.5)
+        self.database.add_student(new)
+        self.database.save()  # 'new' is only in the journal
+        database = Database('testMarks.bin', journal=True)
+        self.assertEqual(database.get_student('new').access_test_results(self.midterm), 40.5)
+        self.assertEqual(database.get_student('student1').view_tests()[self.physics]['Final'], 51)
+        self.assertEqual(Teacher.get_test_statistics(database.get_batch('batch1'), test=self.midterm)["count"], 3)
+
+
+class ImportTests(unittest.TestCase):
+    CSV = ("username,password,first_name,last_name,batch,fee,roll,contact,status\n"
+           "student1,secret,John,Doe,batch1,1000,1,555,true\n"
+           "student2,secret,Jane,Doe,batch2,1200,2,556,\n"
+           "student3,secret,Jim,Doe,batch1,lots,3,557,\n"
+           "student4,secret,,Doe,batch1,1000,4,558,\n"
+           "student5,secret,Joe,Doe,batch9,1000,5,559,\n"
+           "student1,secret,John,Again,batch1,1000,6,560,\n"
+           "student6,secret,Jack,Doe,batch2,900,7,561,no\n")
+
+    def setUp(self):
+        self.database = Database('testImport.bin', journal=True)
+        self.database.reset()
+        for name in ('batch1', 'batch2'):
+            self.database.add_batch(Batch(name))
+        self.database.checkpoint()
+
+    def tearDown(self):
+        self.database.reset()
+        for file in ('testImport.csv', 'testImport.jsonl'):
+            if os.path.exists(file):
+                os.remove(file)
+
+    def test_csv_import(self):
+        with open('testImport.csv', 'w') as f:
+            f.write(self.CSV)
+        with unittest.mock.patch.object(self.database, 'save', wraps=self.database.save) as save:
+            report = self.database.import_students('testImport.csv', chunk_size=2)
+        self.assertEqual(save.call_count, 1)
+        self.assertEqual((report["rows"], report["imported"], report["failed"]), (7, 3, 4))
+        self.assertEqual([line for line, _ in report["errors"]], [4, 5, 6, 7])
+        self.assertIn("fee", report["errors"][0][1])
+        self.assertIn("first_name", report["errors"][1][1])
+        self.assertIn("batch9", report["errors"][2][1])
+        self.assertIn("already exists", report["errors"][3][1])
+        # Persisted once at the end (the journal stays empty)
+        self.assertEqual(os.path.getsize('testImport.bin.log'), 0)
+        database = Database('testImport.bin', journal=True)
+        self.assertEqual(database.get_student_count(True), 1)
+        self.assertEqual(database.get_student_count(False), 2)
+        student = database.get_student('student2')
+        self.assertEqual((student.first_name, student.fee, student.roll, student.batch.name), ('Jane', 1200, '2',
+                                                                                               'batch2'))
+        self.assertEqual([s.username for s in database.get_batch('batch1').students], ['student1'])
+
+    def test_jsonl_import(self):
+        lines = [json.dumps({"username": f"student{i}", "password": "secret", "first_name": "John",
+                             "last_name": "Doe", "batch": f"batch{i % 2 + 1}", "fee": 1000, "roll": i,
+                             "contact": 555}) for i in range(10)]
+        lines[3] = "{not json"
+        lines[5] = "[1, 2]"
+        report = self.database.import_students(io.StringIO("\n".join(lines) + "\n\n"), 'jsonl', status=True,
+                                               max_errors=1)
+        self.assertEqual((report["rows"], report["imported"], report["failed"]), (10, 8, 2))
+        self.assertEqual(len(report["errors"]), 1)  # Only max_errors are kept
+        self.assertEqual(report["errors"][0][0], 4)
+        self.assertEqual(self.database.get_student_count(True), 8)
+        self.assertEqual(self.database.get_student_by_roll('batch2', 1).username, 'student1')
+        with self.assertRaises(ValueError):
+            self.database.import_students(io.StringIO(""), 'xml')
+
+    def test_malformed_csv_line(self):
+        lines = self.CSV.splitlines(keepends=True)
+        lines[2] = "student2,secret,Jane,Doe,batch2," + "9" * (csv.field_size_limit() + 1) + ",2,556,\n"
+        report = self.database.import_students(io.StringIO("".join(lines)))
+        self.assertEqual((report["rows"], report["imported"], report["failed"]), (7, 2, 5))
+        self.assertEqual(report["errors"][0][0], 3)
+        self.assertIn("Invalid CSV", report["errors"][0][1])
+        self.assertIsNotNone(self.database.get_student('student6'))
+
+    def test_other_writers_wait_for_the_import(self):
+        database = self.database
+        writer = threading.Thread(target=database.add_teacher,
+                                  args=(Teacher('teacher1', 'password', 'Jane', 'Doe', 1, 5000),))
+        blocked = []
+
+        class File(io.StringIO):
+            # Starts another writer while the import is reading the file
+            def __next__(self):
+                line = super().__next__()
+                if line.startswith("student6"):
+                    writer.start()
+                    writer.join(0.2)
+                    blocked.append(writer.is_alive())
+                return line
+
+        database.import_students(File(self.CSV))
+        writer.join()
+        self.assertEqual(blocked, [True])
+        # The teacher was added after the import, so it was journaled
+        database.save()
+        self.assertGreater(os.path.getsize('testImport.bin.log'), 0)
+        self.assertIsNotNone(Database('testImport.bin', journal=True).get_teacher('teacher1'))
+
+    def test_sqlite_import(self):
+        database = Database('testImport.sqlite3', backend='sqlite')
+        try:
+            database.add_batch(Batch('batch1'))
+            database.add_batch(Batch('batch2'))
+            report = database.import_students(io.StringIO(self.CSV))
+            self.assertEqual((report["imported"], report["failed"]), (3, 4))
+            database.close()
+            database = Database('testImport.sqlite3', backend='sqlite')
+            self.assertEqual(database.get_student_count(), 3)
+            self.assertEqual(database.get_fees_by_batch(status=False), {'batch1': 0, 'batch2': 2100})
+        finally:
+            database.close()
+            os.remove('testImport.sqlite3')
+
+
+class ExportTests(unittest.TestCase):
+    def setUp(self):
+        self.database = Database('testExport.bin')
+        self.database.reset()
+        for name in ('batch1', 'batch2'):
+            self.database.add_batch(Batch(name))
+        batch1, batch2 = self.database.get_batch('batch1'), self.database.get_batch('batch2')
+        self.database.add_student(Student('student1', 'pw', 'John', 'Doe', batch1, 1000, 1, 555), status=True)
+        self.database.add_student(Student('student2', 'pw', 'Jane', 'Doe', batch2, 1200, 2, 556), status=True)
+        self.database.add_student(Student('student3', 'pw', 'Jim', 'Doe', batch1, 900, 3, 557))
+        self.database.add_teacher(Teacher('teacher1', 'pw', 'Ann', 'Lee', 560, 5000), status=True)
+        self.database.save()
+
+    def tearDown(self):
+        self.database.reset()
+
+    def check_rows(self, database):
+        self.assertEqual(list(database.export_rows("students", ["username", "fee"], status=True)),
+                         [('student1', 1000), ('student2', 1200)])
+        self.assertEqual(list(database.export_rows("students", ["username", "status"], batch_name='batch1')),
+                         [('student1', True), ('student3', False)])
+        self.assertEqual(list(database.export_rows("students", ["first_name"], False, 'batch1')), [('Jim',)])
+        self.assertEqual(list(database.export_rows("teachers", status=True)),
+                         [('teacher1', 'Ann', 'Lee', 560, 5000, True)])
+
+    def test_export_rows(self):
+        self.check_rows(self.database)
+        rows = self.database.export_rows("students", ["username"])
+        self.assertEqual(next(rows), ('student1',))
+        # Changes while the rows are streamed don't break the generator
+        self.database.remove_student('student2')
+        self.assertEqual(list(rows), [('student3',)])
+
+    def test_export_rows_from_columnar_snapshot(self):
+        Database.convert_to_columnar('testExport.bin', 'testExportColumnar.bin')
+        database = Database('testExportColumnar.bin', snapshot_format='columnar')
+        try:
+            self.check_rows(database)
+            # The rows were read from the columns
+            self.assertEqual(database._Database__students_table._loaded, {})
+        finally:
+            database.reset()
+
+    def test_export_rows_from_mvcc_view(self):
+        self.check_rows(Database('testExport.bin', mvcc=True))
+
+    def test_export_rows_from_sqlite(self):
+        database = Database('testExport.sqlite3', backend='sqlite')
+        try:
+            database.reset()
+            for name in ('batch1', 'batch2'):
+                database.add_batch(Batch(name))
+            for student in self.database.get_all_students(True) + self.database.get_all_students(False):
+                student.batch = database.get_batch(student.batch.name)
+                database.add_student(student, status=student.username != 'student3')
+            database.add_teacher(self.database.get_teacher('teacher1'), status=True)
+            self.check_rows(database)
+        finally:
+            database.close()
+            os.remove('testExport.sqlite3')
+
+    def test_invalid_exports(self):
+        with self.assertRaises(ValueError):
+            self.database.export_rows("batches")
+        with self.assertRaises(ValueError):
+            self.database.export_rows("students", ["password"])
+        with self.assertRaises(ValueError):
+            self.database.export_rows("teachers", batch_name='batch1')
+
+
+class PaginationTests(unittest.TestCase):
+    def setUp(self):
+        self.database = Database('testPages.bin')
+        self.database.reset()
+        self.fill(self.database)
+        self.database.save()
+
+    def tearDown(self):
+        self.database.reset()
+
+    @staticmethod
+    def fill(database):
+        database.add_batch(Batch('batch1'))
+        for i in range(25):
+            # Rolls mix ints and numeric strings, as the signup form and the imports do
+            database.add_student(Student(f'student{i:02}', 'pw', 'John', 'Doe', database.get_batch('batch1'), 1000,
+                                         24 - i if i % 2 else str(24 - i), 555), status=i % 5 != 0)
+        database.add_teacher(Teacher('teacher1', 'pw', 'Ann', 'Lee', 560, 5000), status=True)
+
+    def walk(self, database, **options):
+        # Usernames of every page, following the next cursors, then back with the prev cursors
+        pages, page = [], database.page("students", **options)
+        while True:
+            pages.append([student.username for student in page["items"]])
+            if page["next"] is None:
+                break
+            page = database.page("students", after=page["next"], **options)
+        backwards = [[student.username for student in page["items"]]]
+        while page["prev"] is not None:
+            page = database.page("students", before=page["prev"], **options)
+            backwards.insert(0, [student.username for student in page["items"]])
+        self.assertEqual(backwards, pages)
+        return pages
+
+    def check_pages(self, database):
+        approved = [f'student{i:02}' for i in range(25) if i % 5]
+        pages = self.walk(database, size=8)
+        self.assertEqual([len(page) for page in pages], [8, 8, 4])
+        self.assertEqual(sum(pages, []), approved)
+        self.assertEqual(sum(self.walk(database, order_by="roll", size=6), []), approved[::-1])
+        self.assertEqual(self.walk(database, status=False, size=10), [[f'student{i:02}' for i in range(0, 25, 5)]])
+        teachers = database.page("teachers")
+        self.assertEqual(([t.username for t in teachers["items"]], teachers["next"], teachers["prev"]),
+                         (['teacher1'], None, None))
+
+    def test_pages(self):
+        self.check_pages(self.database)
+        self.check_pages(Database('testPages.bin'))
+
+    def test_pages_follow_changes(self):
+        first = self.database.page("students", size=4)
+        self.database.add_student(Student('student00a', 'pw', 'New', 'Doe', self.database.get_batch('batch1'), 1,
+                                          99, 5), status=True)
+        self.database.update_student('student05', status=True)
+        self.database.remove_student('student02')
+        page = self.database.page("students", after=first["next"], size=4)
+        self.assertEqual([s.username for s in page["items"]], ['student05', 'student06', 'student07', 'student08'])
+        self.assertEqual([s.username for s in self.database.page("students", size=4)["items"]],
+                         ['student00a', 'student01', 'student03', 'student04'])
+        self.assertEqual([s.username for s in self.database.page("students", status=False)["items"]],
+                         ['student00', 'student10', 'student15', 'student20'])
+
+    def test_pages_from_mvcc_view(self):
+        self.check_pages(Database('testPages.bin', mvcc=True))
+
+    def test_pages_from_columnar_snapshot(self):
+        Database.convert_to_columnar('testPages.bin', 'testPagesColumnar.bin')
+        database = Database('testPagesColumnar.bin', snapshot_format='columnar')
+        try:
+            self.check_pages(database)
+        finally:
+            database.reset()
+
+    def test_pages_from_sqlite(self):
+        database = Database('testPages.sqlite3', backend='sqlite')
+        try:
+            database.reset()
+            self.fill(database)
+            pages = self.walk(database, size=8)
+            self.assertEqual(sum(pages, []), [f'student{i:02}' for i in range(25) if i % 5])
+            # SQLite sorts the int rolls before the text ones
+            rolls = [s.roll for s in sum(([database.get_student(u) for u in page]
+                                          for page in self.walk(database, order_by="roll", size=6)), [])]
+            self.assertEqual(len(rolls), 20)
+            self.assertEqual(rolls, sorted(rolls, key=lambda roll: (isinstance(roll, str), roll)))
+            self.assertEqual(self.walk(database, status=False, size=10), [[f'student{i:02}' for i in range(0, 25, 5)]])
+            with self.assertRaises(ValueError):
+                database.page("students", after=base64.urlsafe_b64encode(b'[[0, 1], "u"]').decode())
+        finally:
+            database.close()
+            os.remove('testPages.sqlite3')
+
+    def test_invalid_pages(self):
+        with self.assertRaises(ValueError):
+            self.database.page("students", order_by="fee")
+        with self.assertRaises(ValueError):
+            self.database.page("students", size=0)
+        with self.assertRaises(ValueError):
+            self.database.page("students", after="not a cursor")
+        # Well-formed JSON whose values can't be compared with the index keys
+        for key in ([[0, "zz", ""], "u"], [[0, 1], "u"], [[1, 0, ""], 2], ["a", "b", "c"]):
+            cursor = base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+            with self.assertRaises(ValueError):
+                self.database.page("students", after=cursor)
+            with self.assertRaises(ValueError):
+                self.database.page("students", before=cursor)
+
+
+class SQLiteDatabaseTests(unittest.TestCase):
+    def setUp(self):
+        self.database = Database('testDatabase.sqlite3', backend='sqlite')
+        self.database.reset()
+        self.subject = Subject('Math')
+        for name in ('batch1', 'batch2'):
+            batch = Batch(name)
+            batch.add_subject(self.subject)
+            self.database.add_batch(batch)
+        self.batch = self.database.get_batch('batch1')
+        self.student = Student('student1', 'password', 'John', 'Doe', self.batch, 1000, 1, 1234567890)
+        self.teacher = Teacher('teacher1', 'password', 'Jane', 'Doe', 5000, 12345)
+
+    def tearDown(self):
+        self.database.close()
+        os.remove('testDatabase.sqlite3')
+
+    def reopen(self):
+        self.database.close()
+        self.database = Database('testDatabase.sqlite3', backend='sqlite')
+        return self.database
+
+    def test_index_lookups(self):
+        self.database.add_student(self.student, status=True)
+        self.database.add_student(Student('student2', 'password', 'John', 'Doe', self.batch, 1000, 2, 55))
+        self.database.save()
+        database = self.reopen()
+        self.assertEqual([s.username for s in database.get_batch_students('batch1', True)], ['student1'])
+        self.assertEqual([s.username for s in database.get_batch_students('batch1', False)], ['student2'])
+        self.assertEqual(len(database.get_batch_students('batch1')), 2)
+        self.assertIs(database.get_student_by_roll('batch1', 2), database.get_student('student2'))
+        self.assertEqual([s.username for s in database.get_students_by_contact(55)], ['student2'])
+        self.assertEqual(database.get_batch_students('batch2', True), [])
+
+    def test_backend_is_selected_by_constructor(self):
+        self.assertIsInstance(self.database, SQLiteDatabase)
+        self.assertIsInstance(self.database, Database)
+        with self.assertRaises(ValueError):
+            Database('testDatabase.bin', backend='unknown')
+
+    def test_student_round_trip(self):
+        self.database.add_student(self.student)
+        self.assertIs(self.database.get_student('student1'), self.student)
+        self.assertEqual(self.batch.students, [self.student])
+        self.assertTrue(self.database.login('student1', 'password', as_student=True))
+        with self.assertRaises(ValueError):
+            self.database.add_student(self.student)
+        self.database.save()
+
+        student = self.reopen().get_student('student1')
+        self.assertEqual((student.first_name, student.fee, student.roll), ('John', 1000, 1))
+        self.assertEqual(student.batch.name, 'batch1')
+        self.assertEqual(student.batch.students, [student])
+
+    def test_unsaved_changes_are_rolled_back(self):
+        self.database.add_student(self.student)
+        self.assertIsNone(self.reopen().get_student('student1'))
+
+    def test_update_and_move_student(self):
+        self.database.add_student(self.student)
+        self.database.update_student('student1', first_name='NewJohn', fee=2000, status=True,
+                                     batch=self.database.get_batch('batch2'))
+        self.database.save()
+
+        database = self.reopen()
+        student = database.get_student('student1')
+        self.assertEqual((student.first_name, student.get_fee()), ('NewJohn', 2000))
+        self.assertEqual(database.get_batch('batch1').students, [])
+        self.assertEqual(database.get_batch('batch2').students, [student])
+        self.assertEqual(database.get_all_students(status=True), [student])
+
+    def test_update_with_unknown_batch_changes_nothing(self):
+        self.database.add_student(self.student)
+        with self.assertRaises(ValueError):
+            self.database.update_student('student1', fee=2000, batch=Batch('nonexistent_batch'))
+        self.assertEqual(self.database.get_student('student1').get_fee(), 1000)
+        self.assertEqual(self.database.get_total_fees(status=False), 1000)
+
+    def test_shared_api(self):
+        self.database.add_student(self.student)
+        self.assertFalse(self.database.refresh())
+        with self.database.transaction():
+            self.database.update_student('student1', fee=2000)
+            Teacher.update_student_attendance(self.student, datetime.date(2024, 1, 1), True)
+            self.database.mark_dirty('batch1')
+        self.assertTrue(self.database.verify_totals())
+        self.assertEqual(self.database.save_metrics(), {})
+        self.assertFalse(hasattr(self.database, 'snapshot'))  # Read views need the pickle backend
+        self.database.save()
+
+        student = self.reopen().get_student('student1')
+        self.assertEqual(student.get_fee(), 2000)
+        self.assertEqual(student.view_attendance(), {datetime.date(2024, 1, 1): True})
+
+    def test_aggregates_run_in_sql(self):
+        self.database.add_student(self.student, status=True)
+        self.database.add_student(Student('student2', 'password', 'A', 'B', self.batch, 500, 2, 1))
+        self.database.add_teacher(self.teacher, status=True)
+        self.assertEqual(self.database.get_total_fees(), 1000)
+        self.assertEqual(self.database.get_total_fees(status=False), 500)
+        self.assertEqual(self.database.get_total_salary(), 12345)
+        self.assertEqual(self.database.get_student_count(), 2)
+        self.assertEqual(self.database.get_student_count(status=False), 1)
+        self.assertEqual(self.database.get_fees_by_batch(), {'batch1': 1000, 'batch2': 0})
+        self.assertEqual(self.database.get_student_count_by_batch(), {'batch1': 2, 'batch2': 0})
+        self.assertEqual(self.database.get_teacher_count(status=True), 1)
+
+    def test_remove(self):
+        self.database.add_student(self.student)
+        self.database.add_teacher(self.teacher)
+        self.database.remove_student('student1')
+        self.database.remove_teacher('teacher1')
+        self.assertIsNone(self.database.get_student('student1'))
+        self.assertIsNone(self.database.get_teacher('teacher1'))
+        self.assertEqual(self.batch.students, [])
+        with self.assertRaises(ValueError):
+            self.database.remove_student('student1')
+
+    def test_object_changes_are_written_on_save(self):
+        self.database.add_student(self.student)
+        test = ClassTest('Test1', self.subject)
+        Teacher.assign_test_to_class(self.batch, test)
+        Teacher.update_student_marks(self.student, test, 90)
+        Teacher.update_student_attendance(self.student, date(2024, 1, 1), True)
+        self.database.save()
+
+        student = self.reopen().get_student('student1')
+        self.assertTrue(student.view_attendance()[date(2024, 1, 1)])
+        self.assertEqual(student.access_test_results(test), 90)
+        self.assertEqual(self.database.get_test_statistics(self.subject)['batch1']["mean"], 90)
+
+    def test_save_only_writes_changed_objects(self):
+        for i in range(200):
+            self.database.add_student(Student(f'student{i}', 'password', 'John', 'Doe', self.batch, 1000, i, 1),
+                                      status=True)
+        self.database.add_teacher(self.teacher, status=True)
+        self.database.save()
+        database = self.reopen()
+        writes = []
+        database._connection.set_trace_callback(
+            lambda statement: writes.append(statement) if statement.split()[0] in ('INSERT', 'UPDATE', 'DELETE')
+            else None)
+        students = database.get_all_students()
+        self.assertEqual(len(students), 200)
+        database.get_all_teachers()
+        database.page('students', size=50)
+        database.save()
+        self.assertEqual(writes, [])
+
+        Teacher.update_student_attendance(students[7], date(2024, 1, 1), True)
+        database.save()
+        self.assertEqual(len(writes), 2)  # The attendance rows of student7 (DELETE, INSERT)
+        self.assertTrue(all("student7" in statement for statement in writes))
+        self.assertEqual(self.reopen().get_student('student7').view_attendance(), {date(2024, 1, 1): True})
+
+    def test_threads_share_the_connection(self):
+        def worker(thread):
+            for i in range(50):
+                self.database.add_student(Student(f'thread{thread}-{i}', 'password', 'John', 'Doe', self.batch,
+                                                  1000, i, 1))
+                self.database.update_student(f'thread{thread}-{i}', fee=2000)
+                self.database.get_all_students(status=False)
+                self.database.save()
+
+        threads = [threading.Thread(target=worker, args=(thread,)) for thread in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        database = self.reopen()
+        self.assertEqual(database.get_student_count(), 200)
+        self.assertEqual(database.get_total_fees(status=False), 200 * 2000)
+        self.assertEqual(len(database.get_batch('batch1').students), 200)
+
+    def test_assignment_submissions_are_written_on_save(self):
+        self.database.add_student(self.student)
+        self.database.add_student(Student('student2', 'password', 'John', 'Doe', self.batch, 1000, 2, 1))
+        homework = Assignment('Homework', self.subject, date(2024, 2, 1))
+        Teacher.assign_assignment_to_class(self.batch, self.subject, homework)
+        Student.submit_assignment(self.student.view_assignments()[self.subject][0])
+        self.database.save()
+
+        database = self.reopen()
+        student = database.get_student('student1')
+        self.assertTrue(student.view_assignments()[self.subject][0]._submitted)
+        self.assertEqual(student.view_assignments()[self.subject][0].submitted_at,
+                         self.student.view_assignments()[self.subject][0].submitted_at)
+        database.get_student('student2')
+        self.assertEqual(student.batch.assignments.pending(homework), ['student2'])
+
+
 if __name__ == '__main__':
     unittest.main()
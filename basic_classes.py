@@ -1,5 +1,35 @@
+from collections.abc import MutableMapping
 from datetime import date
+from types import MappingProxyType
+from array import array
+import bisect
+import contextlib
+import copy
+import csv
+import itertools
+import json
+import math
+import operator
+import os
 import pickle
+import statistics
+import threading
+import time
+
+from storage import columnar, journal, sharded
+from storage.columnar import ColumnarSnapshot, LazyTable
+from storage.columns import ColumnStore
+from storage.indexes import SortedKeys, decode_cursor, encode_cursor, entry_value, sort_value
+from storage.locking import synchronized, transactional
+from storage.mvcc import DictVersion, ReadView, Versions, VersionedDict
+from storage.saver import BackgroundSaver
+from storage.shared import FileLock, fcntl, read_version, write_version
+from storage.sharded import ShardedTable
+
+try:
+    import numpy as np
+except ImportError:  # Optional, Database(columns=True) needs it (test statistics fall back to pure Python)
+    np = None
 
 
 # Design a Class Architecture based on /uml_diagram.puml
@@ -8,12 +38,698 @@ class Subject:
     def __init__(self, name: str):
         self.name = name
 
+    # Subjects are identified by name, so that they still match after being loaded from a file
+    def __eq__(self, other):
+        if isinstance(other, Subject):
+            return self.name == other.name
+        return False
+
+    def __hash__(self):
+        return hash(self.name)
+
+
+class _Slotted:
+    """
+    Base of the classes stored with __slots__ (no per-instance __dict__). They are pickled as a dict of their
+    slots, which is also how older versions (with a __dict__) were pickled, so both load.
+    """
+    __slots__ = ()
+    _slot_names = {}  # Dict[class: List[slot name as stored, e.g. '_User__password']]
+
+    @classmethod
+    def _slots(cls):
+        names = _Slotted._slot_names.get(cls)
+        if names is None:
+            names = []
+            for klass in reversed(cls.__mro__):
+                for name in klass.__dict__.get('__slots__', ()):
+                    if name == '__weakref__':
+                        continue
+                    if name.startswith('__'):
+                        name = f"_{klass.__name__.lstrip('_')}{name}"  # Private names are mangled
+                    names.append(name)
+            _Slotted._slot_names[cls] = names
+        return names
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self._slots() if hasattr(self, name)}
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple):  # (__dict__, slots), the default state of slotted objects
+            state = {**(state[0] or {}), **(state[1] or {})}
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+class _SeatMap:
+    """Seats of the students of a batch: the bit of each student in the bitsets of a store (Python ints)."""
+
+    def __init__(self):
+        self.seats = {}  # Dict[username: seat]
+        self.free = []  # Seats of removed students (their bits are cleared)
+
+    def seat(self, username: str) -> int:
+        seat = self.seats.get(username)
+        if seat is None:
+            seat = self.seats[username] = self.free.pop() if self.free else len(self.seats) + len(self.free)
+        return seat
+
+    def usernames(self, bitset: int) -> list:
+        # Usernames of the students whose bits are set
+        by_seat = {seat: username for username, seat in self.seats.items()}
+        usernames = []
+        while bitset:
+            low = bitset & -bitset
+            usernames.append(by_seat[low.bit_length() - 1])
+            bitset ^= low
+        return usernames
+
+
+class AttendanceStore(_SeatMap):
+    """
+    Attendance of the students of a batch. For every school day there is one bitset of the students whose
+    attendance was taken and one of the students who were present, indexed by the seat of the student in the
+    batch (Python ints are the bitsets, int.bit_count() the popcount).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.days = []  # Sorted list of the days with attendance
+        self.marked = {}  # Dict[date: bitset of the students whose attendance was taken]
+        self.present = {}  # Dict[date: bitset of the students who were present]
+
+    def __day(self, day: date):
+        if day not in self.marked:
+            bisect.insort(self.days, day)
+            self.marked[day] = self.present[day] = 0
+
+    def mark(self, username: str, day: date, present: bool):
+        """
+        Mark a student present or absent on a day.
+        :param username: Username of the student
+        :param day: Date of the attendance
+        :param present: True if the student was present
+        """
+        bit = 1 << self.seat(username)
+        self.__day(day)
+        self.marked[day] |= bit
+        self.present[day] = self.present[day] | bit if present else self.present[day] & ~bit
+
+    def mark_many(self, day: date, attendance: dict):
+        """
+        Mark the attendance of several students (e.g. the whole class) on a day at once.
+        :param day: Date of the attendance
+        :param attendance: Dict[username: bool (present)]
+        """
+        marked = present = 0
+        for username, is_present in attendance.items():
+            bit = 1 << self.seat(username)
+            marked |= bit
+            if is_present:
+                present |= bit
+        self.__day(day)
+        self.marked[day] |= marked
+        self.present[day] = (self.present[day] & ~marked) | present
+
+    def unmark(self, username: str, day: date):
+        seat = self.seats.get(username)
+        if seat is not None and day in self.marked:
+            self.marked[day] &= ~(1 << seat)
+            self.present[day] &= ~(1 << seat)
+
+    def get(self, username: str, day: date) -> bool | None:
+        """
+        :return: True (present), False (absent) or None (attendance not taken)
+        """
+        seat = self.seats.get(username)
+        if seat is None or not self.marked.get(day, 0) >> seat & 1:
+            return None
+        return bool(self.present[day] >> seat & 1)
+
+    def days_of(self, username: str):
+        # Yield (day, present) for every day the attendance of the student was taken
+        seat = self.seats.get(username)
+        if seat is None:
+            return
+        for day in self.days:
+            if self.marked[day] >> seat & 1:
+                yield day, bool(self.present[day] >> seat & 1)
+
+    def __days(self, start: date = None, end: date = None):
+        low = bisect.bisect_left(self.days, start) if start else 0
+        high = bisect.bisect_right(self.days, end) if end else len(self.days)
+        return self.days[low:high]
+
+    def day_total(self, day: date) -> tuple:
+        """
+        :return: (students present, students whose attendance was taken) on a day
+        """
+        return self.present.get(day, 0).bit_count(), self.marked.get(day, 0).bit_count()
+
+    def range_total(self, start: date = None, end: date = None) -> tuple:
+        """
+        :return: (presences, attendances taken) summed over the days from start to end (inclusive)
+        """
+        days = self.__days(start, end)
+        return (sum(self.present[day].bit_count() for day in days),
+                sum(self.marked[day].bit_count() for day in days))
+
+    def student_total(self, username: str, start: date = None, end: date = None) -> tuple:
+        """
+        :return: (days present, days the attendance was taken) for a student from start to end (inclusive)
+        """
+        seat = self.seats.get(username)
+        if seat is None:
+            return 0, 0
+        days = self.__days(start, end)
+        bit = 1 << seat  # Summing bit & bitset (bit or 0) over the days gives count * bit
+        return (sum(map(bit.__and__, map(self.present.__getitem__, days))) >> seat,
+                sum(map(bit.__and__, map(self.marked.__getitem__, days))) >> seat)
+
+    @staticmethod
+    def __count_bits(bitsets) -> list:
+        # Bit-sliced counter: bit k of the count of every seat is in planes[k] (a few int operations per bitset,
+        # whatever the number of students)
+        planes = []
+        for carry in bitsets:
+            for k, plane in enumerate(planes):
+                planes[k] = plane ^ carry
+                carry &= plane
+                if not carry:
+                    break
+            else:
+                if carry:
+                    planes.append(carry)
+        return planes
+
+    def student_totals(self, start: date = None, end: date = None) -> dict:
+        """
+        :return: Dict[username: (days present, days the attendance was taken)] for every student of the batch
+                 from start to end (inclusive)
+        """
+        days = self.__days(start, end)
+        present = self.__count_bits(self.present[day] for day in days)
+        marked = self.__count_bits(self.marked[day] for day in days)
+        return {username: (sum((plane >> seat & 1) << k for k, plane in enumerate(present)),
+                           sum((plane >> seat & 1) << k for k, plane in enumerate(marked)))
+                for username, seat in self.seats.items()}
+
+    def remove(self, username: str):
+        # Forget a student (clearing its bits, so that the seat can be reused)
+        seat = self.seats.pop(username, None)
+        if seat is None:
+            return
+        mask = ~(1 << seat)
+        for day in self.days:
+            self.marked[day] &= mask
+            self.present[day] &= mask
+        self.free.append(seat)
+
+    def move(self, username: str, other):
+        # Move the attendance of a student to the store of another batch
+        if other is self:
+            return
+        for day, present in list(self.days_of(username)):
+            other.mark(username, day, present)
+        self.remove(username)
+
+
+class AssignmentStore(_SeatMap):
+    """
+    Assignments of a batch. Each assignment is kept once, shared by the students it was assigned to, with a
+    bitset of those students, a bitset of the ones who submitted it and the time of their submissions.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.assignments = {}  # Dict[(subject, name, due date): Assignment], in the order they were assigned
+        self.assigned = {}  # Dict[key: bitset of the students the assignment was given to]
+        self.submitted = {}  # Dict[key: bitset of the students who submitted it]
+        self.submitted_at = {}  # Dict[key: Dict[username: time of the submission (time.time())]]
+
+    @staticmethod
+    def key(assignment) -> tuple:
+        return assignment.subject, assignment.name, assignment.due_date
+
+    def assign(self, assignment, usernames):
+        """
+        Give an assignment to students (an assignment equal to one already given is shared).
+        :param assignment: Assignment object
+        :param usernames: Usernames of the students
+        """
+        key = self.key(assignment)
+        self.assignments.setdefault(key, assignment)
+        bits = 0
+        for username in usernames:
+            bits |= 1 << self.seat(username)
+        self.assigned[key] = self.assigned.get(key, 0) | bits
+        self.submitted.setdefault(key, 0)
+
+    def submit(self, assignment, username: str, when: float = None):
+        """
+        Record the submission of an assignment by a student.
+        :param assignment: Assignment (or an equal one)
+        :param username: Username of the student
+        :param when: (Optional) Time of the submission, defaults to now
+        """
+        key = self.key(assignment)
+        seat = self.seats.get(username)
+        if seat is None or not self.assigned.get(key, 0) >> seat & 1:
+            raise ValueError("Assignment not given to the student.")
+        self.submitted[key] |= 1 << seat
+        self.submitted_at.setdefault(key, {})[username] = time.time() if when is None else when
+
+    def restore(self, assignment, username: str):
+        """
+        Give back to a student a standalone copy of an assignment (kept by older versions, SQLite rows) with its
+        submission (_submitted: True or the time of the submission).
+        """
+        self.assign(assignment.__copy__(), [username])
+        if assignment._submitted and not self.is_submitted(assignment, username):
+            self.submit(assignment, username,
+                        assignment._submitted if isinstance(assignment._submitted, float) else None)
+
+    def unsubmit(self, assignment, username: str):
+        key = self.key(assignment)
+        if username in self.seats and key in self.submitted:
+            self.submitted[key] &= ~(1 << self.seats[username])
+            self.submitted_at.get(key, {}).pop(username, None)
+
+    def is_submitted(self, assignment, username: str) -> bool:
+        seat = self.seats.get(username)
+        return seat is not None and bool(self.submitted.get(self.key(assignment), 0) >> seat & 1)
+
+    def submission_time(self, assignment, username: str) -> float | None:
+        return self.submitted_at.get(self.key(assignment), {}).get(username)
+
+    def assignments_of(self, username: str) -> list:
+        # Assignments given to a student, in the order they were assigned
+        seat = self.seats.get(username)
+        if seat is None:
+            return []
+        return [assignment for key, assignment in self.assignments.items() if self.assigned[key] >> seat & 1]
+
+    def submitted_by(self, assignment) -> list:
+        """
+        :return: Usernames of the students who submitted the assignment
+        """
+        return self.usernames(self.submitted.get(self.key(assignment), 0))
+
+    def pending(self, assignment) -> list:
+        """
+        :return: Usernames of the students the assignment was given to who have not submitted it
+        """
+        key = self.key(assignment)
+        return self.usernames(self.assigned.get(key, 0) & ~self.submitted.get(key, 0))
+
+    def remove(self, username: str):
+        # Forget a student (clearing its bits, so that the seat can be reused)
+        seat = self.seats.pop(username, None)
+        if seat is None:
+            return
+        mask = ~(1 << seat)
+        for key in self.assignments:
+            self.assigned[key] &= mask
+            self.submitted[key] &= mask
+            self.submitted_at.get(key, {}).pop(username, None)
+        self.free.append(seat)
+
+    def move(self, username: str, other):
+        # Move the assignments (and submissions) of a student to the store of another batch
+        if other is self:
+            return
+        for assignment in self.assignments_of(username):
+            other.assign(assignment, [username])
+            if self.is_submitted(assignment, username):
+                other.submit(assignment, username, self.submission_time(assignment, username))
+        self.remove(username)
+
+
+class _StudentAssignment:
+    """An assignment as seen by one student: the shared Assignment plus the submission of the student."""
+    __slots__ = ("store", "assignment", "username")
+
+    def __init__(self, store: AssignmentStore, assignment, username: str):
+        self.store = store
+        self.assignment = assignment
+        self.username = username
+
+    name = property(lambda self: self.assignment.name)
+    subject = property(lambda self: self.assignment.subject)
+    due_date = property(lambda self: self.assignment.due_date)
+
+    @property
+    def _submitted(self) -> bool:
+        return self.store.is_submitted(self.assignment, self.username)
+
+    @_submitted.setter
+    def _submitted(self, submitted: bool):
+        if submitted:
+            self.submit()
+        else:
+            self.store.unsubmit(self.assignment, self.username)
+
+    @property
+    def submitted_at(self) -> float | None:
+        return self.store.submission_time(self.assignment, self.username)
+
+    def submit(self):
+        if not self._submitted:
+            self.store.submit(self.assignment, self.username)
+
+    def __copy__(self):
+        # A standalone Assignment, _submitted holds the time of the submission when known
+        assignment = self.assignment.__copy__()
+        assignment._submitted = self.submitted_at or self._submitted
+        return assignment
+
+    def __eq__(self, other):
+        return self.assignment == getattr(other, "assignment", other)
+
+    def __repr__(self):
+        return f"<Assignment {self.name!r} of {self.username!r}, submitted={self._submitted}>"
+
+
+class _AttendanceView(MutableMapping):
+    """Dict[date: bool] view of the attendance of one student in the store of its batch."""
+
+    def __init__(self, store: AttendanceStore, username: str):
+        self.store = store
+        self.username = username
+
+    def __getitem__(self, day):
+        present = self.store.get(self.username, day)
+        if present is None:
+            raise KeyError(day)
+        return present
+
+    def __setitem__(self, day, present):
+        self.store.mark(self.username, day, present)
+
+    def __delitem__(self, day):
+        if self.store.get(self.username, day) is None:
+            raise KeyError(day)
+        self.store.unmark(self.username, day)
+
+    def __iter__(self):
+        return (day for day, _ in self.store.days_of(self.username))
+
+    def __len__(self):
+        return self.store.student_total(self.username)[1]
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+def _percentile(ordered: list, percent: float) -> float:
+    # Percentile of sorted values with linear interpolation (what numpy.percentile does by default)
+    position = (len(ordered) - 1) * percent / 100
+    low = math.floor(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def _mark_statistics(columns: list, percentiles=(25, 50, 75), bins=10) -> dict:
+    """
+    Statistics of marks in one pass over the columns (NumPy when installed).
+    :param columns: Arrays of marks (array('d'), NaN for no mark)
+    :param percentiles: Percentiles to compute (0-100)
+    :param bins: Number of bins of the histogram (equal width, from the lowest to the highest mark)
+    :return: Dict with count, mean, median, std (population), percentiles (Dict[percent: mark]) and
+             histogram (Dict with counts and edges), the statistics are None if there are no marks
+    """
+    if np is not None:
+        marks = np.concatenate([np.frombuffer(column, dtype=np.float64) for column in columns] or [np.empty(0)])
+        marks = marks[~np.isnan(marks)]
+        if not len(marks):
+            return {"count": 0, "mean": None, "median": None, "std": None,
+                    "percentiles": dict.fromkeys(percentiles), "histogram": {"counts": [], "edges": []}}
+        values = np.percentile(marks, [50, *percentiles])
+        counts, edges = np.histogram(marks, bins)
+        return {"count": len(marks), "mean": float(marks.mean()), "median": float(values[0]),
+                "std": float(marks.std()),
+                "percentiles": {percent: float(value) for percent, value in zip(percentiles, values[1:])},
+                "histogram": {"counts": counts.tolist(), "edges": edges.tolist()}}
+    marks = sorted(mark for column in columns for mark in column if mark == mark)  # NaN != NaN
+    if not marks:
+        return {"count": 0, "mean": None, "median": None, "std": None,
+                "percentiles": dict.fromkeys(percentiles), "histogram": {"counts": [], "edges": []}}
+    low, high = (marks[0], marks[-1]) if marks[0] != marks[-1] else (marks[0] - 0.5, marks[-1] + 0.5)
+    edges = [low + (high - low) * i / bins for i in range(bins + 1)]
+    counts = [0] * bins
+    for mark in marks:
+        counts[min(int((mark - low) / (high - low) * bins), bins - 1)] += 1
+    return {"count": len(marks), "mean": statistics.fmean(marks), "median": statistics.median(marks),
+            "std": statistics.pstdev(marks),
+            "percentiles": {percent: _percentile(marks, percent) for percent in percentiles},
+            "histogram": {"counts": counts, "edges": edges}}
+
+
+class MarkStore(_SeatMap):
+    """
+    Marks of the tests of a batch. Each test has one dense array of marks (array('d'), NaN: no mark) indexed by
+    the seat of the student in the batch, and a bitset of the students the test was given to.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.tests = {}  # Dict[(subject, test name): ClassTest], in the order they were given
+        self.assigned = {}  # Dict[key: bitset of the students the test was given to]
+        self.marks = {}  # Dict[key: array('d') of marks by seat]
+
+    def assign(self, test, usernames):
+        """
+        Give a test to students.
+        :param test: ClassTest object
+        :param usernames: Usernames of the students
+        """
+        key = test.subject, test.name
+        self.tests.setdefault(key, test)
+        self.marks.setdefault(key, array('d'))
+        bits = 0
+        for username in usernames:
+            bits |= 1 << self.seat(username)
+        self.assigned[key] = self.assigned.get(key, 0) | bits
+
+    def set_mark(self, subject: Subject, test_name: str, username: str, mark):
+        """
+        Set the mark of a student for a test (giving the test to the student if needed).
+        :param mark: Mark of the student, None to clear it
+        """
+        key = subject, test_name
+        if key not in self.tests:
+            self.assign(ClassTest(test_name, subject), [username])
+        seat = self.seat(username)
+        self.assigned[key] |= 1 << seat
+        column = self.marks[key]
+        if seat >= len(column):
+            column.extend([math.nan] * (seat + 1 - len(column)))
+        column[seat] = math.nan if mark is None else mark
+
+    def get_mark(self, subject: Subject, test_name: str, username: str):
+        """
+        :return: Mark of the student (None: not marked yet), KeyError if the test was not given to the student
+        """
+        key = subject, test_name
+        seat = self.seats.get(username)
+        if seat is None or not self.assigned.get(key, 0) >> seat & 1:
+            raise KeyError(test_name)
+        column = self.marks[key]
+        mark = column[seat] if seat < len(column) else math.nan
+        if mark != mark:  # NaN
+            return None
+        return int(mark) if mark.is_integer() else mark
+
+    def unassign(self, subject: Subject, test_name: str, username: str):
+        key = subject, test_name
+        seat = self.seats.get(username)
+        if seat is not None and key in self.tests:
+            self.assigned[key] &= ~(1 << seat)
+            if seat < len(self.marks[key]):
+                self.marks[key][seat] = math.nan
+
+    def tests_of(self, username: str, subject: Subject = None) -> list:
+        # Names of the tests given to a student (of one subject), in the order they were given
+        seat = self.seats.get(username)
+        if seat is None:
+            return []
+        return [name for (test_subject, name) in self.tests
+                if (subject is None or test_subject == subject) and self.assigned[test_subject, name] >> seat & 1]
+
+    def subjects_of(self, username: str) -> list:
+        seat = self.seats.get(username)
+        subjects = []
+        for (subject, name), bits in self.assigned.items():
+            if seat is not None and bits >> seat & 1 and subject not in subjects:
+                subjects.append(subject)
+        return subjects
+
+    def statistics(self, subject: Subject = None, test_name: str = None, percentiles=(25, 50, 75), bins=10) -> dict:
+        """
+        Statistics of the marks of one test, of all the tests of a subject, or of every test of the batch.
+        :param subject: (Optional) Subject of the tests
+        :param test_name: (Optional) Name of the test (with subject)
+        :param percentiles: Percentiles to compute (0-100)
+        :param bins: Number of bins of the histogram
+        :return: See _mark_statistics()
+        """
+        columns = [column for (test_subject, name), column in self.marks.items()
+                   if (subject is None or test_subject == subject) and (test_name is None or name == test_name)]
+        return _mark_statistics(columns, percentiles, bins)
+
+    def remove(self, username: str):
+        # Forget a student (clearing its marks, so that the seat can be reused)
+        seat = self.seats.pop(username, None)
+        if seat is None:
+            return
+        for key, column in self.marks.items():
+            self.assigned[key] &= ~(1 << seat)
+            if seat < len(column):
+                column[seat] = math.nan
+        self.free.append(seat)
+
+    def move(self, username: str, other):
+        # Move the tests (and marks) of a student to the store of another batch
+        if other is self:
+            return
+        for subject, name in [key for key in self.tests if username in self.seats
+                              and self.assigned[key] >> self.seats[username] & 1]:
+            other.assign(self.tests[subject, name], [username])
+            other.set_mark(subject, name, username, self.get_mark(subject, name, username))
+        self.remove(username)
+
+
+class _TestsView(MutableMapping):
+    """Dict[test name: mark] view of the marks of one student for one subject in the mark store of its batch."""
+
+    def __init__(self, store: MarkStore, subject: Subject, username: str):
+        self.store = store
+        self.subject = subject
+        self.username = username
+
+    def __getitem__(self, test_name):
+        return self.store.get_mark(self.subject, test_name, self.username)
+
+    def __setitem__(self, test_name, mark):
+        self.store.set_mark(self.subject, test_name, self.username, mark)
+
+    def __delitem__(self, test_name):
+        self.store.get_mark(self.subject, test_name, self.username)  # KeyError if not given
+        self.store.unassign(self.subject, test_name, self.username)
+
+    def __iter__(self):
+        return iter(self.store.tests_of(self.username, self.subject))
+
+    def __len__(self):
+        return len(self.store.tests_of(self.username, self.subject))
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class Roster:
+    """
+    Students of a batch in enrollment order, keyed by username: adding, removing, moving and membership tests
+    are O(1). Iterates and indexes like the list it replaces, but only the first and last students (roster[0],
+    roster[-1]) are O(1): other positions walk the roster from the nearest end, O(n) (iterate instead of indexing in
+    a loop).
+    """
+
+    def __init__(self, students=()):
+        self._students = {}  # Dict[username: Student], in enrollment order
+        for student in students:
+            self.append(student)
+
+    def append(self, student):
+        if student.username in self._students:
+            raise ValueError("Student already in the batch.")
+        self._students[student.username] = student
+
+    def remove(self, student):
+        if self._students.get(student.username) is not student:
+            raise ValueError("Student not in the batch.")
+        del self._students[student.username]
+
+    def move(self, student, other):
+        # Move a student to the roster of another batch (at the end of its enrollment order)
+        self.remove(student)
+        other.append(student)
+
+    def replace(self, student):
+        # Put another object of the same student in its place (mvcc=True changes a copy of the student)
+        if student.username not in self._students:
+            raise ValueError("Student not in the batch.")
+        self._students[student.username] = student
+
+    def get(self, username: str):
+        return self._students.get(username)
+
+    def copy(self):
+        roster = Roster()
+        roster._students = self._students.copy()
+        return roster
+
+    def __contains__(self, student):
+        if isinstance(student, str):
+            return student in self._students
+        return self._students.get(student.username) is student
+
+    def __iter__(self):
+        # Iterate a copy: like a list, the roster may grow while a reader (mvcc=True) is iterating it
+        return iter(list(self._students.values()))
+
+    def __reversed__(self):
+        return reversed(self._students.values())
+
+    def __len__(self):
+        return len(self._students)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self._students.values())[index]
+        index = operator.index(index)  # TypeError for non-integers, like a list
+        length = len(self._students)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("Roster index out of range.")
+        if index < length // 2:
+            return next(itertools.islice(self._students.values(), index, None))
+        return next(itertools.islice(reversed(self._students.values()), length - 1 - index, None))
+
+    def __eq__(self, other):
+        if isinstance(other, Roster):
+            return list(self) == list(other)
+        return isinstance(other, list) and list(self) == other
+
+    def __repr__(self):
+        return f"Roster({list(self._students)!r})"
+
 
 class Batch:
     def __init__(self, name: str):
         self.name = name
-        self.students = []  # List of students enrolled in the batch
+        self.students = Roster()  # Students enrolled in the batch
         self.subjects = []  # List of subjects taught in the batch
+        self.attendance = AttendanceStore()  # Attendance of the students, by day
+        self.assignments = AssignmentStore()  # Assignments given to the students and their submissions
+        self.marks = MarkStore()  # Tests given to the students and their marks
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "attendance" not in state:  # Pickled by an older version (attendance was kept by each student)
+            self.attendance = AttendanceStore()
+        if "assignments" not in state:  # Pickled by an older version (each student had copies of the assignments)
+            self.assignments = AssignmentStore()
+        if "marks" not in state:  # Pickled by an older version (marks were kept by each student)
+            self.marks = MarkStore()
+        if isinstance(self.students, list):  # Pickled by an older version (students were kept in a list)
+            self.upgrade_roster()
+
+    def upgrade_roster(self):
+        # Students still being unpickled (no state yet) cannot be keyed: the loader calls this again afterwards
+        if isinstance(self.students, list) and all(hasattr(student, "username") for student in self.students):
+            self.students = Roster(self.students)
 
     def add_student(self, student):
         self.students.append(student)
@@ -21,9 +737,22 @@ class Batch:
     def add_subject(self, subject):
         self.subjects.append(subject)
 
+    def move_records(self, username: str, other):
+        # Move the attendance, assignments and marks of a student to another batch
+        self.attendance.move(username, other.attendance)
+        self.assignments.move(username, other.assignments)
+        self.marks.move(username, other.marks)
+
+    def remove_records(self, username: str):
+        self.attendance.remove(username)
+        self.assignments.remove(username)
+        self.marks.remove(username)
 
-class Assignment:
+
+class Assignment(_Slotted):
     # Each Student has a list of assignments for each subject
+    __slots__ = ("name", "due_date", "subject", "_submitted")
+
     def __init__(self, name: str, subject: Subject, due_date: date):
         self.name = name
         self.due_date = due_date
@@ -39,8 +768,14 @@ class Assignment:
         """
 
         for student in batch.students:
-            # Create a copy of the assignment and assign it to the student
-            student.view_assignments()[subject].append(self.__copy__())
+            student.upgrade_records()  # Moves assignments pickled by older versions to the store first
+        if subject != self.subject:
+            assignment = self.__copy__()
+            assignment.subject = subject
+        else:
+            assignment = self
+        # One Assignment shared by the students of the batch (their submissions are kept by batch.assignments)
+        batch.assignments.assign(assignment, [student.username for student in batch.students])
 
     def submit(self):
         self._submitted = True
@@ -54,7 +789,9 @@ class Assignment:
         return False
 
 
-class ClassTest:
+class ClassTest(_Slotted):
+    __slots__ = ("name", "subject", "__mark")
+
     def __init__(self, name: str, subject: Subject):
         self.name = name
         self.subject = subject
@@ -67,7 +804,9 @@ class ClassTest:
         :return:
         """
         for student in batch.students:
-            student.view_tests()[self.subject][self.name] = self.__copy__()  # {Subject : {Test : mark}}
+            student.upgrade_records()  # Moves marks pickled by older versions to the store first
+        # The marks of the students are kept by batch.marks, one array per test
+        batch.marks.assign(self, [student.username for student in batch.students])
 
     def getmark(self):
         return self.__mark
@@ -81,10 +820,12 @@ class ClassTest:
         return False
 
 
-class User:
+class User(_Slotted):
     """
     User class to store information about the user.
     """
+    __slots__ = ("username", "__password", "first_name", "last_name", "contact",
+                 "__weakref__")  # SQLiteDatabase keeps users in a weak identity map
 
     def __init__(self, username: str, password: str, first_name: str, last_name: str, contact: int):
         self.username = username
@@ -102,6 +843,8 @@ class User:
 
 
 class Student(User):
+    __slots__ = ("roll", "fee", "batch", "subjects_enrolled", "__attendance", "__assignments", "__class_tests")
+
     def __init__(self, username: str, password: str,
                  first_name: str, last_name: str, batch: Batch,
                  fee: int, roll: int,
@@ -117,7 +860,7 @@ class Student(User):
         :param fee: Fees of student
         :param roll: Roll number of student
         :param contact : Phone Number of student
-        :param attendance: (Optional) Dictionary of attendance for each date, If not provided, initializes to None
+        :param attendance: (Optional) Dictionary of attendance for each date, stored in the attendance of the batch
         :param subjects_enrolled: (Optional) List of subjects enrolled, If not provided, inherits from the batch
         """
         super().__init__(username, password, first_name, last_name, contact)
@@ -128,29 +871,81 @@ class Student(User):
         # subjects_enrolled = List[Subject]
         self.subjects_enrolled = subjects_enrolled if subjects_enrolled else batch.subjects
 
-        # attendance = Dict[Date: bool]
-        self.__attendance = attendance if attendance else {}
+        # Attendance is kept in batch.attendance, __attendance only holds a dict pickled by older versions
+        self.__attendance = None
+        if attendance:
+            for attendance_date, present in attendance.items():
+                batch.attendance.mark(username, attendance_date, present)
 
-        # assignments = Dict[Subject:List[Assignment]]
-        self.__assignments = dict.fromkeys(self.subjects_enrolled, [])
+        # Assignments are kept in batch.assignments, __assignments only holds a dict pickled by older versions
+        self.__assignments = None
 
-        # marks = Dict[Subject:Dict[test.name: Test]]
-        self.__class_tests = dict.fromkeys(self.subjects_enrolled, {})
+        # Marks are kept in batch.marks, __class_tests only holds a dict pickled by older versions
+        self.__class_tests = None
 
     def get_fee(self):
         return self.fee
 
     def view_tests(self):
-        return self.__class_tests  # Use the frontend to display the marks as a table
+        """
+        Marks of the student, Dict[Subject: Dict[test name: mark (None: not marked yet)]], each a view of the mark
+        store of its batch. Use the frontend to display the marks as a table.
+        """
+        self.upgrade_records()
+        store = self.batch.marks
+        subjects = self.subjects_enrolled + [subject for subject in store.subjects_of(self.username)
+                                             if subject not in self.subjects_enrolled]
+        return {subject: _TestsView(store, subject, self.username) for subject in subjects}
 
     def view_assignments(self):
-        return self.__assignments
+        """
+        Assignments of the student, Dict[Subject: List[assignment]], read from the assignment store of its batch.
+        Each assignment is shared with the batch, submit() records the submission of this student only.
+        """
+        self.upgrade_records()
+        store = self.batch.assignments
+        assignments = {subject: [] for subject in self.subjects_enrolled}
+        for assignment in store.assignments_of(self.username):
+            assignments.setdefault(assignment.subject, []).append(_StudentAssignment(store, assignment, self.username))
+        return assignments
 
     def view_attendance(self):
-        return self.__attendance
+        """
+        Attendance of the student as a Dict[date: bool] view of the attendance store of its batch.
+        """
+        self.upgrade_records()
+        return _AttendanceView(self.batch.attendance, self.username)
+
+    def upgrade_records(self):
+        # Move the attendance and assignments pickled by older versions (kept by the student) to its batch
+        if self.__attendance:
+            for attendance_date, present in self.__attendance.items():
+                self.batch.attendance.mark(self.username, attendance_date, present)
+        self.__attendance = None
+        if self.__assignments:
+            for assignments in self.__assignments.values():
+                for assignment in assignments:
+                    self.batch.assignments.restore(assignment, self.username)
+        self.__assignments = None
+        if self.__class_tests:
+            for subject, tests in self.__class_tests.items():
+                for test_name, mark in tests.items():
+                    # Tests given but not marked yet were kept as a copy of the ClassTest
+                    self.batch.marks.set_mark(subject, test_name, self.username,
+                                              mark.getmark() if isinstance(mark, ClassTest) else mark)
+        self.__class_tests = None
+
+    def legacy_assignments(self) -> dict:
+        # Assignments as older versions kept them, Dict[Subject: List[Assignment]] (_submitted: time or False)
+        return {subject: [copy.copy(assignment) for assignment in assignments]
+                for subject, assignments in self.view_assignments().items() if assignments}
+
+    def legacy_tests(self) -> dict:
+        # Marks as older versions kept them, Dict[Subject: Dict[test name: mark]]
+        return {subject: dict(tests) for subject, tests in self.view_tests().items() if tests}
 
     def access_all_tests(self, subject: Subject):
-        return self.__class_tests[subject]  # Return all {test_name: Test} of a subject
+        return self.view_tests()[subject]  # Return all {test_name: mark} of a subject
 
     def access_test_results(self, test: ClassTest):
         """
@@ -158,7 +953,10 @@ class Student(User):
         :param test: Test for which the marks are accessed
         :return:
         """
-        return self.view_tests()[test.subject].get(test.name)  # Return marks of the test
+        try:
+            return self.batch.marks.get_mark(test.subject, test.name, self.username)  # Return marks of the test
+        except KeyError:
+            return None
 
     @staticmethod
     def submit_assignment(assignment: Assignment):
@@ -167,7 +965,7 @@ class Student(User):
         :param assignment:
         :return:
         """
-        assignment._submitted = True
+        assignment.submit()
 
 
 class Teacher(User):
@@ -175,6 +973,7 @@ class Teacher(User):
     Teacher class to store information about the teacher.
     This teacher class is a utility class (has only static methods).
     """
+    __slots__ = ("salary", "join_date")
 
     def __init__(self, username: str, password: str, first_name: str, last_name: str, contact: int, salary: int,
                  join_date: date = date.today()):
@@ -241,6 +1040,20 @@ class Teacher(User):
         # print(f"{student.view_attendance()=}")
         student.view_attendance()[attendance_date] = present
 
+    @staticmethod
+    def update_class_attendance(batch: Batch, attendance_date: date, attendance: dict):
+        """
+        Update the attendance of several students of a batch (e.g. the whole class) at once.
+        :param batch: Batch of the students
+        :param attendance_date: Date of the attendance
+        :param attendance: Dict[Student: bool] (True if the student is present)
+        :return:
+        """
+        for student in attendance:
+            student.upgrade_records()  # Moves attendance pickled by older versions to the store first
+        batch.attendance.mark_many(attendance_date,
+                                   {student.username: present for student, present in attendance.items()})
+
     @staticmethod
     def update_student_marks(student: Student, test: ClassTest, marks: int):
         """
@@ -262,24 +1075,470 @@ class Teacher(User):
         """
         marks = {}
         for student in batch.students:
-            marks[student.first_name + ' ' + student.last_name] = student.view_tests()[test.subject][test]
+            marks[student.first_name + ' ' + student.last_name] = student.access_test_results(test)
         return marks
 
+    @staticmethod
+    def get_test_statistics(batch: Batch, subject: Subject = None, test: ClassTest = None,
+                            percentiles=(25, 50, 75), bins=10) -> dict:
+        """
+        Statistics of the marks of a test, of a subject or of the whole batch.
+        :param batch: Batch of the students
+        :param subject: (Optional) Subject of the tests
+        :param test: (Optional) Test (Provide a Test object)
+        :param percentiles: Percentiles to compute (0-100)
+        :param bins: Number of bins of the histogram
+        :return: Dict with count, mean, median, std, percentiles and histogram
+        """
+        if test is not None:
+            return batch.marks.statistics(test.subject, test.name, percentiles, bins)
+        return batch.marks.statistics(subject, None, percentiles, bins)
+
+
+IMPORT_FIELDS = ("username", "password", "first_name", "last_name", "batch", "fee", "roll", "contact")
+
+
+def _import_rows(file, file_format: str):
+    """
+    Read the rows of an import file one by one.
+    :param file: Text file (CSV with a header line, or JSON Lines)
+    :param file_format: 'csv' or 'jsonl'
+    :return: Generator of (line number, Dict[field: value] or the error of a malformed line)
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(file)
+        try:
+            reader.fieldnames
+        except csv.Error as error:  # No row can be read without the header
+            yield reader.line_num, ValueError(f"Invalid CSV: {error}")
+            return
+        while True:
+            # A malformed line (e.g. a field over csv.field_size_limit()) only fails its row, the reader goes on
+            start = reader.line_num + 1
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as error:
+                yield start, ValueError(f"Invalid CSV: {error}")
+                continue
+            yield reader.line_num, row
+    elif file_format == 'jsonl':
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                yield line_number, ValueError(f"Invalid JSON: {error}")
+                continue
+            yield line_number, row if isinstance(row, dict) else ValueError("Expected a JSON object.")
+    else:
+        raise ValueError(f"Unknown import format {file_format!r} (expected 'csv' or 'jsonl').")
+
+
+def _import_students(rows, get_batch, status: bool, report: dict, max_errors: int):
+    """
+    Validate the rows of an import and turn them into students. Invalid rows are recorded in the report.
+    :param rows: Generator of (line number, row) (see _import_rows)
+    :param get_batch: Function returning the Batch of a name (or None)
+    :param status: Status of the students whose row has no status
+    :return: Generator of (line number, Student, status)
+    """
+    batches = {}
+    for line_number, row in rows:
+        report["rows"] += 1
+        try:
+            if isinstance(row, Exception):
+                raise row
+            missing = [field for field in IMPORT_FIELDS if row.get(field) in (None, "")]
+            if missing:
+                raise ValueError(f"Missing {', '.join(missing)}.")
+            batch_name = str(row["batch"])
+            if batch_name not in batches:
+                batches[batch_name] = get_batch(batch_name)
+            if batches[batch_name] is None:
+                raise ValueError(f"Batch {batch_name!r} not found.")
+            try:
+                fee = int(row["fee"])
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid fee {row['fee']!r}.")
+            if fee < 0:
+                raise ValueError(f"Invalid fee {row['fee']!r}.")
+            row_status = row.get("status")
+            if isinstance(row_status, str):
+                row_status = row_status.strip().lower() in ("1", "true", "yes") if row_status.strip() else None
+            student = Student(str(row["username"]), str(row["password"]), str(row["first_name"]),
+                              str(row["last_name"]), batches[batch_name], fee, row["roll"], row["contact"])
+        except ValueError as error:
+            _import_error(report, line_number, error, max_errors)
+            continue
+        yield line_number, student, status if row_status is None else bool(row_status)
+
+
+def _import_error(report: dict, line_number: int, error: Exception, max_errors: int):
+    # Only the first max_errors errors are kept, so that a bad file does not fill the memory
+    report["failed"] += 1
+    if len(report["errors"]) < max_errors:
+        report["errors"].append((line_number, str(error)))
+
+
+def _chunks(iterable, size: int):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def _open_import(source, file_format: str = None):
+    """
+    :param source: Path of the file (the format is guessed from the extension) or an open text file
+    :return: Context manager of the text file, format
+    """
+    if isinstance(source, (str, os.PathLike)):
+        if file_format is None:
+            file_format = 'jsonl' if str(source).lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+        return open(source, newline='', encoding='utf-8'), file_format
+    return contextlib.nullcontext(source), file_format or 'csv'
+
 
 class Database:
     """
     Database class to store all the data of the school.
     Batches must be created before students are added to the database.
+
+    With journal=True every add/update/remove is appended to a write-ahead log (save_file + '.log') when save()
+    is called, instead of re-pickling the whole database. The snapshot (save_file) is only rewritten at
+    checkpoints, which happen automatically once the log holds checkpoint_interval records (or on checkpoint()).
+    load() reads the snapshot and replays the log on top of it.
+    Changes made directly on Student/Teacher objects (attendance, marks, ...) are not journaled: make them inside
+    transaction() (or report them with mark_dirty()) and the next save writes a checkpoint instead.
+
+    With save_window set, save() hands the work to a background thread that writes one snapshot (or journal
+    append) for all the save() calls made within save_window seconds (group commit). save(wait=False) returns
+    immediately, save() blocks until the change is durable. save_metrics() reports the batch sizes and latencies.
+
+    With snapshot_format='sharded' the snapshot is split into one segment per batch (save_file + '.batch-<name>',
+    holding the batch and its students), a teachers segment (save_file + '.teachers'), the counters and sums
+    (save_file + '.totals') and a small index segment (save_file itself, username -> batch). save() only rewrites
+    the segments changed since the last save, and a batch segment is only read when one of its students is needed.
+    Changes made directly on objects (attendance, marks, ...) must be made inside transaction() or reported with
+    mark_dirty().
+
+    With snapshot_format='columnar' the snapshot is written as a ColumnarSnapshot. Loading a columnar snapshot
+    (whatever snapshot_format is) only maps the file: students and teachers are unpickled when they are first
+    accessed, and a batch is filled with its students when it is first used.
+
+    With shared=True several processes (e.g. the workers of a prefork server) can use the same files. A version
+    stamp (save_file + '.version') is bumped on every write and writes hold an exclusive lock on save_file + '.lock'.
+    Every add/update/remove is a transaction: it takes the lock, reloads the database if another process changed it,
+    applies the change and saves it before releasing the lock, so no update is lost. refresh() (cheap when nothing
+    changed) should be called at the start of each request. Changes made directly on objects should be done inside
+    transaction(), which reloads the latest state first and saves on exit.
+
+    With mvcc=True readers never take the lock: every get_*/login reads an immutable ReadView published by the
+    last write (snapshot() returns it, for several consistent reads), while writers are serialized by the database
+    lock. The tables and indexes are versioned dicts that each view reads as of its version (a write records its
+    changes instead of copying the tables), update_student/update_teacher change a copy of the object and batch
+    rosters are copied on write (iterating one is always safe). Changes made directly on objects are shared. With
+    pickle snapshots save() writes the published view without taking the writer lock. The first view materializes
+    lazily loaded (columnar / sharded) tables.
+
+    Counts and sums per status (get_student_count, get_teacher_count, get_total_fees, get_total_salary) are kept
+    up to date by the add/update/remove methods, so they are O(1). They are recomputed when the database is loaded;
+    fees or salaries changed directly on the objects are not tracked (verify_totals() checks them).
+
+    Students are also indexed by the keys declared in STUDENT_INDEXES (find_students, get_batch_students,
+    get_student_by_roll, get_students_by_contact). The indexes are kept up to date by the add/update/remove
+    methods; load() drops them and they are rebuilt from the tables on the next lookup (right away with mvcc).
+
+    With columns=True (needs NumPy) fee, roll, status and batch of every student and salary and status of every
+    teacher are also kept in NumPy arrays, updated by the add/update/remove methods and rebuilt on load, and the
+    per-batch breakdowns (get_fees_by_batch, get_student_count_by_batch) run as vectorized reductions.
+
+    The options can be combined, except shared with save_window. The file formats, the read views and the other
+    building blocks live in the storage package (storage.journal, storage.sharded, storage.columnar, ...).
+
+    Database(..., backend='sqlite') returns a storage.sqlite.SQLiteDatabase, which has the same API but keeps the
+    data in an indexed SQLite file instead of in memory. It takes no other option and has no snapshot().
     """
 
-    def __init__(self, save_file='database.bin'):
+    SNAPSHOT_FORMATS = ('pickle', 'columnar', 'sharded')
+    # Secondary indexes on students: index name -> fields of the key ("batch" is the batch name, "status" the
+    # approval status, anything else a Student attribute)
+    STUDENT_INDEXES = {
+        "batch_status": ("batch", "status"),
+        "batch_roll": ("batch", "roll"),
+        "contact": ("contact",),
+        "status": ("status",),
+    }
+    # Columns of export_rows: kind -> fields ("batch" is the batch name, "status" the approval status)
+    EXPORT_COLUMNS = {
+        "students": ("username", "first_name", "last_name", "batch", "roll", "fee", "contact", "status"),
+        "teachers": ("username", "first_name", "last_name", "contact", "salary", "status"),
+    }
+    # Ordered indexes used by page(): kind -> fields the pages can be sorted by
+    PAGE_KEYS = {
+        "students": ("username", "roll"),
+        "teachers": ("username",),
+    }
+    BACKENDS = ('pickle', 'sqlite')
+
+    def __new__(cls, *args, backend='pickle', **kwargs):
+        if backend not in cls.BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}.")
+        if cls is Database and backend == 'sqlite':
+            if kwargs.get('mvcc'):
+                raise ValueError("mvcc=True (read views) needs the pickle backend.")
+            from storage.sqlite import SQLiteDatabase  # storage.sqlite imports this module
+
+            cls = SQLiteDatabase
+        return super().__new__(cls)
+
+    def __init__(self, save_file='database.bin', journal=False, checkpoint_interval=1000, snapshot_format='pickle',
+                 backend='pickle', save_window=None, shared=False, mvcc=False, columns=False):
+        """
+        :param save_file: Path of the snapshot file
+        :param journal: (Optional) Append changes to a write-ahead log instead of rewriting the snapshot on save
+        :param checkpoint_interval: (Optional) Number of journal records after which save() rewrites the snapshot
+        :param snapshot_format: (Optional) 'pickle', 'columnar' (memory-mapped, loaded lazily) or 'sharded'
+                                (one segment per batch, only changed segments are written)
+        :param backend: (Optional) 'pickle' (in memory, this class) or 'sqlite' (SQLiteDatabase)
+        :param save_window: (Optional) Seconds during which save() calls are coalesced by a background thread
+        :param shared: (Optional) Keep the database coherent with other processes using the same files
+        :param mvcc: (Optional) Readers use immutable snapshots published by the writers and never block
+        :param columns: (Optional) Keep NumPy columns of the tables for vectorized aggregates (needs NumPy)
+        """
+        if snapshot_format not in self.SNAPSHOT_FORMATS:
+            raise ValueError(f"Unknown snapshot format {snapshot_format!r}.")
+        if shared and fcntl is None:
+            raise ValueError("shared=True needs file locking (fcntl), which is not available on this platform.")
+        if shared and save_window is not None:
+            raise ValueError("shared=True saves inside each transaction, it cannot be used with save_window.")
+        if columns and np is None:
+            raise ValueError("columns=True needs NumPy, which is not installed.")
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()  # Serializes snapshot writes done outside of the writer lock
+        self._saver = None
+        self.mvcc = mvcc
+        self._view = ReadView(MappingProxyType({}), MappingProxyType({}), MappingProxyType({}))
+        self.__versions = Versions()  # Versions of the tables read by the published views (mvcc=True)
+        self.__totals = {"students": {}, "teachers": {}}  # Dict[kind: Dict[status: [count, fee / salary sum]]]
+        self.__indexes = None  # Dict[index_name: Dict[key: Dict[username: None]]] (None: to be rebuilt)
+        # Dict[(kind, field): Dict[status: SortedKeys of (sort value, username)]] (None: to be rebuilt)
+        self.__ordered = None
+        self.columns = columns
+        self.__columns = None  # ColumnStore (columns=True)
+        self.__unpublished = set()  # Changes not in the published view yet (segment names, see __touch)
+        self._writer = None  # Thread changing the tables (it reads them directly, not through the view)
         self.save_file = save_file
-        if not self.load():
-            self.__teachers_table = {}  # Dict[username: Dict[teacher: Teacher, status : str]]
-            self.__students_table = {}  # Dict[username: Dict[student: Student, status : str]]
-            self.__batches_table = {}  # Dict[batch_name: Batch]
+        self.snapshot_format = snapshot_format
+        self.__unhydrated = {}  # Dict[batch_name: List[row]], batches whose students are still in the snapshot
+        self.__unloaded = set()  # Batch segments of a sharded snapshot that have not been read yet
+        self.__dirty = None  # Segments changed since the last save (None: everything)
+        self.journal = journal
+        self.journal_file = save_file + '.log'
+        self.checkpoint_interval = checkpoint_interval
+        self._journal_seq = 0  # Sequence number of the last journaled change
+        self._journal_records = 0  # Records in the log file since the last checkpoint
+        self._pending = []  # Encoded records waiting for the next save()
+        self._replaying = False
+        self._importing = False  # Changes of a bulk import are not journaled (it ends with a checkpoint)
+        self._direct_changes = False  # Objects may have been changed outside the journaled API (see transaction)
+        self.shared = shared
+        self.version_file = save_file + '.version'
+        self._version = None  # Version stamp of the files the tables were loaded from
+        self._file_lock = FileLock(save_file + '.lock')  # shared=True
+        with self._lock, self.__file_lock():
+            if not self.load():
+                self.__teachers_table = {}  # Dict[username: Dict[teacher: Teacher, status : str]]
+                self.__students_table = {}  # Dict[username: Dict[student: Student, status : str]]
+                self.__batches_table = {}  # Dict[batch_name: Batch]
+
+                self.checkpoint()  # Write the initial snapshot
+            self._version = read_version(self.version_file)
+        if save_window is not None:
+            self._saver = BackgroundSaver(self.__persist, save_window)
+            self._saver.start()
+
+    # Cross-process coherence (shared=True)
+    @contextlib.contextmanager
+    def __file_lock(self, exclusive=True):
+        # Hold the lock file (exclusive for writers, shared for readers). No-op unless shared.
+        if not self.shared:
+            yield
+            return
+        with self._file_lock.hold(exclusive):
+            yield
+
+    def __bump_version(self):
+        # Called with the exclusive lock held
+        self._version = read_version(self.version_file) + 1
+        write_version(self.version_file, self._version)
+
+    def __refresh(self) -> bool:
+        # Called with the lock held
+        version = read_version(self.version_file)
+        if version == self._version:
+            return False
+        self._pending = []
+        self._direct_changes = False
+        self.load()
+        self._version = version
+        return True
 
-            self.save()  # Save the database to a json file
+    def refresh(self) -> bool:
+        """
+        Reload the database if another process wrote to it since it was loaded. When nothing changed this is a
+        single read of the small version file. Only does something with shared=True.
+        :return: True if the database was reloaded
+        """
+        if not self.shared:
+            return False
+        with self._lock:
+            if self._file_lock.held:  # Inside a transaction, the tables are already up to date
+                return False
+            with self.__file_lock(exclusive=False):
+                return self.__refresh()
+
+    def import_students(self, source, file_format: str = None, status=False, chunk_size=1000,
+                        max_errors=100) -> dict:
+        """
+        Bulk import students from a CSV (with a header line) or JSON Lines file, streamed row by row.
+        Rows need the fields username, password, first_name, last_name, batch (name of an existing batch), fee,
+        roll and contact, and may have a status. Invalid rows are reported and skipped, the valid ones are added
+        in chunks (one transaction each) and the database is persisted once at the end.
+        :param source: Path of the file (format from the extension: .csv, .jsonl) or an open text file
+        :param file_format: (Optional) 'csv' or 'jsonl'
+        :param status: Status of the students whose row has no status (True: Approved, False: Waiting for approval)
+        :param chunk_size: Number of students added per transaction
+        :param max_errors: Number of errors kept in the report (all of them are counted)
+        :return: Dict with rows (read), imported, failed and errors (List[(line number, message)])
+        """
+        report = {"rows": 0, "imported": 0, "failed": 0, "errors": []}
+        file, file_format = _open_import(source, file_format)
+        # Other writers wait for the end of the import: their changes would not be journaled while _importing is
+        # set. With shared=True the whole import is one transaction, so the files are written only once.
+        with file as f, self._lock, (self._transaction() if self.shared else contextlib.nullcontext()):
+            students = _import_students(_import_rows(f, file_format), self.get_batch, status, report, max_errors)
+            self._importing = self.journal
+            try:
+                for chunk in _chunks(students, chunk_size):
+                    with self._transaction():
+                        for line_number, student, student_status in chunk:
+                            try:
+                                self.add_student(student, student_status)
+                                report["imported"] += 1
+                            except ValueError as error:
+                                _import_error(report, line_number, error, max_errors)
+            finally:
+                self._importing = False
+                if self.journal:
+                    self.checkpoint()  # The imported students are only in memory until the snapshot is written
+        if not self.shared:
+            self.save()
+        return report
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Run a group of changes atomically. With shared=True the lock file is held exclusively, the changes made
+        by other processes are loaded first, and the changes are saved (and the version stamp bumped) on exit.
+        Without shared it only holds the database lock (save() persists the changes). Transactions can be nested.
+        The block may change objects directly (attendance, marks, ...): with journal=True, such changes can't be
+        journaled, so the save that follows the block writes a checkpoint.
+        """
+        with self._transaction(direct=True):
+            yield self
+
+    @contextlib.contextmanager
+    def _transaction(self, direct=False):
+        """
+        Transaction of the add/update/remove methods (see transaction).
+        :param direct: The block may change objects outside the journaled API
+        """
+        with self._lock:
+            if self._writer is not None or self._replaying:
+                yield self
+                if direct:
+                    self.__changed_directly()
+                return
+            self._writer = threading.get_ident()
+            try:
+                if not self.shared:
+                    yield self
+                    if direct:
+                        self.__changed_directly()
+                    return
+                with self.__file_lock():
+                    self.__refresh()
+                    try:
+                        yield self
+                    except BaseException:
+                        self._version = None  # Drop the partial changes at the next refresh
+                        raise
+                    if direct:
+                        self.__changed_directly()
+                    self.__persist()
+                    self.__bump_version()
+            finally:
+                self._writer = None
+                self.__publish()
+
+    # Read views (mvcc=True)
+    def __publish(self, everything=False):
+        """
+        Publish a new ReadView of the tables. The tables and the indexes are versioned dicts that the view reads
+        as of its version (see VersionedDict), so publishing costs no copy of them. Called with the lock held.
+        :param everything: Publish even if nothing changed (after a load)
+        """
+        if not self.mvcc or not (everything or self.__unpublished):
+            return
+        if not isinstance(self.__students_table, VersionedDict):  # Loaded or reset since the last publish
+            for name in list(self.__batches_table):
+                self.__batch(name)  # Materializes the lazily loaded students
+            self.__students_table = self.__versioned(self.__students_table)
+        self.__teachers_table = self.__versioned(self.__teachers_table)
+        self.__batches_table = self.__versioned(self.__batches_table)
+        indexes = self.__student_indexes()
+        for name, index in indexes.items():
+            indexes[name] = self.__versioned(index)
+        version = self.__versions.publish()
+        students, teachers, batches = (DictVersion(table, version, len(table)) for table in
+                                       (self.__students_table, self.__teachers_table, self.__batches_table))
+        totals = {kind: {status: list(values) for status, values in by_status.items()}
+                  for kind, by_status in self.__totals.items()}
+        indexes = {name: DictVersion(index, version, nested=True) for name, index in indexes.items()}
+        ordered = {name: dict(index) for name, index in self.__ordered_indexes().items()}  # SortedKeys are immutable
+        self._view = ReadView(students, teachers, batches, totals, indexes, self._journal_seq, ordered)
+        self.__unpublished = set()
+
+    def __versioned(self, table) -> VersionedDict:
+        # Tables and indexes are turned into versioned dicts once, at the first publish after they were (re)built
+        return table if isinstance(table, VersionedDict) else VersionedDict(self.__versions, table.items())
+
+    def __reads_view(self) -> bool:
+        # Readers use the published view with mvcc=True, except the thread that is changing the tables
+        return self.mvcc and self._writer != threading.get_ident()
+
+    def __reader(self) -> ReadView:
+        # The published view with mvcc=True, the live tables otherwise
+        if self.__reads_view():
+            return self._view
+        return ReadView(self.__students_table, self.__teachers_table, self.__batches_table, self.__totals,
+                         self.__indexes, self._journal_seq, self.__ordered)
+
+    def snapshot(self) -> ReadView:
+        """
+        Consistent view of the tables for several reads: the published immutable view with mvcc=True
+        (it never changes), the live tables otherwise.
+        """
+        return self.__reader()
+
+    def __writable(self, batch: Batch) -> Batch:
+        # Readers of a published view may be iterating the roster: copy it before changing it (mvcc=True)
+        if self.mvcc:
+            batch.students = batch.students.copy()
+        return batch
 
     def display_in_terminal(self):
         print("Teachers:")
@@ -303,22 +1562,380 @@ class Database:
         print("\nBatches:")
         print('Batch Name', 'Students', 'Subjects')
         for batch in self.__batches_table:
-            print(self.__batches_table[batch].name, [i.username for i in self.__batches_table[batch].students],
-                  [i.name for i in self.__batches_table[batch].subjects])
+            print(self.__batch(batch).name, [i.username for i in self.__batch(batch).students],
+                  [i.name for i in self.__batch(batch).subjects])
+
+    def __batch(self, batch_name: str) -> Batch:
+        """
+        Get a batch from the table, moving its students out of the columnar snapshot first if needed.
+        :param batch_name: Batch name
+        :return: Batch object
+        """
+        if batch_name in self.__unloaded:
+            self.__load_segment(batch_name)
+        batch = self.__batches_table[batch_name]
+        rows = self.__unhydrated.pop(batch_name, None)
+        if rows:
+            snapshot = self.__students_table.snapshot
+            for row in rows:
+                username = snapshot.value("students", row, "username")
+                if username in self.__students_table:
+                    batch.students.append(self.__students_table[username]["student"])
+        return batch
+
+    def __touch(self, *segments):
+        # Remember the segments to rewrite on the next (sharded) save and to publish to the readers (mvcc)
+        if self.__dirty is not None:
+            self.__dirty.update(segments)
+        if self.mvcc:
+            self.__unpublished.update(segments)
+
+    def mark_dirty(self, batch_name: str = None, teachers=False):
+        """
+        Report changes made directly on objects (attendance, marks, assignments, ...) so that the next save
+        writes them: it rewrites their segment with snapshot_format='sharded', and writes a checkpoint with
+        journal=True (not needed for changes made inside transaction()).
+        :param batch_name: (Optional) Batch whose students / batch object changed
+        :param teachers: (Optional) True if teacher objects changed
+        :return:
+        """
+        if batch_name is not None:
+            self.__touch(("batch", batch_name))
+        if teachers:
+            self.__touch("teachers")
+        self._direct_changes = True
+
+    def __changed_directly(self):
+        """
+        A transaction() block may have changed any object it read: the next save writes a checkpoint (journal=True)
+        and, with a sharded snapshot, rewrites the teachers and every batch segment that was read (the others were
+        not handed out, so they can't have changed).
+        """
+        self._direct_changes = True
+        if self.__dirty is not None:
+            self.__dirty.update(("batch", name) for name in self.__batches_table if name not in self.__unloaded)
+            self.__dirty.add("teachers")
+
+    # Aggregates
+    def __track(self, kind: str, status, amount, sign: int):
+        """
+        Add (sign=1) or remove (sign=-1) an entry from the counters and sums of its status.
+        :param kind: "students" (amount is the fee) or "teachers" (amount is the salary)
+        """
+        totals = self.__totals[kind].setdefault(status, [0, 0])
+        totals[0] += sign
+        totals[1] += sign * amount
+        self.__touch("totals")
+
+    def __count_totals(self) -> dict:
+        # Compute the counters and sums from scratch (with a single pass over each table)
+        totals = {"students": {}, "teachers": {}}
+        for kind, name, field in (("students", "student", "fee"), ("teachers", "teacher", "salary")):
+            table = self.__students_table if kind == "students" else self.__teachers_table
+            for _, amount, status in self.__scan(table, name, field, "status"):
+                values = totals[kind].setdefault(status, [0, 0])
+                values[0] += 1
+                values[1] += amount
+        return totals
+
+    def verify_totals(self) -> bool:
+        """
+        Recompute the counters and sums from the tables and compare them with the maintained ones.
+        :return: True if they match
+        """
+        with self._lock:
+            def non_empty(totals):
+                return {kind: {status: values for status, values in by_status.items() if values != [0, 0]}
+                        for kind, by_status in totals.items()}
+
+            totals = non_empty(self.__count_totals())
+            if totals != non_empty(self.__totals):
+                return False
+            if self.__columns is None:
+                return True
+            # The NumPy columns must give the same counts and sums (vectorized)
+            columns = {"students": (self.__columns.students, "fee"), "teachers": (self.__columns.teachers, "salary")}
+            for kind, by_status in totals.items():
+                table, field = columns[kind]
+                for status, (count, amount) in by_status.items():
+                    if table.count(status) != count or table.sum(field, status) != amount:
+                        return False
+            return True
+
+    def __count_columns(self) -> ColumnStore:
+        # Build the NumPy columns from the tables (reading only the columns of a columnar snapshot)
+        columns = ColumnStore()
+        for name in self.__batches_table:
+            columns.batch_id(name)
+        for username, fee, roll, status, batch_name in self.__scan(self.__students_table, "student", "fee", "roll",
+                                                                   "status", "batch"):
+            columns.set_student(username, fee, roll, status, batch_name)
+        for username, salary, status in self.__scan(self.__teachers_table, "teacher", "salary", "status"):
+            columns.set_teacher(username, salary, status)
+        return columns
+
+    def get_fees_by_batch(self, status=True) -> dict:
+        """
+        Total fee of the students of each batch.
+        :param status: Status of the students (True: Approved, False: Waiting for approval, None: all)
+        :return: Dict[batch_name: total fee]
+        """
+        return self.__by_batch("fee", status)
+
+    def get_student_count_by_batch(self, status=None) -> dict:
+        """
+        Number of students of each batch.
+        :param status: (Optional) Status of the students (True: Approved, False: Waiting for approval)
+        :return: Dict[batch_name: count]
+        """
+        return self.__by_batch(None, status)
+
+    def get_test_statistics(self, subject: Subject = None, test_name: str = None, percentiles=(25, 50, 75),
+                            bins=10) -> dict:
+        """
+        Statistics of the marks of every batch at once (one test, the tests of a subject or all the tests).
+        :param subject: (Optional) Subject of the tests
+        :param test_name: (Optional) Name of the test (with subject)
+        :param percentiles: Percentiles to compute (0-100)
+        :param bins: Number of bins of the histograms
+        :return: Dict[batch_name: Dict with count, mean, median, std, percentiles and histogram]
+        """
+        return {name: self.get_batch(name).marks.statistics(subject, test_name, percentiles, bins)
+                for name in list(self.__reader().batches)}
+
+    def __by_batch(self, field, status) -> dict:
+        with self._lock:
+            if self.__columns is not None:
+                return self.__columns.by_batch(field, status)
+            totals = dict.fromkeys(self.__batches_table, 0)
+            fields = ("batch", "status", field) if field else ("batch", "status")
+            for _, batch_name, student_status, *value in self.__scan(self.__students_table, "student", *fields):
+                if status is None or student_status == status:
+                    totals[batch_name] = totals.get(batch_name, 0) + (value[0] if field else 1)
+            return totals
+
+    def __track_teacher(self, username: str, entry: dict, sign: int):
+        # Add (sign=1) or remove (sign=-1) a teachers table entry from the aggregates
+        self.__track("teachers", entry["status"], entry["teacher"].salary, sign)
+        if self.__columns is not None:
+            if sign > 0:
+                self.__columns.set_teacher(username, entry["teacher"].salary, entry["status"])
+            else:
+                self.__columns.teachers.remove(username)
+        self.__track_order("teachers", username, entry, sign)
+
+    def __track_student(self, username: str, entry: dict, sign: int, index=True):
+        """
+        Add (sign=1) or remove (sign=-1) a students table entry from the aggregates and the secondary indexes.
+        :param index: (Optional) False to leave the secondary indexes alone (see __reindex_student)
+        """
+        student = entry["student"]
+        self.__track("students", entry["status"], student.fee, sign)
+        if self.__columns is not None:
+            if sign > 0:
+                self.__columns.set_student(username, student.fee, student.roll, entry["status"], student.batch.name)
+            else:
+                self.__columns.students.remove(username)
+        self.__track_order("students", username, entry, sign)
+        if index and self.__indexes is not None:
+            keys = self.__index_keys(entry)
+            self.__reindex_student(username, keys if sign < 0 else {}, keys if sign > 0 else {})
+
+    def __index_keys(self, entry: dict) -> dict:
+        # Dict[index_name: key of a students table entry in the index]
+        return {name: tuple(entry_value(entry, "student", field) for field in fields)
+                for name, fields in self.STUDENT_INDEXES.items()}
+
+    def __reindex_student(self, username: str, old_keys: dict, new_keys: dict):
+        """
+        Move a student from the buckets of its old keys to those of its new keys. The buckets whose key did not
+        change are left alone, so the student keeps its place (the order it entered the index) in them.
+        :param old_keys: Keys of the student before the change (see __index_keys), {} if it was not indexed
+        :param new_keys: Keys after the change, {} to remove it
+        """
+        for name in self.STUDENT_INDEXES:
+            old_key, new_key = old_keys.get(name), new_keys.get(name)
+            if old_key == new_key:
+                continue
+            if old_key is not None:
+                self.__change_bucket(self.__indexes[name], old_key, username, False)
+            if new_key is not None:
+                self.__change_bucket(self.__indexes[name], new_key, username, True)
+
+    def __change_bucket(self, index: dict, key: tuple, username: str, add: bool):
+        # Add a username to / remove it from the bucket of a key of a secondary index
+        bucket = index.get(key)
+        if bucket is None:
+            bucket = {}
+        elif self.mvcc and not isinstance(bucket, VersionedDict):
+            # Readers of a published view may be using the bucket: copy a small one, version a larger one
+            if len(bucket) < VersionedDict.MIN_SIZE:
+                bucket = dict(bucket)
+            else:
+                bucket = VersionedDict(self.__versions, bucket)
+        if add:
+            bucket[username] = None
+        else:
+            bucket.pop(username, None)
+        if not bucket:
+            index.pop(key, None)
+        elif index.get(key) is not bucket:
+            index[key] = bucket
+
+    def __track_order(self, kind: str, username: str, entry: dict, sign: int):
+        # Add (sign=1) or remove (sign=-1) a table entry from the ordered indexes
+        if self.__ordered is None:
+            return
+        name = kind[:-1]
+        for field in self.PAGE_KEYS[kind]:
+            by_status = self.__ordered[kind, field]
+            keys = by_status.get(entry["status"], SortedKeys())
+            key = (sort_value(entry_value(entry, name, field)), username)
+            # SortedKeys are immutable: readers of a published view keep the one they have
+            by_status[entry["status"]] = keys.insert(key) if sign > 0 else keys.remove(key)
+
+    # Secondary indexes
+    def __ordered_indexes(self) -> dict:
+        # The ordered indexes, rebuilt from the tables (one scan per table) if load() dropped them
+        if self.__ordered is None:
+            ordered = {}
+            for kind, table in (("students", self.__students_table), ("teachers", self.__teachers_table)):
+                fields = self.PAGE_KEYS[kind]
+                for username, status, *values in self.__scan(table, kind[:-1], "status", *fields):
+                    for field, value in zip(fields, values):
+                        ordered.setdefault((kind, field), {}).setdefault(status, []).append(
+                            (sort_value(value), username))
+                for field in fields:
+                    by_status = ordered.setdefault((kind, field), {})
+                    for status, keys in by_status.items():
+                        by_status[status] = SortedKeys(sorted(keys))
+            self.__ordered = ordered
+        return self.__ordered
+
+    def page(self, kind: str, status=True, order_by: str = "username", size: int = 20, after: str = None,
+             before: str = None) -> dict:
+        """
+        Get one page of the students or teachers, sorted by a field of PAGE_KEYS (keyset pagination: the cursors
+        are positions in an ordered index, so any page costs O(log n + size)).
+        :param kind: "students" or "teachers"
+        :param status: Approved (True) or waiting (False) entries
+        :param order_by: Sort field (see PAGE_KEYS)
+        :param size: Number of entries in a page
+        :param after: (Optional) Cursor of the page: the entries after it (the "next" cursor of the previous page)
+        :param before: (Optional) Cursor of the page: the entries before it (the "prev" cursor of the next page)
+        :return: Dict with "items" (Student / Teacher objects), "next" and "prev" (cursors, None on the last /
+                 first page)
+        """
+        if order_by not in self.PAGE_KEYS.get(kind, ()):
+            raise ValueError(f"Can't page {kind!r} by {order_by!r}.")
+        if size < 1:
+            raise ValueError("The page size must be positive.")
+        if self.__reads_view():
+            view = self._view
+            return self.__page(view.ordered[kind, order_by].get(status, SortedKeys()), getattr(view, kind),
+                               kind[:-1], size, after, before)
+        with self._lock:
+            # The live table is changed by writers
+            return self.__page(self.__ordered_indexes()[kind, order_by].get(status, SortedKeys()),
+                               getattr(self.__reader(), kind), kind[:-1], size, after, before)
+
+    @staticmethod
+    def __page(keys: SortedKeys, table, name: str, size: int, after: str, before: str) -> dict:
+        # Slice a page out of the sorted ordered index keys (see page)
+        if before is not None:
+            end = keys.bisect_left(decode_cursor(before))
+            start = max(end - size, 0)
+        else:
+            start = keys.bisect_right(decode_cursor(after)) if after is not None else 0
+            end = start + size
+        page = keys[start:end]
+        return {"items": [table[username][name] for _, username in page],
+                "next": encode_cursor(page[-1]) if page and end < len(keys) else None,
+                "prev": encode_cursor(page[0]) if page and start > 0 else None}
+
+    def __student_indexes(self) -> dict:
+        # The secondary indexes, rebuilt from the students table (one scan) if load() dropped them
+        if self.__indexes is None:
+            fields = sorted({field for key in self.STUDENT_INDEXES.values() for field in key})
+            indexes = {name: {} for name in self.STUDENT_INDEXES}
+            for username, *values in self.__scan(self.__students_table, "student", *fields):
+                values = dict(zip(fields, values))
+                for name, key in self.STUDENT_INDEXES.items():
+                    indexes[name].setdefault(tuple(values[field] for field in key), {})[username] = None
+            self.__indexes = indexes
+        return self.__indexes
+
+    def find_students(self, index: str, *key) -> list[Student]:
+        """
+        Get the students with the given key in a secondary index (see STUDENT_INDEXES).
+        e.g. find_students("batch_status", "one", True)
+        :param index: Index name
+        :param key: Values of the index fields, in order
+        :return: List of Student objects (in the order they entered the index)
+        """
+        if index not in self.STUDENT_INDEXES:
+            raise ValueError(f"Unknown index {index!r}.")
+        if self.__reads_view():
+            view = self._view
+            return [view.students[username]["student"] for username in view.indexes[index].get(key, ())]
+        with self._lock:
+            bucket = self.__student_indexes()[index].get(key, ())
+            return [self.__students_table[username]["student"] for username in bucket]
+
+    def get_batch_students(self, batch_name: str, status=None) -> list[Student]:
+        """
+        Get the students of a batch.
+        :param batch_name: Batch name
+        :param status: (Optional) Only the approved (True) or waiting (False) students
+        :return: List of Student objects
+        """
+        if status is None:
+            batch = self.get_batch(batch_name)
+            return list(batch.students) if batch else []
+        return self.find_students("batch_status", batch_name, status)
+
+    def get_student_by_roll(self, batch_name: str, roll) -> Student | None:
+        """
+        Get the student with a roll number in a batch.
+        :param batch_name: Batch name
+        :param roll: Roll number
+        :return: Student object
+        """
+        students = self.find_students("batch_roll", batch_name, roll)
+        return students[0] if students else None
+
+    def get_students_by_contact(self, contact) -> list[Student]:
+        return self.find_students("contact", contact)
+
+    @staticmethod
+    def __scan(table, name: str, *fields):
+        """
+        Yield (username, *values) for every entry of a students / teachers table.
+        :param table: Students or teachers table
+        :param name: Key of the object in an entry ("student" or "teacher")
+        :param fields: "status", "batch" (batch name) or attribute names of the object
+        """
+        if isinstance(table, LazyTable):
+            yield from table.scan(name, *fields)
+            return
+        for key, entry in table.items():
+            yield (key, *[entry_value(entry, name, field) for field in fields])
 
     def login(self, username, password, as_admin=False, as_teacher=False, as_student=False) -> bool:
         if as_admin:
             return True
+        view = self.__reader()
         if as_teacher:
-            account = self.__teachers_table.get(username)
-            if account and password == self.__teachers_table[username]["teacher"].getpassword():
+            account = view.teachers.get(username)
+            if account and password == account["teacher"].getpassword():
                 return True
         if as_student:
-            account = self.__students_table.get(username)
-            if account and password == self.__students_table[username]["student"].getpassword():
+            account = view.students.get(username)
+            if account and password == account["student"].getpassword():
                 return True
         return False
 
+    @transactional
     def add_student(self, student, status=False):
         """
         Add a student to the database. Also add the student to the batch. (Assuming the batch is already present)
@@ -329,10 +1946,18 @@ class Database:
         if student.username in self.__students_table:
             raise ValueError("Student already exists.")
 
+        batch = self.__writable(self.__batch(student.batch.name))
+        student.upgrade_records()  # Moves records pickled by older versions to the batch first
+        student.batch.move_records(student.username, batch)
+        student.batch = batch  # The stored batch, the one given may come from before a reload (shared=True)
         self.__students_table[student.username] = {"password": student.getpassword(), "student": student,
                                                    "status": status}
-        self.__batches_table[student.batch.name].add_student(student)
+        batch.add_student(student)
+        self.__track_student(student.username, self.__students_table[student.username], 1)
+        self.__touch(("batch", batch.name), "index")
+        self._log("add_student", student, student=student, status=status)
 
+    @transactional
     def add_teacher(self, teacher, status=False):
         """
         Add a teacher to the database.
@@ -344,7 +1969,11 @@ class Database:
             raise ValueError("Teacher already exists.")
         self.__teachers_table[teacher.username] = {"password": teacher.getpassword, "teacher": teacher,
                                                    "status": status}
+        self.__track_teacher(teacher.username, self.__teachers_table[teacher.username], 1)
+        self.__touch("teachers")
+        self._log("add_teacher", teacher, teacher=teacher, status=status)
 
+    @transactional
     def add_batch(self, batch):
         """
         Add a batch to the database.
@@ -354,6 +1983,10 @@ class Database:
         if batch.name in self.__batches_table:
             raise ValueError("Batch already exists.")
         self.__batches_table[batch.name] = batch
+        if self.__columns is not None:
+            self.__columns.batch_id(batch.name)
+        self.__touch(("batch", batch.name), "index")
+        self._log("add_batch", batch, batch=batch)
 
     def get_batch(self, batch_name: str) -> Batch | None:
         """
@@ -361,7 +1994,11 @@ class Database:
         :param batch_name: Batch name
         :return: Batch object
         """
-        return self.__batches_table.get(batch_name)
+        if self.__reads_view():
+            return self._view.batches.get(batch_name)
+        if batch_name not in self.__batches_table:
+            return None
+        return self.__batch(batch_name)
 
     def get_student(self, student_username: str) -> Student | None:
         """
@@ -369,7 +2006,7 @@ class Database:
         :param student_username: Student username
         :return: Student object
         """
-        student = self.__students_table.get(student_username)
+        student = self.__reader().students.get(student_username)
         if student:
             return student["student"]
         return None
@@ -380,27 +2017,63 @@ class Database:
         :param teacher_username: Teacher username
         :return: Teacher object
         """
-        teacher = self.__teachers_table.get(teacher_username)
+        teacher = self.__reader().teachers.get(teacher_username)
         if teacher:
             return teacher["teacher"]
         return None
 
     def get_all_teachers(self, status=True) -> list[Teacher]:
-        return [self.__teachers_table[i]["teacher"] for i in self.__teachers_table if
-                self.__teachers_table[i]["status"] == status]
+        teachers = self.__reader().teachers
+        return [teachers[i]["teacher"] for i, teacher_status in
+                self.__scan(teachers, "teacher", "status") if teacher_status == status]
 
     def get_all_students(self, status=True) -> list[Student]:
-        return [self.__students_table[i]["student"] for i in self.__students_table if
-                self.__students_table[i]["status"] == status]
+        return self.find_students("status", status)
+
+    def _export_columns(self, kind: str, columns, batch_name) -> tuple:
+        # Check the arguments of export_rows before the first row is read
+        if kind not in self.EXPORT_COLUMNS:
+            raise ValueError(f"Unknown export {kind!r}.")
+        if batch_name is not None and kind != "students":
+            raise ValueError("Only students can be filtered by batch.")
+        columns = tuple(columns or self.EXPORT_COLUMNS[kind])
+        unknown = [column for column in columns if column not in self.EXPORT_COLUMNS[kind]]
+        if unknown:
+            raise ValueError(f"Unknown columns {', '.join(map(repr, unknown))}.")
+        return columns
+
+    def export_rows(self, kind: str, columns=None, status=None, batch_name: str = None):
+        """
+        Rows of the students or teachers table for exports, read one at a time: no list of the results is built
+        and rows of a columnar snapshot are read from its columns without unpickling the objects.
+        :param kind: "students" or "teachers"
+        :param columns: (Optional) Fields of a row, in order (see EXPORT_COLUMNS, default all of them)
+        :param status: (Optional) Only the approved (True) or waiting (False) entries
+        :param batch_name: (Optional) Only the students of this batch
+        :return: Generator of tuples of values
+        """
+        columns = self._export_columns(kind, columns, batch_name)
+        view = self.__reader()
+        table = view.students if kind == "students" else view.teachers
+        name = kind[:-1]
+        fields = ("status", "batch", *columns) if batch_name is not None else ("status", *columns)
+        skip = len(fields) - len(columns)
+        if isinstance(table, LazyTable) or self.__reads_view():
+            rows = (row[1:] for row in self.__scan(table, name, *fields))
+        else:
+            # The live tables can change while the rows are streamed: walk a copy of the keys
+            rows = ([entry_value(entry, name, field) for field in fields]
+                    for entry in map(table.get, list(table)) if entry is not None)
+        return (tuple(row[skip:]) for row in rows
+                if (status is None or row[0] == status) and (batch_name is None or row[1] == batch_name))
 
     def get_total_salary(self, status=True) -> int:
-        return sum([self.__teachers_table[i]["teacher"].get_salary() for i in self.__teachers_table if
-                    self.__teachers_table[i]["status"] == status])
+        return self.__reader().totals["teachers"].get(status, (0, 0))[1]
 
     def get_total_fees(self, status=True) -> int:
-        return sum([self.__students_table[i]["student"].get_fee() for i in self.__students_table if
-                    self.__students_table[i]["status"] == status])
+        return self.__reader().totals["students"].get(status, (0, 0))[1]
 
+    @transactional
     def update_student(self, student_username: str, password=None, first_name=None, last_name=None,
                        batch : Batch=None,fee=None, contact=None, roll=None, status=None):
         """
@@ -419,7 +2092,17 @@ class Database:
         student = self.__students_table.get(student_username)
         if not student:
             raise ValueError("Student not found.")
-
+        # Resolve the new batch before the student is untracked and changed, so a bad one changes nothing
+        if batch and batch.name not in self.__batches_table:
+            raise ValueError("Batch not found.")
+        new_batch = self.__writable(self.__batch(batch.name)) if batch else None
+
+        old_keys = self.__index_keys(student) if self.__indexes is not None else None
+        self.__track_student(student_username, student, -1, index=False)
+        if self.mvcc:
+            # Readers of the published view may be reading the student: change a copy of it
+            student = self.__students_table[student_username] = {**student, "student": copy.copy(student["student"])}
+            self.__writable(self.__batch(student["student"].batch.name)).students.replace(student["student"])
         if password:
             student["student"].setpassword(password)
         if first_name:
@@ -429,21 +2112,33 @@ class Database:
         if fee:
             student["student"].fee = fee
         if status:
-            student["status"] = status
+            student = self.__students_table[student_username] = {**student, "status": status}
         if contact:
             student["student"].contact = contact
         if roll:
             student["student"].roll = roll
+        self.__touch(("batch", student["student"].batch.name))
         if batch:
-            old_batch = self.__batches_table[student["student"].batch.name]
-            old_batch.students.remove(student["student"])
+            batch = new_batch
+            old_batch = self.__writable(self.__batch(student["student"].batch.name))
+            old_batch.students.move(student["student"], batch.students)
+            student["student"].upgrade_records()  # Moves records pickled by older versions to the batch first
+            old_batch.move_records(student_username, batch)
             student["student"].batch = batch
-            batch.students.append(student["student"])
+            self.__students_table[student_username] = student  # Re-index the student under its new batch
+            self.__touch(("batch", batch.name), "index")
+        self.__track_student(student_username, student, 1, index=False)
+        if old_keys is not None:
+            self.__reindex_student(student_username, old_keys, self.__index_keys(student))
+        self._log("update_student", None, student_username=student_username, password=password,
+                  first_name=first_name, last_name=last_name, batch=batch, fee=fee, contact=contact, roll=roll,
+                  status=status)
         # if student_username:
         #     student = self.__students_table.pop(student["student"].username)
         #     student["student"].username = student_username
         #     self.__students_table[student_username] = student
 
+    @transactional
     def update_teacher(self, teacher_username: str,
                        password: str = None,
                        first_name: str = None,
@@ -466,6 +2161,10 @@ class Database:
         if not teacher:
             raise ValueError("Teacher not found.")
 
+        self.__track_teacher(teacher_username, teacher, -1)
+        if self.mvcc:
+            # Readers of the published view may be reading the teacher: change a copy of it
+            teacher = self.__teachers_table[teacher_username] = {**teacher, "teacher": copy.copy(teacher["teacher"])}
         if password:
             teacher["teacher"].setpassword(password)
         if first_name:
@@ -477,8 +2176,13 @@ class Database:
         if salary:
             teacher["teacher"].salary = salary
         if status:
-            teacher["status"] = status
+            teacher = self.__teachers_table[teacher_username] = {**teacher, "status": status}
+        self.__track_teacher(teacher_username, teacher, 1)
+        self.__touch("teachers")
+        self._log("update_teacher", None, teacher_username=teacher_username, password=password,
+                  first_name=first_name, last_name=last_name, contact=contact, salary=salary, status=status)
 
+    @transactional
     def update_batch(self, batch_name: str, students=None, subjects=None):
         """
         Update the batch details in the database.
@@ -489,61 +2193,348 @@ class Database:
         """
         if batch_name not in self.__batches_table:
             raise ValueError("Batch not found.")
+        self.__batch(batch_name)
         if students:
-            self.__batches_table[batch_name].students = students
+            self.__batches_table[batch_name].students = Roster(students)
         if subjects:
             self.__batches_table[batch_name].subjects = subjects
+        self.__touch(("batch", batch_name), "index")
+        self._log("update_batch", None, batch_name=batch_name, students=students, subjects=subjects)
 
     def get_student_count(self, status=None) -> int:
+        view = self.__reader()
         if status is not None:
-            return sum([1 for i in self.__students_table if self.__students_table[i]["status"] == status])
+            return view.totals["students"].get(status, (0, 0))[0]
         else:
-            return len(self.__students_table)
+            return len(view.students)
 
     def get_teacher_count(self, status=None) -> int:
+        view = self.__reader()
         if status is not None:
-            return sum([1 for i in self.__teachers_table if self.__teachers_table[i]["status"] == status])
+            return view.totals["teachers"].get(status, (0, 0))[0]
         else:
-            return len(self.__teachers_table)
+            return len(view.teachers)
 
+    @transactional
     def remove_teacher(self, teacher_username: str):
         if teacher_username not in self.__teachers_table:
             raise ValueError("Teacher not found.")
-        self.__teachers_table.pop(teacher_username)
+        teacher = self.__teachers_table.pop(teacher_username)
+        self.__track_teacher(teacher_username, teacher, -1)
+        self.__touch("teachers")
+        self._log("remove_teacher", None, teacher_username=teacher_username)
 
+    @transactional
     def remove_student(self, student_username: str):
         if student_username not in self.__students_table:
             raise ValueError("Student not found.")
-        student = self.__students_table.pop(student_username)["student"]
-        batch = self.__batches_table[student.batch.name]
+        batch = self.__writable(self.__batch(self.__students_table[student_username]["student"].batch.name))
+        entry = self.__students_table.pop(student_username)
+        student = entry["student"]
+        self.__track_student(student_username, entry, -1)
         batch.students.remove(student)
+        batch.remove_records(student_username)
+        self.__touch(("batch", batch.name), "index")
+        self._log("remove_student", None, student_username=student_username)
 
-    def save(self):
-        # Save the database to a json file
-        with open(self.save_file, "wb") as f:
-            pickle.dump([self.__students_table, self.__teachers_table, self.__batches_table], f)
+    def _log(self, operation: str, owned, **arguments):
+        """
+        Encode a change as a journal record. Records are written to the log file on the next save().
+        :param operation: Name of the Database method that was called
+        :param owned: Object created by the change (written by value, everything else already stored is a reference)
+        :param arguments: Keyword arguments to replay the method with
+        """
+        if not self.journal or self._replaying or self._importing:
+            return
+        self._journal_seq += 1
+        self._pending.append(journal.encode_record(self, owned, (self._journal_seq, operation, arguments)))
 
-    def load(self) -> bool:
-        # Load the database from a json file
+    def save(self, wait=True):
+        """
+        Persist the database. In journal mode only the changes since the last save are appended to the log,
+        and the snapshot is rewritten once the log reaches checkpoint_interval records.
+        With shared=True every transaction already saved its changes: only changes reported with mark_dirty() are
+        left to write (nothing is written, and the other processes don't reload, otherwise).
+        :param wait: (Optional) With a background saver (save_window), block until the changes are durable
+        """
+        if self.shared:
+            with self._lock, self.__file_lock():
+                if self._pending or self._direct_changes:
+                    self.__persist()
+                    self.__bump_version()
+            return
+        if self._saver is None:
+            self.__persist()
+            return
+        ticket = self._saver.request(wait)
+        if wait:
+            self._saver.wait(ticket)
+
+    def save_metrics(self) -> dict:
+        """
+        Statistics of the background saver: number of save requests and flushes, coalesced batch size and
+        flush / commit latency in seconds (commit latency runs from the first request of a batch to its flush).
+        """
+        if self._saver is None:
+            return {}
+        with self._saver._condition:
+            metrics = dict(self._saver.metrics)
+        flushes = metrics["flushes"] or 1
+        metrics["mean_batch_size"] = metrics["requests"] / flushes
+        metrics["mean_flush_time"] = metrics["total_flush_time"] / flushes
+        metrics["mean_commit_latency"] = metrics["total_commit_latency"] / flushes
+        return metrics
+
+    def close(self):
+        """Write the outstanding background saves and stop the saver thread."""
+        if self._saver is not None:
+            self._saver.stop()
+            self._saver = None
+        self._file_lock.close()
+
+    def __persist(self):
+        if self.mvcc and not self.journal and self.snapshot_format == 'pickle':
+            self._direct_changes = False  # The view shares the objects, it is written with their changes
+            self.__write_view(self._view)
+            return
+        with self._lock:
+            self.__persist_locked()
+
+    def __write_view(self, view: ReadView):
+        # Pickle a published view without holding the writer lock, so neither readers nor writers wait
+        data = [dict(view.students), dict(view.teachers), dict(view.batches), {"journal_seq": view.journal_seq}]
+        with self._save_lock:
+            try:
+                content = pickle.dumps(data)
+            except RuntimeError:  # An object was changed directly while it was being pickled
+                with self._lock:
+                    content = pickle.dumps(data)
+            with open(self.save_file + '.tmp', "wb") as f:
+                f.write(content)
+            os.replace(self.save_file + '.tmp', self.save_file)
+
+    def __persist_locked(self):
+        if not self.journal:
+            self.__write_snapshot()
+            self._direct_changes = False
+            return
+        if self._direct_changes:  # Changes made directly on objects are only written by a checkpoint
+            self.checkpoint()
+            return
+        if self._pending:
+            journal.append_records(self.journal_file, self._pending)
+            self._journal_records += len(self._pending)
+            self._pending = []
+        if self._journal_records >= self.checkpoint_interval:
+            self.checkpoint()
+
+    @synchronized
+    def checkpoint(self):
+        """
+        Rewrite the snapshot with the current state and truncate the journal (compaction).
+        The snapshot records the last journal sequence number, so a crash between the two steps is harmless.
+        """
+        self.__write_snapshot()
+        self._direct_changes = False
+        if self.journal:
+            open(self.journal_file, "wb").close()
+            self._journal_records = 0
+            self._pending = []
+
+    def __write_snapshot(self, path=None, snapshot_format=None):
+        # Save the database to a temporary file first, so that a crash never leaves a half written snapshot
+        path = path or self.save_file
+        temp_file = path + '.tmp'
+        snapshot_format = snapshot_format or self.snapshot_format
+        if snapshot_format == 'sharded':
+            # Only the segments changed since the last save are written (all of them to another path)
+            dirty = self.__dirty if path == self.save_file else None
+            if dirty is not None and self.journal:
+                # The index records the journal sequence number the segments are up to: a stale one would replay
+                # changes that are already in them
+                dirty = dirty | {"index"}
+            sharded.write_segments(path, self.__batches_table, self.__batch, self.__students_table,
+                                   self.__teachers_table, self.__totals, self._journal_seq, dirty)
+            if path == self.save_file:
+                self.__dirty = set()
+            return
+        if snapshot_format == 'columnar':
+            ColumnarSnapshot.write(temp_file, columnar.table_rows(self.__students_table, "students"),
+                                   columnar.table_rows(self.__teachers_table, "teachers"),
+                                   self.__columnar_batches(), meta={"journal_seq": self._journal_seq})
+        else:
+            with open(temp_file, "wb") as f:
+                pickle.dump([dict(self.__students_table), dict(self.__teachers_table),
+                             {name: self.__batch(name) for name in self.__batches_table},
+                             {"journal_seq": self._journal_seq}], f)
+        os.replace(temp_file, path)
+
+    def __load_sharded(self, index: dict):
+        """
+        Read the index and teachers segments of a sharded snapshot. Batch segments are read on demand.
+        """
+        self.__teachers_table = sharded.read_file(self.save_file + '.teachers')
         try:
-            with open(self.save_file, "rb") as f:
-                data = pickle.load(f)
-                self.__students_table = data[0]
-                self.__teachers_table = data[1]
-                self.__batches_table = data[2]
+            self.__totals = sharded.read_file(self.save_file + '.totals')  # Counting would read every segment
+        except FileNotFoundError:
+            pass
+        self.__batches_table = dict.fromkeys(index["batches"])
+        self.__unloaded = set(index["batches"])
+        self.__students_table = ShardedTable(index["students"], self.__load_segment)
+        self._journal_seq = index["journal_seq"]
+        self.__dirty = set()
+
+    def __load_segment(self, batch_name: str):
+        self.__unloaded.discard(batch_name)
+        batch, entries = sharded.read_file(sharded.segment_file(self.save_file, batch_name))
+        self.__batches_table[batch_name] = batch
+        self.__students_table.loaded(entries)
+
+    def __columnar_batches(self):
+        for name in self.__batches_table:
+            batch = self.__batches_table[name] if name in self.__unhydrated else self.__batch(name)
+            if name in self.__unhydrated:
+                snapshot = self.__students_table.snapshot
+                usernames = [snapshot.value("students", row, "username") for row in self.__unhydrated[name]]
+            else:
+                usernames = [student.username for student in batch.students]
+            without_students = copy.copy(batch)
+            without_students.students = Roster()
+            yield pickle.dumps(without_students), usernames
+
+    def __load_columnar(self):
+        """
+        Map a columnar snapshot. Nothing is unpickled except the batches (without their students).
+        """
+        snapshot = ColumnarSnapshot(self.save_file)
+        self.__batches_table = {}
+        self.__unhydrated = {}
+        for batch, rows in snapshot.batches():
+            self.__batches_table[batch.name] = batch
+            self.__unhydrated[batch.name] = rows
+
+        def student_entry(row):
+            student = snapshot.load_object("students", row, self.__batches_table)
+            return {"password": student.getpassword(), "student": student,
+                    "status": snapshot.value("students", row, "status")}
+
+        def teacher_entry(row):
+            teacher = snapshot.load_object("teachers", row, self.__batches_table)
+            return {"password": teacher.getpassword, "teacher": teacher,
+                    "status": snapshot.value("teachers", row, "status")}
+
+        self.__students_table = LazyTable(snapshot, "students", student_entry)
+        self.__teachers_table = LazyTable(snapshot, "teachers", teacher_entry)
+        self._journal_seq = snapshot.meta.get("journal_seq", 0)
 
+    @staticmethod
+    def convert_to_columnar(pickle_file: str, columnar_file: str):
+        """
+        Convert a pickled database file (e.g. database.bin) into a columnar snapshot.
+        :param pickle_file: Existing pickle snapshot
+        :param columnar_file: Path of the columnar snapshot to write
+        :return:
+        """
+        if not os.path.exists(pickle_file):
+            raise FileNotFoundError(pickle_file)
+        database = Database(pickle_file)
+        database.__write_snapshot(columnar_file, 'columnar')
+
+    def __replay_journal(self) -> bool:
+        """
+        Apply the journal records that are newer than the snapshot.
+        A torn record at the end of the log (crash while appending) ends the replay.
+        :return: True if a journal file was found
+        """
+        try:
+            f = open(self.journal_file, "rb")
         except FileNotFoundError:
-            print("...Initializing a new database.")
             return False
-        else:
-            return True
-
-    def reset(self):
-        # Remove the json file
-        import os
-        print("trying to remove database file")
-        if os.path.exists(self.save_file):
-            os.remove(self.save_file)
+        self._replaying = True
+        try:
+            with f:
+                for seq, operation, arguments in journal.read_records(f, self):
+                    self._journal_records += 1
+                    if seq <= self._journal_seq:
+                        continue
+                    getattr(self, operation)(**arguments)
+                    self._journal_seq = seq
+        finally:
+            self._replaying = False
+        return True
+
+    @synchronized
+    def load(self) -> bool:
+        # Load the database from the snapshot, then replay the journal (if journaling)
+        self.__unhydrated = {}
+        self.__unloaded = set()
+        self.__dirty = None
+        self.__totals = None
+        self.__indexes = None
+        self.__ordered = None
+        try:
+            if ColumnarSnapshot.is_columnar(self.save_file):
+                self.__load_columnar()
+                found = True
+            else:
+                found = self.__load_pickle()
+        except FileNotFoundError:
+            found = False
+        if not found:
             self.__teachers_table = {}
-            self.__batches_table = {}
             self.__students_table = {}
+            self.__batches_table = {}
+            self._journal_seq = 0
+        if self.__totals is None:
+            self.__totals = self.__count_totals()
+        self.__columns = self.__count_columns() if self.columns else None
+
+        self._journal_records = 0
+        if self.journal and self.__replay_journal():
+            found = True
+        if not found:
+            print("...Initializing a new database.")
+        if self.mvcc:
+            self.__student_indexes()
+        self.__publish(everything=True)
+        return found
+
+    def __load_pickle(self) -> bool:
+        with open(self.save_file, "rb") as f:
+            data = pickle.load(f)
+            if isinstance(data, dict) and data.get("format") == "sharded":
+                self.__load_sharded(data)
+                return True
+            self.__students_table = data[0]
+            self.__teachers_table = data[1]
+            self.__batches_table = data[2]
+            self._journal_seq = data[3]["journal_seq"] if len(data) > 3 else 0
+        for batch in self.__batches_table.values():
+            batch.upgrade_roster()
+        return True
+
+    @synchronized
+    def reset(self):
+        # Remove the database file (and its journal)
+        print("trying to remove database file")
+        directory, name = os.path.split(os.path.abspath(self.save_file))
+        for file in os.listdir(directory):
+            if file in (name, name + '.log', name + '.teachers', name + '.totals') or file.startswith(name + '.batch-'):
+                os.remove(os.path.join(directory, file))
+        self.__teachers_table = {}
+        self.__batches_table = {}
+        self.__students_table = {}
+        self.__unhydrated = {}
+        self.__unloaded = set()
+        self.__dirty = None
+        self.__totals = {"students": {}, "teachers": {}}
+        self.__indexes = None
+        self.__ordered = None
+        self.__columns = ColumnStore() if self.columns else None
+        self._journal_seq = 0
+        self._journal_records = 0
+        self._pending = []
+        self.__publish(everything=True)
+        if self.shared:
+            with self.__file_lock():
+                self.__bump_version()
@@ -49,6 +49,18 @@ class AskDateForm(forms.Form):
     date = forms.DateField()
 
 
+class AttendanceRangeForm(forms.Form):
+    start = forms.DateField()
+    end = forms.DateField()
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end and not 0 <= (end - start).days < 366:
+            raise forms.ValidationError('The end date must be after the start date, at most a year later.')
+        return cleaned_data
+
+
 # for notice related form
 class NoticeForm(forms.ModelForm):
     class Meta:
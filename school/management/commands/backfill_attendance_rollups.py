@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from school import models
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the attendance rollups (per student per month, per class per day) from the Attendance records.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            models.StudentMonthlyAttendance.rebuild()
+            models.ClassDailyAttendance.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'{models.StudentMonthlyAttendance.objects.count()} student months, '
+            f'{models.ClassDailyAttendance.objects.count()} class days.'))
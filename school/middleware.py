@@ -0,0 +1,12 @@
+from . import views
+
+
+class DatabaseRefreshMiddleware:
+    """Reload the school database at the start of a request if another worker process changed it."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        views.db.refresh()
+        return self.get_response(request)
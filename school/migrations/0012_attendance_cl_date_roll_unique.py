@@ -0,0 +1,24 @@
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def remove_duplicate_attendance(apps, schema_editor):
+    # Re-submitted days were inserted again: keep the last record of every (cl, date, roll)
+    Attendance = apps.get_model('school', 'Attendance')
+    latest = Attendance.objects.values('cl', 'date', 'roll').annotate(latest=Max('id')).values('latest')
+    Attendance.objects.exclude(id__in=latest).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0011_auto_20200508_0913'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_attendance, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='attendance',
+            constraint=models.UniqueConstraint(fields=('cl', 'date', 'roll'), name='attendance_cl_date_roll_unique'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+CLASSES = ['one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten']
+
+
+def create_school_classes(apps, schema_editor):
+    # One SchoolClass per class choice and per class already stored on a student, so every cl has its row
+    SchoolClass = apps.get_model('school', 'SchoolClass')
+    StudentExtra = apps.get_model('school', 'StudentExtra')
+    stored = StudentExtra.objects.order_by().values_list('cl', flat=True).distinct()
+    names = CLASSES + sorted(set(stored) - set(CLASSES))
+    SchoolClass.objects.bulk_create([SchoolClass(name=name) for name in names])
+    # Two students sharing a roll in a class can't be told apart by Attendance: have them fixed by hand
+    duplicates = list(StudentExtra.objects.values('cl', 'roll').annotate(n=Count('id')).filter(n__gt=1)
+                      .values_list('cl', 'roll'))
+    if duplicates:
+        raise RuntimeError("Students sharing a roll in a class (cl, roll): %s" % duplicates)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0014_notice_date_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchoolClass',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=10, unique=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RunPython(create_school_classes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='studentextra',
+            name='cl',
+            field=models.ForeignKey(db_column='cl', default='one', on_delete=django.db.models.deletion.PROTECT, related_name='students', to='school.schoolclass', to_field='name'),
+        ),
+        migrations.AddIndex(
+            model_name='studentextra',
+            index=models.Index(fields=['cl', 'status'], name='student_cl_status_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='studentextra',
+            constraint=models.UniqueConstraint(fields=('cl', 'roll'), name='student_cl_roll_unique'),
+        ),
+    ]
@@ -1,4 +1,8 @@
+import datetime
+
 from django.db import models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
 from django.contrib.auth.models import User
 
 
@@ -26,14 +30,38 @@ classes = [('one', 'one'), ('two', 'two'), ('three', 'three'),
            ('ten', 'ten')]
 
 
+class SchoolClass(models.Model):
+    """A class students are admitted to, seeded with the classes above."""
+    name = models.CharField(max_length=10, unique=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return self.name
+
+
 class StudentExtra(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     roll = models.CharField(max_length=10)
     mobile = models.CharField(max_length=40, null=True)
     fee = models.PositiveIntegerField(null=True)
-    cl = models.CharField(max_length=10, choices=classes, default='one')
+    # References the class by name and keeps the "cl" column, so cl_id is the class name used by Attendance and the
+    # rollups and filter(cl='one') keeps working
+    cl = models.ForeignKey(SchoolClass, to_field='name', db_column='cl', on_delete=models.PROTECT,
+                           related_name='students', default='one')
     status = models.BooleanField(default=False)
 
+    class Meta:
+        # The unique (cl, roll) index serves the class lists and the roll lookups, (cl, status) the approved or
+        # pending students of a class.
+        indexes = [
+            models.Index(fields=['cl', 'status'], name='student_cl_status_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['cl', 'roll'], name='student_cl_roll_unique'),
+        ]
+
     @property
     def get_name(self):
         return self.user.first_name + " " + self.user.last_name
@@ -52,8 +80,122 @@ class Attendance(models.Model):
     cl = models.CharField(max_length=10)
     present_status = models.CharField(max_length=10)
 
+    class Meta:
+        # One record per student and day. The unique index also serves the (date, cl) and (date, cl, roll) lookups
+        # of the attendance views.
+        constraints = [
+            models.UniqueConstraint(fields=['cl', 'date', 'roll'], name='attendance_cl_date_roll_unique'),
+        ]
+
+
+def month_range(month):
+    # First and last day of the month of a date
+    first = month.replace(day=1)
+    return first, (first + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
+
+
+def attendance_counts():
+    # Aggregates counting the present / absent Attendance records
+    return {'present': Count('id', filter=Q(present_status='Present')),
+            'absent': Count('id', filter=~Q(present_status='Present'))}
+
+
+class StudentMonthlyAttendance(models.Model):
+    """Rollup of Attendance: days present / absent of a student (cl, roll) in a month (first day of the month)."""
+    cl = models.CharField(max_length=10)
+    roll = models.CharField(max_length=10, null=True)
+    month = models.DateField()
+    present = models.PositiveIntegerField(default=0)
+    absent = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cl', 'roll', 'month'], name='student_monthly_attendance_unique'),
+        ]
+
+    @classmethod
+    def refresh(cls, cl, month):
+        # Recount the month of every student of a class from the Attendance records (one grouped query)
+        first, last = month_range(month)
+        records = (Attendance.objects.filter(cl=cl, date__range=(first, last)).values('roll').order_by()
+                   .annotate(**attendance_counts()))
+        cls.objects.bulk_create([cls(cl=cl, roll=record['roll'], month=first, present=record['present'],
+                                     absent=record['absent']) for record in records],
+                                update_conflicts=True, unique_fields=['cl', 'roll', 'month'],
+                                update_fields=['present', 'absent'])
+
+    @classmethod
+    def summary(cls, cl, roll, start, end):
+        """
+        Days present and absent of a student between two dates: the whole months inside the range come from the
+        rollup, only the days of the partial months at both ends from the Attendance records.
+        :return: (present, absent)
+        """
+        # Whole months: from first_month (included) to last_month (excluded)
+        first_month = start if start.day == 1 else month_range(start)[1] + datetime.timedelta(days=1)
+        last_month = (end + datetime.timedelta(days=1)).replace(day=1)
+        totals = {'present': 0, 'absent': 0}
+        ranges = [(start, end)]
+        if first_month < last_month:
+            rollup = cls.objects.filter(cl=cl, roll=roll, month__gte=first_month, month__lt=last_month)
+            totals.update(rollup.aggregate(present=models.Sum('present', default=0),
+                                           absent=models.Sum('absent', default=0)))
+            ranges = [(start, first_month - datetime.timedelta(days=1)), (last_month, end)]
+        condition = Q()
+        for range_start, range_end in ranges:
+            if range_start <= range_end:
+                condition |= Q(date__range=(range_start, range_end))
+        if condition:
+            days = Attendance.objects.filter(condition, cl=cl, roll=roll).aggregate(**attendance_counts())
+            totals['present'] += days['present']
+            totals['absent'] += days['absent']
+        return totals['present'], totals['absent']
+
+    @classmethod
+    def rebuild(cls):
+        # Recount every month of every student (backfill)
+        records = (Attendance.objects.annotate(month=TruncMonth('date')).values('cl', 'roll', 'month').order_by()
+                   .annotate(**attendance_counts()))
+        cls.objects.all().delete()
+        cls.objects.bulk_create((cls(cl=record['cl'], roll=record['roll'], month=record['month'],
+                                     present=record['present'], absent=record['absent']) for record in records),
+                                batch_size=1000)
+
+
+class ClassDailyAttendance(models.Model):
+    """Rollup of Attendance: students present / absent in a class on a day."""
+    cl = models.CharField(max_length=10)
+    date = models.DateField()
+    present = models.PositiveIntegerField(default=0)
+    absent = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cl', 'date'], name='class_daily_attendance_unique'),
+        ]
+
+    @classmethod
+    def refresh(cls, cl, date):
+        # Recount a day of a class from the Attendance records
+        counts = Attendance.objects.filter(cl=cl, date=date).aggregate(**attendance_counts())
+        cls.objects.update_or_create(cl=cl, date=date, defaults=counts)
+
+    @classmethod
+    def rebuild(cls):
+        # Recount every day of every class (backfill)
+        records = Attendance.objects.values('cl', 'date').order_by().annotate(**attendance_counts())
+        cls.objects.all().delete()
+        cls.objects.bulk_create((cls(cl=record['cl'], date=record['date'], present=record['present'],
+                                     absent=record['absent']) for record in records), batch_size=1000)
+
 
 class Notice(models.Model):
     date = models.DateField(auto_now=True)
     by = models.CharField(max_length=20, null=True, default='school')
     message = models.CharField(max_length=500)
+
+    class Meta:
+        # The notice feed reads the newest notices first (see views.notice_feed)
+        indexes = [
+            models.Index(fields=['-date', '-id'], name='notice_date_idx'),
+        ]
@@ -0,0 +1,359 @@
+import datetime
+import io
+import os
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+import basic_classes as fe
+from . import forms, models, views
+
+# The views cache the roles and the notice feed: the tests use a cache directory of their own, so that they neither
+# fill nor (cache.clear()) empty the project's one
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'school-test-cache'),
+    }
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TakeAttendanceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        admin = User.objects.create_user('admin', password='password')
+        Group.objects.get_or_create(name='ADMIN')[0].user_set.add(admin)
+        self.client.force_login(admin)
+
+    @staticmethod
+    def add_class(cl, students):
+        for i in range(students):
+            user = User.objects.create_user(f'{cl}{i}', first_name='John', last_name='Doe')
+            models.StudentExtra.objects.create(user=user, roll=str(i + 1), cl_id=cl, status=True)
+
+    def take_attendance(self, cl, rolls, statuses=('Present', 'Absent')):
+        data = {'date': '2024-01-01', 'roll': rolls, 'present_status': list(statuses) * (len(rolls) // 2)}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('admin-take-attendance', args=[cl]), data)
+        self.assertEqual(response.status_code, 302)
+        return [query['sql'] for query in queries]
+
+    def test_query_count_does_not_depend_on_class_size(self):
+        self.add_class('one', 4)
+        self.add_class('two', 60)
+        small = self.take_attendance('one', [str(roll) for roll in range(1, 5)])
+        large = self.take_attendance('two', [str(roll) for roll in range(1, 61)])
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len([sql for sql in large if sql.startswith('INSERT INTO "school_attendance"')]), 1)
+
+    def test_statuses_are_saved_by_roll(self):
+        self.add_class('one', 4)
+        # Rolls in another order than the roster, and one that is not in the class
+        self.take_attendance('one', ['4', '3', '99', '1'])
+        records = models.Attendance.objects.filter(cl='one', date=datetime.date(2024, 1, 1))
+        self.assertEqual(dict(records.values_list('roll', 'present_status')),
+                         {'4': 'Present', '3': 'Absent', '1': 'Absent'})
+
+    def test_resubmitting_updates_in_place(self):
+        self.add_class('one', 4)
+        rolls = [str(roll) for roll in range(1, 5)]
+        self.take_attendance('one', rolls)
+        queries = self.take_attendance('one', rolls, statuses=('Absent', 'Present'))
+        self.assertEqual(len([sql for sql in queries if sql.startswith('INSERT INTO "school_attendance"')]), 1)
+        records = models.Attendance.objects.filter(cl='one', date=datetime.date(2024, 1, 1))
+        self.assertEqual(records.count(), 4)
+        self.assertEqual(dict(records.values_list('roll', 'present_status')),
+                         {'1': 'Absent', '2': 'Present', '3': 'Absent', '4': 'Present'})
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AttendanceReportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        admin = User.objects.create_user('admin', password='password')
+        Group.objects.get_or_create(name='ADMIN')[0].user_set.add(admin)
+        self.client.force_login(admin)
+        for roll, name in (('2', 'Bob'), ('1', 'Ann'), ('3', 'Cid')):
+            user = User.objects.create_user(name.lower(), first_name=name, last_name='Doe')
+            models.StudentExtra.objects.create(user=user, roll=roll, cl_id='one', status=True)
+        for day in range(1, 32):
+            date = datetime.date(2024, 1, day)
+            # Records inserted in another order than the students
+            models.Attendance.objects.create(cl='one', date=date, roll='3', present_status='Absent')
+            models.Attendance.objects.create(cl='one', date=date, roll='1', present_status='Present')
+            if day % 2:
+                models.Attendance.objects.create(cl='one', date=date, roll='2', present_status='Present')
+
+    def report(self, start, end):
+        url = reverse('admin-attendance-report', args=['one'])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'start': start, 'end': end})
+        self.assertEqual(response.status_code, 200)
+        return response.context, len(queries)
+
+    def test_matrix(self):
+        context, _ = self.report('2024-01-01', '2024-01-04')
+        self.assertEqual(context['days'], [datetime.date(2024, 1, day) for day in range(1, 5)])
+        rows = [(row['student'].get_name, row['cells'], row['present']) for row in context['rows']]
+        self.assertEqual(rows, [('Ann Doe', [True] * 4, 4), ('Bob Doe', [True, None, True, None], 2),
+                                ('Cid Doe', [False] * 4, 0)])
+        self.assertEqual(context['day_totals'], [2, 1, 2, 1])
+
+    def test_query_count_does_not_depend_on_the_range(self):
+        _, week = self.report('2024-01-01', '2024-01-07')
+        _, month = self.report('2024-01-01', '2024-01-31')
+        self.assertEqual(week, month)
+
+    def test_day_view_pairs_records_by_roll(self):
+        response = self.client.post(reverse('admin-view-attendance', args=['one']), {'date': '2024-01-02'})
+        pairs = [(status, student.get_name) for status, student in response.context['mylist']]
+        self.assertEqual(pairs, [('Present', 'Ann Doe'), (None, 'Bob Doe'), ('Absent', 'Cid Doe')])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AttendanceRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('student', password='password', first_name='Ann', last_name='Doe')
+        Group.objects.get_or_create(name='STUDENT')[0].user_set.add(user)
+        models.StudentExtra.objects.create(user=user, roll='1', cl_id='one', status=True)
+        other = User.objects.create_user('other', first_name='Bob', last_name='Doe')
+        models.StudentExtra.objects.create(user=other, roll='2', cl_id='one', status=True)
+        admin = User.objects.create_user('admin', password='password')
+        Group.objects.get_or_create(name='ADMIN')[0].user_set.add(admin)
+        self.client.force_login(admin)
+        # Present every odd day from Jan 25 to Mar 5, absent on even days (roll 2 always present)
+        self.day = datetime.date(2024, 1, 25)
+        while self.day <= datetime.date(2024, 3, 5):
+            status = 'Present' if self.day.day % 2 else 'Absent'
+            self.client.post(reverse('admin-take-attendance', args=['one']),
+                             {'date': self.day.isoformat(), 'roll': ['1', '2'], 'present_status': [status, 'Present']})
+            self.day += datetime.timedelta(days=1)
+
+    def expected(self, start, end):
+        records = models.Attendance.objects.filter(cl='one', roll='1', date__range=(start, end))
+        present = records.filter(present_status='Present').count()
+        return present, records.count() - present
+
+    def test_rollups_are_maintained_on_write(self):
+        february = models.StudentMonthlyAttendance.objects.get(cl='one', roll='1', month=datetime.date(2024, 2, 1))
+        self.assertEqual((february.present, february.absent), (15, 14))
+        day = models.ClassDailyAttendance.objects.get(cl='one', date=datetime.date(2024, 2, 2))
+        self.assertEqual((day.present, day.absent), (1, 1))
+        # Re-submitting a day changes the rollups, it doesn't add to them
+        self.client.post(reverse('admin-take-attendance', args=['one']),
+                         {'date': '2024-02-02', 'roll': ['1', '2'], 'present_status': ['Present', 'Present']})
+        february.refresh_from_db()
+        day.refresh_from_db()
+        self.assertEqual((february.present, february.absent), (16, 13))
+        self.assertEqual((day.present, day.absent), (2, 0))
+
+    def test_range_summaries(self):
+        ranges = [(datetime.date(2024, 1, 1), datetime.date(2024, 12, 31)),
+                  (datetime.date(2024, 1, 28), datetime.date(2024, 3, 2)),
+                  (datetime.date(2024, 2, 1), datetime.date(2024, 2, 29)),
+                  (datetime.date(2024, 2, 10), datetime.date(2024, 2, 20)),
+                  (datetime.date(2024, 1, 30), datetime.date(2024, 2, 3))]
+        for start, end in ranges:
+            self.assertEqual(models.StudentMonthlyAttendance.summary('one', '1', start, end),
+                             self.expected(start, end))
+
+    def test_summary_reads_the_rollup_for_whole_months(self):
+        with CaptureQueriesContext(connection) as queries:
+            models.StudentMonthlyAttendance.summary('one', '1', datetime.date(2024, 2, 1), datetime.date(2024, 2, 29))
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('school_attendance"', queries[0]['sql'])
+
+    def test_student_page_shows_the_summary(self):
+        self.client.force_login(User.objects.get(username='student'))
+        response = self.client.get(reverse('student-attendance'), {'start': '2024-02-01', 'end': '2024-02-29'})
+        self.assertEqual(response.context['summary'], {'present': 15, 'absent': 14, 'percentage': 51.7})
+
+    def test_backfill(self):
+        models.StudentMonthlyAttendance.objects.all().delete()
+        models.ClassDailyAttendance.objects.all().delete()
+        call_command('backfill_attendance_rollups', stdout=io.StringIO())
+        self.assertEqual(models.StudentMonthlyAttendance.objects.count(), 6)
+        self.assertEqual(models.ClassDailyAttendance.objects.count(), 41)
+        self.assertEqual(models.StudentMonthlyAttendance.summary('one', '1', datetime.date(2024, 1, 1),
+                                                                 datetime.date(2024, 3, 31)),
+                         self.expected(datetime.date(2024, 1, 1), datetime.date(2024, 3, 31)))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RoleCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = {}
+        for role in ('ADMIN', 'TEACHER', 'STUDENT'):
+            user = User.objects.create_user(role.lower(), password='password', first_name=role, last_name='Doe')
+            Group.objects.get_or_create(name=role)[0].user_set.add(user)
+            self.users[role] = user
+        models.TeacherExtra.objects.create(user=self.users['TEACHER'], salary=5000, mobile='1', status=True)
+        models.StudentExtra.objects.create(user=self.users['STUDENT'], roll='1', cl_id='one', status=True)
+        # The views use a database in a temporary directory, not the one of the project (./database.bin)
+        self.directory = tempfile.TemporaryDirectory()
+        database = fe.Database(os.path.join(self.directory.name, 'database.bin'), journal=True)
+        database.add_batch(fe.Batch('one'))
+        database.add_teacher(fe.Teacher('teacher', 'password', 'TEACHER', 'Doe', 1, 5000), status=True)
+        database.add_student(fe.Student('student', 'password', 'STUDENT', 'Doe', database.get_batch('one'), 100, 1, 1),
+                             status=True)
+        self.patcher = mock.patch.object(views, 'db', database)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.directory.cleanup()
+
+    def dashboard_queries(self, role, url):
+        self.client.force_login(self.users[role])
+        self.assertEqual(self.client.get(reverse(url)).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse(url)).status_code, 200)
+        return [query['sql'] for query in queries]
+
+    def assert_no_role_queries(self, queries):
+        for sql in queries:
+            self.assertNotIn('auth_group', sql)
+            self.assertNotIn('school_teacherextra', sql)
+            self.assertNotIn('school_studentextra', sql)
+
+    def test_admin_dashboard(self):
+        queries = self.dashboard_queries('ADMIN', 'admin-dashboard')
+        self.assert_no_role_queries(queries)
+        self.assertEqual(len(queries), 2)  # session, user (the notices are cached)
+
+    def test_teacher_dashboard(self):
+        queries = self.dashboard_queries('TEACHER', 'teacher-dashboard')
+        self.assert_no_role_queries(queries)
+        self.assertEqual(len(queries), 2)
+
+    def test_student_dashboard(self):
+        queries = self.dashboard_queries('STUDENT', 'student-dashboard')
+        self.assert_no_role_queries(queries)
+        self.assertEqual(len(queries), 2)
+
+    def test_approve_and_delete_invalidate_the_cache(self):
+        user = User.objects.create_user('waiting', password='password')
+        Group.objects.get_or_create(name='TEACHER')[0].user_set.add(user)
+        models.TeacherExtra.objects.create(user=user, salary=5000, mobile='1')
+        views.db.add_teacher(fe.Teacher('waiting', 'password', 'Wait', 'Doe', 1, 5000))
+        self.client.force_login(user)
+        self.assertTemplateUsed(self.client.get(reverse('afterlogin')), 'school/teacher_wait_for_approval.html')
+
+        self.client.force_login(self.users['ADMIN'])
+        self.client.get(reverse('approve-teacher', args=['waiting']))
+        self.assertEqual(views.user_role(user), ('TEACHER', True))
+        self.client.get(reverse('delete-teacher', args=['waiting']))
+        self.assertIsNone(cache.get(f'school-role-{user.id}'))
+
+    def test_update_views_approve_the_account(self):
+        teacher = User.objects.create_user('waiting-teacher', password='password')
+        Group.objects.get_or_create(name='TEACHER')[0].user_set.add(teacher)
+        models.TeacherExtra.objects.create(user=teacher, salary=5000, mobile='1')
+        views.db.add_teacher(fe.Teacher('waiting-teacher', 'password', 'Wait', 'Doe', 1, 5000))
+        student = User.objects.create_user('waiting-student', password='password')
+        Group.objects.get_or_create(name='STUDENT')[0].user_set.add(student)
+        models.StudentExtra.objects.create(user=student, roll='2', cl_id='one')
+        views.db.add_student(fe.Student('waiting-student', 'password', 'Wait', 'Doe', views.db.get_batch('one'), 100,
+                                        2, 1))
+        self.assertEqual(views.user_role(teacher), ('TEACHER', False))
+        self.assertEqual(views.user_role(student), ('STUDENT', False))
+
+        self.client.force_login(self.users['ADMIN'])
+        self.client.post(reverse('update-teacher', args=['waiting-teacher']),
+                         {'first_name': 'Wait', 'last_name': 'Doe', 'username': 'waiting-teacher',
+                          'password': 'password', 'salary': 6000, 'mobile': '1'})
+        self.client.post(reverse('update-student', args=['waiting-student']),
+                         {'first_name': 'Wait', 'last_name': 'Doe', 'username': 'waiting-student',
+                          'password': 'password', 'roll': '2', 'cl': 'one', 'mobile': '1', 'fee': 200})
+        self.assertEqual(views.user_role(teacher), ('TEACHER', True))
+        self.assertEqual(views.user_role(student), ('STUDENT', True))
+
+    def test_other_workers_see_the_invalidation(self):
+        # A new connection to the cache backend stands for the cache of another worker process
+        other_worker = caches.create_connection('default')
+        user = User.objects.create_user('waiting', password='password')
+        Group.objects.get_or_create(name='STUDENT')[0].user_set.add(user)
+        models.StudentExtra.objects.create(user=user, roll='2', cl_id='one')
+        self.assertEqual(views.user_role(user), ('STUDENT', False))
+        self.assertEqual(other_worker.get(f'school-role-{user.id}'), ('STUDENT', False))
+        views.forget_role(user.id)
+        self.assertIsNone(other_worker.get(f'school-role-{user.id}'))
+        self.assertNotIn(type(cache).__name__, ('LocMemCache', 'DummyCache'))  # Per process / no cache
+
+
+@override_settings(CACHES=TEST_CACHES)
+class NoticeFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for i in range(25):
+            models.Notice.objects.create(by='school', message=f'notice {i}')
+
+    def test_pages_follow_the_cursor(self):
+        messages, cursor = [], None
+        while True:
+            page = views.notice_feed(cursor, size=10)
+            messages.append([notice.message for notice in page['notices']])
+            cursor = page['next']
+            if cursor is None:
+                break
+        self.assertEqual([len(page) for page in messages], [10, 10, 5])
+        self.assertEqual(sum(messages, []), [f'notice {i}' for i in range(24, -1, -1)])
+
+    def test_pages_are_cached_until_a_notice_is_posted(self):
+        first = views.notice_feed()
+        second = views.notice_feed(first['next'])
+        with self.assertNumQueries(0):
+            self.assertEqual(views.notice_feed()['notices'], first['notices'])
+            self.assertEqual(views.notice_feed(first['next'])['notices'], second['notices'])
+        admin = User.objects.create_user('admin', password='password', first_name='Ann')
+        Group.objects.get_or_create(name='ADMIN')[0].user_set.add(admin)
+        self.client.force_login(admin)
+        self.client.post(reverse('admin-notice'), {'message': 'new notice', 'by': 'Ann'})
+        self.assertEqual(views.notice_feed()['notices'][0].message, 'new notice')
+
+    def test_a_notice_posted_by_another_worker_drops_the_pages(self):
+        views.notice_feed()
+        # A new connection to the cache backend stands for the cache of another worker process
+        with mock.patch.object(views, 'cache', caches.create_connection('default')):
+            models.Notice.objects.create(by='school', message='new notice')
+            views.forget_notice_feed()
+        self.assertEqual(views.notice_feed()['notices'][0].message, 'new notice')
+
+    def test_evicted_version_does_not_bring_back_old_pages(self):
+        views.notice_feed()
+        views.forget_notice_feed()
+        views.notice_feed()
+        cache.delete(views.NOTICE_FEED_VERSION)
+        models.Notice.objects.create(by='school', message='new notice')
+        self.assertEqual(views.notice_feed()['notices'][0].message, 'new notice')
+
+    def test_invalid_cursor_gives_the_newest_notices(self):
+        self.assertEqual(views.notice_feed('yesterday')['notices'], views.notice_feed()['notices'])
+
+
+class SchoolClassTests(TestCase):
+    def test_classes_are_seeded(self):
+        self.assertEqual([str(cl) for cl in models.SchoolClass.objects.all()], [name for name, _ in models.classes])
+
+    def test_roll_is_unique_in_a_class(self):
+        first, second, third = (User.objects.create_user(name) for name in ('first', 'second', 'third'))
+        models.StudentExtra.objects.create(user=first, roll='1', cl_id='one')
+        models.StudentExtra.objects.create(user=second, roll='1', cl_id='two')
+        with self.assertRaises(IntegrityError):
+            models.StudentExtra.objects.create(user=third, roll='1', cl_id='one')
+
+    def test_form_takes_a_class_name(self):
+        form = forms.StudentExtraForm({'roll': '1', 'cl': 'three', 'mobile': '1', 'fee': 100})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['cl'].name, 'three')
+        self.assertNotIn('JOIN', str(models.StudentExtra.objects.filter(cl='three').query))
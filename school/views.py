@@ -1,17 +1,31 @@
 from django.shortcuts import render, redirect, reverse
 from . import forms, models
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import Count, Q, Sum
 from django.contrib.auth.models import Group
-from django.http import HttpResponseRedirect
-from django.contrib.auth import logout
+from django.http import HttpResponseRedirect, HttpResponseBadRequest, StreamingHttpResponse
+from django.contrib.auth import logout, user_logged_in
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import receiver
 from django.core.mail import send_mail
 
+import csv
+import datetime
+import json
+import time
+import warnings
+
 import basic_classes as fe
 
-db = fe.Database()
+# shared=True: every worker process sees the writes of the others (refreshed by DatabaseRefreshMiddleware).
+# It needs fcntl file locks: without them (Windows) the database is only coherent within one process.
+if fe.fcntl is None:
+    warnings.warn("File locking (fcntl) is not available: the school database is not shared between processes, "
+                  "run a single worker process.")
+db = fe.Database(journal=True, shared=fe.fcntl is not None)
 for i in ['one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten']:
     try:
         db.add_batch(fe.Batch(i))
@@ -86,7 +100,7 @@ def student_signup_view(request):
                                  form1.cleaned_data['password'],
                                  form1.cleaned_data['first_name'],
                                  form1.cleaned_data['last_name'],
-                                 db.get_batch(form2.cleaned_data['cl']),
+                                 db.get_batch(form2.cleaned_data['cl'].name),
                                  form2.cleaned_data['fee'],
                                  form2.cleaned_data['roll'],
                                  form2.cleaned_data['mobile'])
@@ -141,29 +155,79 @@ def teacher_signup_view(request):
 
 
 # for checking user is teacher , student or admin
+def user_role(user):
+    """
+    Role ('ADMIN', 'TEACHER', 'STUDENT' or None) and approval status of a user (admins are always approved).
+    Resolved at most once per user (groups, then the TeacherExtra / StudentExtra status) and cached until
+    forget_role() is called by the views that approve or delete the account.
+    """
+    if not user.is_authenticated:
+        return None, False
+    key = f'school-role-{user.id}'
+    role = cache.get(key)
+    if role is None:
+        groups = set(user.groups.values_list('name', flat=True))
+        if 'ADMIN' in groups:
+            role = ('ADMIN', True)
+        elif 'TEACHER' in groups:
+            role = ('TEACHER', models.TeacherExtra.objects.filter(user_id=user.id, status=True).exists())
+        elif 'STUDENT' in groups:
+            role = ('STUDENT', models.StudentExtra.objects.filter(user_id=user.id, status=True).exists())
+        else:
+            role = (None, False)
+        cache.set(key, role, settings.ROLE_CACHE_TIMEOUT)
+    return role
+
+
+def forget_role(user_id):
+    # Drop the cached role of a user (the account was approved or deleted)
+    cache.delete(f'school-role-{user_id}')
+
+
+@receiver(user_logged_in)
+def resolve_role_at_login(sender, request, user, **kwargs):
+    forget_role(user.id)
+    user_role(user)
+
+
 def is_admin(user):
-    return user.groups.filter(name='ADMIN').exists()
+    return user_role(user)[0] == 'ADMIN'
 
 
 def is_teacher(user):
-    return user.groups.filter(name='TEACHER').exists()
+    return user_role(user)[0] == 'TEACHER'
 
 
 def is_student(user):
-    return user.groups.filter(name='STUDENT').exists()
+    return user_role(user)[0] == 'STUDENT'
+
+
+# paginated admin lists
+def list_page(request, kind, status):
+    """
+    Template context for one page of the students / teachers list (keyset pagination, see Database.page).
+    Query parameters: after / before (cursors of the next / previous page), size, order (username or roll)
+    :return: Dict with the objects (under kind), the page and its parameters, None for invalid parameters
+    """
+    order = request.GET.get('order', 'username')
+    try:
+        size = min(max(int(request.GET.get('size', settings.LIST_PAGE_SIZE)), 1), 500)
+        page = db.page(kind, status, order, size, request.GET.get('after'), request.GET.get('before'))
+    except ValueError:
+        return None
+    return {kind: page['items'], 'page': page, 'size': size, 'order': order}
 
 
 def afterlogin_view(request):
-    if is_admin(request.user):
+    role, accountapproval = user_role(request.user)
+    if role == 'ADMIN':
         return redirect('admin-dashboard')
-    elif is_teacher(request.user):
-        accountapproval = models.TeacherExtra.objects.all().filter(user_id=request.user.id, status=True)
+    elif role == 'TEACHER':
         if accountapproval:
             return redirect('teacher-dashboard')
         else:
             return render(request, 'school/teacher_wait_for_approval.html')
-    elif is_student(request.user):
-        accountapproval = models.StudentExtra.objects.all().filter(user_id=request.user.id, status=True)
+    elif role == 'STUDENT':
         if accountapproval:
             return redirect('student-dashboard')
         else:
@@ -186,7 +250,7 @@ def admin_dashboard_view(request):
     studentfee = db.get_total_fees()
     pendingstudentfee = db.get_total_fees(status=False)
 
-    notice = models.Notice.objects.all()
+    feed = notice_feed(request.GET.get('notices'))
 
     # aggregate function return dictionary so fetch data from dictionay
     mydict = {
@@ -202,7 +266,8 @@ def admin_dashboard_view(request):
         'studentfee': studentfee,
         'pendingstudentfee': pendingstudentfee,
 
-        'notice': notice
+        'notice': feed['notices'],
+        'notice_next': feed['next'],
 
     }
 
@@ -255,15 +320,19 @@ def admin_add_teacher_view(request):
 @login_required(login_url='adminlogin')
 @user_passes_test(is_admin)
 def admin_view_teacher_view(request):
-    teachers = db.get_all_teachers(status=True)
-    return render(request, 'school/admin_view_teacher.html', {'teachers': teachers})
+    context = list_page(request, 'teachers', status=True)
+    if context is None:
+        return HttpResponseBadRequest('Invalid page.')
+    return render(request, 'school/admin_view_teacher.html', context)
 
 
 @login_required(login_url='adminlogin')
 @user_passes_test(is_admin)
 def admin_approve_teacher_view(request):
-    teachers = db.get_all_teachers(status=False)
-    return render(request, 'school/admin_approve_teacher.html', {'teachers': teachers})
+    context = list_page(request, 'teachers', status=False)
+    if context is None:
+        return HttpResponseBadRequest('Invalid page.')
+    return render(request, 'school/admin_approve_teacher.html', context)
 
 
 @login_required(login_url='adminlogin')
@@ -273,6 +342,7 @@ def approve_teacher_view(request, pk):
     teacher = models.TeacherExtra.objects.get(user=user)
     teacher.status = True
     teacher.save()
+    forget_role(user.id)
 
     db.update_teacher(pk, status=True)
     db.save()
@@ -284,6 +354,7 @@ def approve_teacher_view(request, pk):
 def delete_teacher_view(request, pk):
     user = models.User.objects.get(username=pk)
     teacher = models.TeacherExtra.objects.get(user=user)
+    forget_role(user.id)
     user.delete()
     teacher.delete()
 
@@ -297,6 +368,7 @@ def delete_teacher_view(request, pk):
 def delete_teacher_from_school_view(request, pk):
     user = models.User.objects.get(username=pk)
     teacher = models.TeacherExtra.objects.get(user=user)
+    forget_role(user.id)
     user.delete()
     teacher.delete()
 
@@ -335,6 +407,7 @@ def update_teacher_view(request, pk):
             f2 = form2.save(commit=False)
             f2.status = True
             f2.save()
+            forget_role(user.id)
             return redirect('admin-view-teacher')
     return render(request, 'school/admin_update_teacher.html', context=mydict)
 
@@ -368,7 +441,7 @@ def admin_add_student_view(request):
                                  first_name=form1.cleaned_data['first_name'],
                                  last_name=form1.cleaned_data['last_name'],
                                  contact=form2.cleaned_data['mobile'],
-                                 batch=db.get_batch(form2.cleaned_data['cl']),
+                                 batch=db.get_batch(form2.cleaned_data['cl'].name),
                                  fee=form2.cleaned_data['fee'],
                                  roll=form2.cleaned_data['roll']
                                  )
@@ -397,8 +470,10 @@ def admin_add_student_view(request):
 @user_passes_test(is_admin)
 def admin_view_student_view(request):
     # students = models.StudentExtra.objects.all().filter(status=True)
-    students = db.get_all_students(status=True)
-    return render(request, 'school/admin_view_student.html', {'students': students})
+    context = list_page(request, 'students', status=True)
+    if context is None:
+        return HttpResponseBadRequest('Invalid page.')
+    return render(request, 'school/admin_view_student.html', context)
 
 
 @login_required(login_url='adminlogin')
@@ -406,6 +481,7 @@ def admin_view_student_view(request):
 def delete_student_from_school_view(request, pk):
     user = models.User.objects.get(username=pk)
     student = models.StudentExtra.objects.get(user=user)
+    forget_role(user.id)
     user.delete()
     student.delete()
 
@@ -419,6 +495,7 @@ def delete_student_from_school_view(request, pk):
 def delete_student_view(request, pk):
     user = models.User.objects.get(username=pk)
     student = models.StudentExtra.objects.get(user=user)
+    forget_role(user.id)
     user.delete()
     student.delete()
 
@@ -447,7 +524,7 @@ def update_student_view(request, pk):
                               last_name=form1.cleaned_data['last_name'],
                               contact=form2.cleaned_data['mobile'],
                               fee=form2.cleaned_data['fee'],
-                              batch=db.get_batch(form2.cleaned_data['cl']),
+                              batch=db.get_batch(form2.cleaned_data['cl'].name),
                               roll=form2.cleaned_data['roll']
                               )
             db.save()
@@ -458,6 +535,7 @@ def update_student_view(request, pk):
             f2 = form2.save(commit=False)
             f2.status = True
             f2.save()
+            forget_role(user.id)
             return redirect('admin-view-student')
     return render(request, 'school/admin_update_student.html', context=mydict)
 
@@ -465,8 +543,10 @@ def update_student_view(request, pk):
 @login_required(login_url='adminlogin')
 @user_passes_test(is_admin)
 def admin_approve_student_view(request):
-    students = db.get_all_students(status=False)
-    return render(request, 'school/admin_approve_student.html', {'students': students})
+    context = list_page(request, 'students', status=False)
+    if context is None:
+        return HttpResponseBadRequest('Invalid page.')
+    return render(request, 'school/admin_approve_student.html', context)
 
 
 @login_required(login_url='adminlogin')
@@ -476,6 +556,7 @@ def approve_student_view(request, pk):
     students = models.StudentExtra.objects.get(user=user)
     students.status = True
     students.save()
+    forget_role(user.id)
 
     db.update_student(pk, status=True)
     db.save()
@@ -490,6 +571,69 @@ def admin_view_student_fee_view(request):
 
 
 # attendance related view
+def save_class_attendance(request, cl, date):
+    """
+    Save the attendance posted by a take-attendance form: one query for the roster of the class and one bulk
+    INSERT, in a single transaction. Re-submitting a day updates its records in place (upsert on cl, date, roll).
+    The rollups of the day and of the month are recounted in the same transaction.
+    The form posts a roll with every present_status (older forms only the statuses, in the order of the roster).
+    """
+    roster = dict.fromkeys(models.StudentExtra.objects.filter(cl=cl).values_list('roll', flat=True))
+    statuses = request.POST.getlist('present_status')
+    rolls = request.POST.getlist('roll') or list(roster)
+    records = [models.Attendance(cl=cl, date=date, roll=roll, present_status=status)
+               for roll, status in zip(rolls, statuses) if roll in roster]
+    with transaction.atomic():
+        models.Attendance.objects.bulk_create(records, update_conflicts=True, unique_fields=['cl', 'date', 'roll'],
+                                              update_fields=['present_status'])
+        models.ClassDailyAttendance.refresh(cl, date)
+        models.StudentMonthlyAttendance.refresh(cl, date)
+
+
+def attendance_of_day(cl, date):
+    """
+    (present_status, student) pairs of a class for one day, matched by roll (None for students without a record).
+    """
+    statuses = dict(models.Attendance.objects.filter(date=date, cl=cl).values_list('roll', 'present_status'))
+    students = models.StudentExtra.objects.filter(cl=cl).select_related('user').order_by('roll')
+    return [(statuses.get(student.roll), student) for student in students]
+
+
+def attendance_matrix(cl, start, end):
+    """
+    Students x days attendance of a class, with per-student and per-day totals of the days present.
+    Two queries whatever the range: the roster (with the users, for the names) and the attendance grouped by roll
+    and day.
+    :return: Dict with "days", "rows" (one per student: student, cells (True: present, False: absent, None: no
+             record) and present) and "day_totals"
+    """
+    days = [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+    column = {day: i for i, day in enumerate(days)}
+    cells = {}
+    records = (models.Attendance.objects.filter(cl=cl, date__range=(start, end)).values('roll', 'date')
+               .annotate(present=Count('id', filter=Q(present_status='Present'))).order_by())
+    for record in records:
+        cells.setdefault(record['roll'], [None] * len(days))[column[record['date']]] = record['present'] > 0
+    rows = []
+    day_totals = [0] * len(days)
+    for student in models.StudentExtra.objects.filter(cl=cl).select_related('user').order_by('roll'):
+        row = cells.get(student.roll, [None] * len(days))
+        for i, present in enumerate(row):
+            day_totals[i] += bool(present)
+        rows.append({'student': student, 'cells': row, 'present': sum(1 for present in row if present)})
+    return {'days': days, 'rows': rows, 'day_totals': day_totals}
+
+
+def attendance_report(request, cl, template):
+    # Matrix of a date range (?start=...&end=..., the current month by default)
+    first, last = models.month_range(datetime.date.today())
+    form = forms.AttendanceRangeForm(request.GET or {'start': first, 'end': last})
+    context = {'cl': cl, 'form': form}
+    if form.is_valid():
+        context.update(attendance_matrix(cl, form.cleaned_data['start'], form.cleaned_data['end']))
+    return render(request, template, context)
+
+
 @login_required(login_url='adminlogin')
 @user_passes_test(is_admin)
 def admin_attendance_view(request):
@@ -499,21 +643,12 @@ def admin_attendance_view(request):
 @login_required(login_url='adminlogin')
 @user_passes_test(is_admin)
 def admin_take_attendance_view(request, cl):
-    students = models.StudentExtra.objects.all().filter(cl=cl)
-    print(students)
+    students = models.StudentExtra.objects.all().filter(cl=cl).select_related('user')
     aform = forms.AttendanceForm()
     if request.method == 'POST':
         form = forms.AttendanceForm(request.POST)
         if form.is_valid():
-            Attendances = request.POST.getlist('present_status')
-            date = form.cleaned_data['date']
-            for i in range(len(Attendances)):
-                AttendanceModel = models.Attendance()
-                AttendanceModel.cl = cl
-                AttendanceModel.date = date
-                AttendanceModel.present_status = Attendances[i]
-                AttendanceModel.roll = students[i].roll
-                AttendanceModel.save()
+            save_class_attendance(request, cl, form.cleaned_data['date'])
             return redirect('admin-attendance')
         else:
             print('form invalid')
@@ -528,15 +663,19 @@ def admin_view_attendance_view(request, cl):
         form = forms.AskDateForm(request.POST)
         if form.is_valid():
             date = form.cleaned_data['date']
-            attendancedata = models.Attendance.objects.all().filter(date=date, cl=cl)
-            studentdata = models.StudentExtra.objects.all().filter(cl=cl)
-            mylist = zip(attendancedata, studentdata)
+            mylist = attendance_of_day(cl, date)
             return render(request, 'school/admin_view_attendance_page.html', {'cl': cl, 'mylist': mylist, 'date': date})
         else:
             print('form invalid')
     return render(request, 'school/admin_view_attendance_ask_date.html', {'cl': cl, 'form': form})
 
 
+@login_required(login_url='adminlogin')
+@user_passes_test(is_admin)
+def admin_attendance_report_view(request, cl):
+    return attendance_report(request, cl, 'school/admin_attendance_report.html')
+
+
 # fee related view by admin
 @login_required(login_url='adminlogin')
 @user_passes_test(is_admin)
@@ -552,7 +691,120 @@ def admin_view_fee_view(request, cl):
     return render(request, 'school/admin_view_fee.html', {'feedetails': feedetails, 'cl': cl})
 
 
+# export related views
+class Echo:
+    # File-like object for csv.writer: write() returns the line instead of keeping it
+    def write(self, value):
+        return value
+
+
+def export_response(request, kind, default_columns, filename):
+    """
+    Stream a students / teachers list as CSV or JSON. Rows are generated one at a time from db.export_rows, so the
+    first byte goes out at once and memory doesn't grow with the number of rows.
+    Query parameters: format (csv or json), columns (comma separated), status (true, false or all), batch
+    """
+    export_format = request.GET.get('format', 'csv')
+    columns = [c for c in request.GET.get('columns', '').split(',') if c] or default_columns
+    status = {'true': True, 'false': False, 'all': None}.get(request.GET.get('status', 'true').lower(), '')
+    if export_format not in ('csv', 'json') or status == '':
+        return HttpResponseBadRequest('Invalid format or status.')
+    try:
+        rows = db.export_rows(kind, columns, status, request.GET.get('batch') or None)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    if export_format == 'csv':
+        response = StreamingHttpResponse(csv_lines(columns, rows), content_type='text/csv')
+    else:
+        response = StreamingHttpResponse(json_array(columns, rows), content_type='application/json')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
+
+
+def csv_lines(columns, rows):
+    # A header line, then one line per row
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def json_array(columns, rows):
+    # A JSON array of objects, one chunk per row
+    yield '['
+    separator = '\n'
+    for row in rows:
+        yield separator + json.dumps(dict(zip(columns, row)), default=str)
+        separator = ',\n'
+    yield '\n]\n'
+
+
+@login_required(login_url='adminlogin')
+@user_passes_test(is_admin)
+def admin_export_students_view(request):
+    return export_response(request, 'students', list(fe.Database.EXPORT_COLUMNS['students']), 'students')
+
+
+@login_required(login_url='adminlogin')
+@user_passes_test(is_admin)
+def admin_export_teachers_view(request):
+    return export_response(request, 'teachers', list(fe.Database.EXPORT_COLUMNS['teachers']), 'teachers')
+
+
+@login_required(login_url='adminlogin')
+@user_passes_test(is_admin)
+def admin_export_fees_view(request):
+    return export_response(request, 'students', ['username', 'first_name', 'last_name', 'batch', 'fee'], 'fees')
+
+
+@login_required(login_url='adminlogin')
+@user_passes_test(is_admin)
+def admin_export_salaries_view(request):
+    return export_response(request, 'teachers', ['username', 'first_name', 'last_name', 'salary'], 'salaries')
+
+
 # notice related views
+NOTICE_FEED_VERSION = 'school-notice-feed-version'
+
+
+def notice_feed(before=None, size=None):
+    """
+    One page of the notice board, newest first (cursor pagination on the date index of Notice).
+    Pages are cached (in the cache shared by the worker processes); posting a notice bumps the feed version, which
+    drops all of them at once, in every worker.
+    :param before: Cursor of the page (the "next" cursor of the previous one), None for the newest notices
+    :param size: Notices per page (default NOTICE_FEED_SIZE)
+    :return: Dict with "notices" and "next" (cursor of the older notices, None on the last page)
+    """
+    size = size or settings.NOTICE_FEED_SIZE
+    try:
+        date, pk = before.split('.')
+        cursor = datetime.date.fromisoformat(date), int(pk)
+    except (AttributeError, ValueError):
+        cursor = None  # No or invalid cursor: the newest notices
+    # A version that was evicted restarts from a new number, never from one whose pages may still be cached
+    version = cache.get_or_set(NOTICE_FEED_VERSION, time.time_ns, None)
+    key = f'school-notice-feed-{version}-{size}' + (f'-{cursor[0].isoformat()}-{cursor[1]}' if cursor else '')
+    page = cache.get(key)
+    if page is None:
+        notices = models.Notice.objects.order_by('-date', '-id')
+        if cursor:
+            notices = notices.filter(Q(date__lt=cursor[0]) | Q(date=cursor[0], id__lt=cursor[1]))
+        notices = list(notices[:size + 1])
+        older = notices[size - 1] if len(notices) > size else None
+        page = {'notices': notices[:size], 'next': f'{older.date.isoformat()}.{older.id}' if older else None}
+        cache.set(key, page, settings.NOTICE_FEED_TIMEOUT)
+    return page
+
+
+def forget_notice_feed():
+    # Drop the cached pages of the notice feed (a notice was posted)
+    try:
+        cache.incr(NOTICE_FEED_VERSION)
+    except ValueError:
+        pass  # Not cached yet
+
+
 @login_required(login_url='adminlogin')
 @user_passes_test(is_admin)
 def admin_notice_view(request):
@@ -563,6 +815,7 @@ def admin_notice_view(request):
             form = form.save(commit=False)
             form.by = request.user.first_name
             form.save()
+            forget_notice_feed()
             return redirect('admin-dashboard')
     return render(request, 'school/admin_notice.html', {'form': form})
 
@@ -573,12 +826,13 @@ def admin_notice_view(request):
 def teacher_dashboard_view(request):
     # teacherdata = models.TeacherExtra.objects.all().filter(status=True, user_id=request.user.id)
     teacher = db.get_teacher(request.user.username)
-    notice = models.Notice.objects.all()
+    feed = notice_feed(request.GET.get('notices'))
     mydict = {
         'salary': teacher.salary,
         'mobile': teacher.contact,
         'date': teacher.join_date,
-        'notice': notice
+        'notice': feed['notices'],
+        'notice_next': feed['next'],
     }
     return render(request, 'school/teacher_dashboard.html', context=mydict)
 
@@ -592,20 +846,12 @@ def teacher_attendance_view(request):
 @login_required(login_url='teacherlogin')
 @user_passes_test(is_teacher)
 def teacher_take_attendance_view(request, cl):
-    students = models.StudentExtra.objects.all().filter(cl=cl)
+    students = models.StudentExtra.objects.all().filter(cl=cl).select_related('user')
     aform = forms.AttendanceForm()
     if request.method == 'POST':
         form = forms.AttendanceForm(request.POST)
         if form.is_valid():
-            Attendances = request.POST.getlist('present_status')
-            date = form.cleaned_data['date']
-            for i in range(len(Attendances)):
-                AttendanceModel = models.Attendance()
-                AttendanceModel.cl = cl
-                AttendanceModel.date = date
-                AttendanceModel.present_status = Attendances[i]
-                AttendanceModel.roll = students[i].roll
-                AttendanceModel.save()
+            save_class_attendance(request, cl, form.cleaned_data['date'])
             return redirect('teacher-attendance')
         else:
             print('form invalid')
@@ -620,9 +866,7 @@ def teacher_view_attendance_view(request, cl):
         form = forms.AskDateForm(request.POST)
         if form.is_valid():
             date = form.cleaned_data['date']
-            attendancedata = models.Attendance.objects.all().filter(date=date, cl=cl)
-            studentdata = models.StudentExtra.objects.all().filter(cl=cl)
-            mylist = zip(attendancedata, studentdata)
+            mylist = attendance_of_day(cl, date)
             return render(request, 'school/teacher_view_attendance_page.html',
                           {'cl': cl, 'mylist': mylist, 'date': date})
         else:
@@ -630,6 +874,12 @@ def teacher_view_attendance_view(request, cl):
     return render(request, 'school/teacher_view_attendance_ask_date.html', {'cl': cl, 'form': form})
 
 
+@login_required(login_url='teacherlogin')
+@user_passes_test(is_teacher)
+def teacher_attendance_report_view(request, cl):
+    return attendance_report(request, cl, 'school/teacher_attendance_report.html')
+
+
 @login_required(login_url='teacherlogin')
 @user_passes_test(is_teacher)
 def teacher_notice_view(request):
@@ -640,6 +890,7 @@ def teacher_notice_view(request):
             form = form.save(commit=False)
             form.by = request.user.first_name
             form.save()
+            forget_notice_feed()
             return redirect('teacher-dashboard')
         else:
             print('form invalid')
@@ -652,12 +903,13 @@ def teacher_notice_view(request):
 def student_dashboard_view(request):
     # studentdata = models.StudentExtra.objects.all().filter(status=True, user_id=request.user.id)
     student = db.get_student(request.user.username)
-    notice = models.Notice.objects.all()
+    feed = notice_feed(request.GET.get('notices'))
     mydict = {
         'roll': student.roll,
         'mobile': student.contact,
         'fee': student.fee,
-        'notice': notice
+        'notice': feed['notices'],
+        'notice_next': feed['next'],
     }
     return render(request, 'school/student_dashboard.html', context=mydict)
 
@@ -666,18 +918,30 @@ def student_dashboard_view(request):
 @user_passes_test(is_student)
 def student_attendance_view(request):
     form = forms.AskDateForm()
+    # Summary of a date range (?start=...&end=..., the current month by default), from the monthly rollup
+    first, last = models.month_range(datetime.date.today())
+    summary_form = forms.AttendanceRangeForm(request.GET or {'start': first, 'end': last})
+    summary = None
+    student = models.StudentExtra.objects.filter(user_id=request.user.id, status=True).first()
+    if student and summary_form.is_valid():
+        present, absent = models.StudentMonthlyAttendance.summary(student.cl_id, student.roll,
+                                                                  summary_form.cleaned_data['start'],
+                                                                  summary_form.cleaned_data['end'])
+        summary = {'present': present, 'absent': absent,
+                   'percentage': round(100 * present / (present + absent), 1) if present + absent else None}
     if request.method == 'POST':
         form = forms.AskDateForm(request.POST)
         if form.is_valid():
             date = form.cleaned_data['date']
             studentdata = models.StudentExtra.objects.all().filter(user_id=request.user.id, status=True)
-            attendancedata = models.Attendance.objects.all().filter(date=date, cl=studentdata[0].cl,
+            attendancedata = models.Attendance.objects.all().filter(date=date, cl=studentdata[0].cl_id,
                                                                     roll=studentdata[0].roll)
             mylist = zip(attendancedata, studentdata)
             return render(request, 'school/student_view_attendance_page.html', {'mylist': mylist, 'date': date})
         else:
             print('form invalid')
-    return render(request, 'school/student_view_attendance_ask_date.html', {'form': form})
+    return render(request, 'school/student_view_attendance_ask_date.html',
+                  {'form': form, 'summary_form': summary_form, 'summary': summary})
 
 
 # for about us and contact us
@@ -26,6 +26,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'school.middleware.DatabaseRefreshMiddleware',
 ]
 
 ROOT_URLCONF = 'schoolmanagement.urls'
@@ -79,6 +80,23 @@ STATICFILES_DIRS = [
 ]
 
 LOGIN_REDIRECT_URL = '/afterlogin'
+LIST_PAGE_SIZE = 50  # rows per page of the admin student / teacher lists
+# the role and notice caches are dropped by the views that change them, which must reach every worker process
+# (the school database is shared by them, see school/views.py): the cache is a directory of files they all use
+# (memcached or redis would do too, a per-process LocMemCache would not)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},  # a role per user
+    }
+}
+# seconds a user's role and approval stay cached (the approve / delete views drop them at once)
+ROLE_CACHE_TIMEOUT = 3600
+NOTICE_FEED_SIZE = 10  # notices per page of the dashboards' notice board
+NOTICE_FEED_TIMEOUT = 300  # seconds a page of the notice feed stays cached (posting a notice drops them in all workers)
+# a take-attendance form posts two fields per student (the default of 1000 stops at a class of ~500)
+DATA_UPLOAD_MAX_NUMBER_FIELDS = 10000
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_USE_TLS = True
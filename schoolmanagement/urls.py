@@ -49,16 +49,24 @@ urlpatterns = [
     path('admin-attendance', views.admin_attendance_view, name='admin-attendance'),
     path('admin-take-attendance/<str:cl>', views.admin_take_attendance_view, name='admin-take-attendance'),
     path('admin-view-attendance/<str:cl>', views.admin_view_attendance_view, name='admin-view-attendance'),
+    path('admin-attendance-report/<str:cl>', views.admin_attendance_report_view, name='admin-attendance-report'),
 
     path('admin-fee', views.admin_fee_view, name='admin-fee'),
     path('admin-view-fee/<str:cl>', views.admin_view_fee_view, name='admin-view-fee'),
 
+    path('admin-export-students', views.admin_export_students_view, name='admin-export-students'),
+    path('admin-export-teachers', views.admin_export_teachers_view, name='admin-export-teachers'),
+    path('admin-export-fees', views.admin_export_fees_view, name='admin-export-fees'),
+    path('admin-export-salaries', views.admin_export_salaries_view, name='admin-export-salaries'),
+
     path('admin-notice', views.admin_notice_view, name='admin-notice'),
 
     path('teacher-dashboard', views.teacher_dashboard_view, name='teacher-dashboard'),
     path('teacher-attendance', views.teacher_attendance_view, name='teacher-attendance'),
     path('teacher-take-attendance/<str:cl>', views.teacher_take_attendance_view, name='teacher-take-attendance'),
     path('teacher-view-attendance/<str:cl>', views.teacher_view_attendance_view, name='teacher-view-attendance'),
+    path('teacher-attendance-report/<str:cl>', views.teacher_attendance_report_view,
+         name='teacher-attendance-report'),
     path('teacher-notice', views.teacher_notice_view, name='teacher-notice'),
 
     path('student-dashboard', views.student_dashboard_view, name='student-dashboard'),
@@ -0,0 +1,366 @@
+from collections.abc import MutableMapping
+import io
+import json
+import mmap
+import pickle
+import struct
+
+from storage.indexes import entry_value
+
+
+class ColumnarPickler(pickle.Pickler):
+    """Pickler for the objects stored in a columnar snapshot. Batches are written as references by name."""
+
+    def __init__(self, file, protocol=None):
+        from basic_classes import Batch  # basic_classes imports this module
+
+        super().__init__(file, protocol)
+        self.batch_class = Batch
+
+    def persistent_id(self, obj):
+        if isinstance(obj, self.batch_class):
+            return "batch", obj.name
+        return None
+
+
+class ColumnarUnpickler(pickle.Unpickler):
+    def __init__(self, file, batches):
+        super().__init__(file)
+        self.batches = batches
+
+    def persistent_load(self, pid):
+        kind, key = pid
+        if kind == "batch":
+            return self.batches[key]
+        raise pickle.UnpicklingError(f"Unknown snapshot reference {pid!r}")
+
+
+def pickle_object(obj) -> bytes:
+    buffer = io.BytesIO()
+    ColumnarPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(obj)
+    return buffer.getvalue()
+
+
+class ColumnarSnapshot:
+    """
+    Read-only, memory-mapped columnar snapshot of a Database.
+
+    Layout: magic | uint32 directory length | JSON directory | fixed-width columns | string heap.
+    Scalar fields (roll, fee, salary, contact, status, batch) are fixed-width columns, names live in the string
+    heap, and every student / teacher is also stored as a small pickle that is only read when the object is
+    requested. Usernames are kept in a sorted index, so a lookup is a binary search over the mapped file.
+    """
+
+    MAGIC = b"DSACOL01"
+
+    STUDENT_COLUMNS = {"username": "str", "first_name": "str", "last_name": "str", "roll": "scalar",
+                       "fee": "scalar", "contact": "scalar", "status": "bool", "batch": "uint", "object": "blob"}
+    TEACHER_COLUMNS = {"username": "str", "first_name": "str", "last_name": "str", "contact": "scalar",
+                       "salary": "scalar", "status": "bool", "object": "blob"}
+
+    # Column type: struct format of one cell
+    _FORMATS = {"str": struct.Struct("<II"), "blob": struct.Struct("<II"), "scalar": struct.Struct("<bq"),
+                "bool": struct.Struct("<?"), "uint": struct.Struct("<I")}
+
+    # Kinds of a "scalar" cell: the value is stored inline (int) or as a heap reference (offset << 32 | length)
+    _NONE, _INT, _STR, _PICKLE = range(4)
+
+    def __init__(self, path: str):
+        """
+        Map a columnar snapshot file.
+        :param path: Path of the snapshot
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(self.MAGIC)] != self.MAGIC:
+            raise ValueError(f"{path} is not a columnar snapshot.")
+        (length,) = struct.unpack_from("<I", self._map, len(self.MAGIC))
+        start = len(self.MAGIC) + 4
+        directory = json.loads(self._map[start:start + length])
+        self._base = start + length  # Offsets in the directory are relative to the data section
+        self.meta = directory["meta"]
+        self._tables = directory["tables"]  # Dict[kind: Dict[count, columns: Dict[name: offset], index: offset]]
+        self._batches = directory["batches"]  # List[Dict[name, object: [offset, length], members: [offset, count]]]
+        self._heap = self._base + directory["heap"]
+        self._batch_names = [batch["name"] for batch in self._batches]
+
+    @staticmethod
+    def is_columnar(path: str) -> bool:
+        try:
+            with open(path, "rb") as f:
+                return f.read(len(ColumnarSnapshot.MAGIC)) == ColumnarSnapshot.MAGIC
+        except FileNotFoundError:
+            return False
+
+    def count(self, kind: str) -> int:
+        return self._tables[kind]["count"]
+
+    def __columns(self, kind):
+        return self.STUDENT_COLUMNS if kind == "students" else self.TEACHER_COLUMNS
+
+    def __heap(self, offset, length) -> bytes:
+        start = self._heap + offset
+        return self._map[start:start + length]
+
+    def value(self, kind: str, row: int, column: str):
+        """
+        Read one cell without touching the rest of the row.
+        :param kind: "students" or "teachers"
+        :param row: Row number
+        :param column: Column name
+        :return: Decoded value (for "batch" the batch name, for "object" the raw pickle)
+        """
+        column_type = self.__columns(kind)[column]
+        cell = self._FORMATS[column_type]
+        values = cell.unpack_from(self._map, self._base + self._tables[kind]["columns"][column] + row * cell.size)
+        if column_type == "str":
+            return self.__heap(*values).decode()
+        if column_type == "blob":
+            return self.__heap(*values)
+        if column_type == "uint":
+            return self._batch_names[values[0]]
+        if column_type == "bool":
+            return values[0]
+        value_kind, value = values
+        if value_kind == self._INT:
+            return value
+        if value_kind == self._NONE:
+            return None
+        data = self.__heap(value >> 32, value & 0xFFFFFFFF)
+        return data.decode() if value_kind == self._STR else pickle.loads(data)
+
+    def keys(self, kind: str):
+        for row in range(self.count(kind)):
+            yield row, self.value(kind, row, "username")
+
+    def find(self, kind: str, username: str) -> int | None:
+        """
+        Binary search of the sorted username index.
+        :return: Row number of the username or None
+        """
+        index = self._base + self._tables[kind]["index"]
+        low, high = 0, self.count(kind)
+        while low < high:
+            middle = (low + high) // 2
+            (row,) = struct.unpack_from("<I", self._map, index + middle * 4)
+            current = self.value(kind, row, "username")
+            if current == username:
+                return row
+            if current < username:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def load_object(self, kind: str, row: int, batches: dict):
+        """
+        Unpickle the Student / Teacher stored in a row.
+        :param batches: Dict[batch_name: Batch] used to resolve the student's batch
+        """
+        return ColumnarUnpickler(io.BytesIO(self.value(kind, row, "object")), batches).load()
+
+    def raw_row(self, kind: str, row: int) -> dict:
+        return {column: self.value(kind, row, column) for column in self.__columns(kind)}
+
+    def batches(self):
+        """
+        Yield the stored batches (without students) and the row numbers of their students, in batch order.
+        """
+        for batch in self._batches:
+            offset, count = batch["members"]
+            members = struct.unpack_from(f"<{count}I", self._map, self._base + offset) if count else ()
+            yield pickle.loads(self.__heap(*batch["object"])), list(members)
+
+    @staticmethod
+    def write(path: str, students, teachers, batches, meta=None):
+        """
+        Write a columnar snapshot.
+        :param path: Path of the snapshot
+        :param students: Iterable of Dict[column: value] with the STUDENT_COLUMNS keys ("batch" is the batch name,
+                         "object" the pickled Student)
+        :param teachers: Iterable of Dict[column: value] with the TEACHER_COLUMNS keys
+        :param batches: Iterable of (Batch pickled without students, List[student username])
+        :param meta: JSON serializable metadata
+        :return:
+        """
+        heap = bytearray()
+
+        def heap_ref(data: bytes):
+            heap.extend(data)
+            return len(heap) - len(data), len(data)
+
+        batches = list(batches)
+        batch_names = [pickle.loads(data).name for data, _ in batches]
+        batch_ids = {name: batch_id for batch_id, name in enumerate(batch_names)}
+
+        def encode(column_type, value):
+            if column_type in ("str", "blob"):
+                return heap_ref(value.encode() if column_type == "str" else value)
+            if column_type == "uint":
+                return (batch_ids[value],)
+            if column_type == "bool":
+                return (bool(value),)
+            if value is None:
+                return ColumnarSnapshot._NONE, 0
+            if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+                return ColumnarSnapshot._INT, value
+            if isinstance(value, str):
+                offset, length = heap_ref(value.encode())
+                return ColumnarSnapshot._STR, offset << 32 | length
+            offset, length = heap_ref(pickle.dumps(value))
+            return ColumnarSnapshot._PICKLE, offset << 32 | length
+
+        tables = {}
+        for kind, rows, columns in (("students", students, ColumnarSnapshot.STUDENT_COLUMNS),
+                                    ("teachers", teachers, ColumnarSnapshot.TEACHER_COLUMNS)):
+            data = {column: bytearray() for column in columns}
+            usernames = []
+            for row in rows:
+                usernames.append(row["username"])
+                for column, column_type in columns.items():
+                    data[column].extend(ColumnarSnapshot._FORMATS[column_type].pack(*encode(column_type, row[column])))
+            order = sorted(range(len(usernames)), key=usernames.__getitem__)
+            tables[kind] = {"data": data, "index": struct.pack(f"<{len(order)}I", *order),
+                            "rows": {username: row for row, username in enumerate(usernames)}}
+
+        members = []
+        for data, usernames in batches:
+            rows = [tables["students"]["rows"][username] for username in usernames
+                    if username in tables["students"]["rows"]]
+            members.append((heap_ref(data), struct.pack(f"<{len(rows)}I", *rows), len(rows)))
+
+        # Offsets in the directory are relative to the start of the data section (right after the directory)
+        position = 0
+        directory = {"meta": meta or {}, "tables": {}, "batches": []}
+        for kind, table in tables.items():
+            columns = {}
+            for column, data in table["data"].items():
+                columns[column] = position
+                position += len(data)
+            directory["tables"][kind] = {"count": len(table["rows"]), "columns": columns, "index": position}
+            position += len(table["index"])
+        for (batch_ref, rows, count), name in zip(members, batch_names):
+            directory["batches"].append({"name": name, "object": list(batch_ref), "members": [position, count]})
+            position += len(rows)
+        directory["heap"] = position
+        encoded = json.dumps(directory).encode()
+
+        with open(path, "wb") as f:
+            f.write(ColumnarSnapshot.MAGIC)
+            f.write(struct.pack("<I", len(encoded)))
+            f.write(encoded)
+            for table in tables.values():
+                for data in table["data"].values():
+                    f.write(data)
+                f.write(table["index"])
+            for _, rows, _ in members:
+                f.write(rows)
+            f.write(heap)
+
+
+class LazyTable(MutableMapping):
+    """
+    Students / teachers table backed by a ColumnarSnapshot. An entry is only unpickled the first time it is
+    accessed; scans of scalar fields (status, fee, salary, ...) read the columns of rows that were never loaded.
+    """
+
+    def __init__(self, snapshot: ColumnarSnapshot, kind: str, materialize):
+        """
+        :param snapshot: Snapshot holding the rows
+        :param kind: "students" or "teachers"
+        :param materialize: Callable(row) -> table entry
+        """
+        self.snapshot = snapshot
+        self.kind = kind
+        self._materialize = materialize
+        self._loaded = {}  # Dict[username: entry], entries read from the snapshot or added after loading
+        self._hidden = set()  # Usernames whose snapshot row must not be used anymore (loaded or removed)
+        self._added = {}  # Usernames that are not in the snapshot, in insertion order
+        self._length = snapshot.count(kind)
+
+    def __getitem__(self, key):
+        if key in self._loaded:
+            return self._loaded[key]
+        if key in self._hidden:
+            raise KeyError(key)
+        row = self.snapshot.find(self.kind, key)
+        if row is None:
+            raise KeyError(key)
+        entry = self._loaded[key] = self._materialize(row)
+        self._hidden.add(key)
+        return entry
+
+    def __setitem__(self, key, entry):
+        if key not in self:
+            self._length += 1
+        if key not in self._hidden and self.snapshot.find(self.kind, key) is None:
+            self._added[key] = None
+        self._loaded[key] = entry
+        self._hidden.add(key)
+
+    def __delitem__(self, key):
+        self[key]  # Raises KeyError for unknown usernames
+        del self._loaded[key]
+        self._added.pop(key, None)
+        self._length -= 1
+
+    def __contains__(self, key):
+        if key in self._loaded:
+            return True
+        if key in self._hidden:
+            return False
+        return self.snapshot.find(self.kind, key) is not None
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        for key, _, _ in self.rows():
+            yield key
+
+    def rows(self):
+        """
+        Yield (username, entry, None) for loaded entries and (username, None, row) for rows still in the snapshot.
+        """
+        for row, key in self.snapshot.keys(self.kind):
+            if key in self._loaded:
+                yield key, self._loaded[key], None
+            elif key not in self._hidden:
+                yield key, None, row
+        for key in list(self._added):
+            yield key, self._loaded[key], None
+
+    def scan(self, name: str, *fields):
+        """
+        Yield (username, *values) of the given fields without loading rows from the snapshot.
+        :param name: Key of the object in an entry ("student" or "teacher")
+        :param fields: "status" or attribute names that are also snapshot columns
+        """
+        for key, entry, row in self.rows():
+            if entry is None:
+                yield (key, *[self.snapshot.value(self.kind, row, field) for field in fields])
+            else:
+                yield (key, *[entry_value(entry, name, field) for field in fields])
+
+
+def table_rows(table, kind: str):
+    """
+    Rows of a students / teachers table for ColumnarSnapshot.write. Rows of a LazyTable that were never loaded are
+    copied from its snapshot without being unpickled.
+    :param table: Dict[username: entry] or LazyTable
+    :param kind: "students" or "teachers"
+    """
+    name = "student" if kind == "students" else "teacher"
+    columns = ColumnarSnapshot.STUDENT_COLUMNS if kind == "students" else ColumnarSnapshot.TEACHER_COLUMNS
+    rows = table.rows() if isinstance(table, LazyTable) else ((key, entry, None) for key, entry in table.items())
+    for key, entry, row in rows:
+        if entry is None:
+            yield table.snapshot.raw_row(kind, row)
+            continue
+        obj = entry[name]
+        record = {column: getattr(obj, column, None) for column in columns}
+        record.update(status=entry["status"], object=pickle_object(obj))
+        if kind == "students":
+            record["batch"] = obj.batch.name
+        yield record
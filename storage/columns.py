@@ -0,0 +1,95 @@
+try:
+    import numpy as np
+except ImportError:  # Optional, Database(columns=True) needs it
+    np = None
+
+
+class Columns:
+    """
+    NumPy columns of a table, one row per entry. Rows are addressed by a dense integer id (ids maps the key to it);
+    the rows of removed entries are marked dead and reused.
+    """
+
+    def __init__(self, dtypes: dict, capacity=1024):
+        """
+        :param dtypes: Dict[column: NumPy dtype]
+        :param capacity: Initial number of rows (doubled when full)
+        """
+        self.ids = {}  # Dict[key: row]
+        self.free = []  # Rows of removed entries
+        self.size = 0  # Rows used so far (live or dead)
+        self.arrays = {name: np.zeros(capacity, dtype) for name, dtype in dtypes.items()}
+        self.arrays["alive"] = np.zeros(capacity, bool)
+
+    def set(self, key, **values):
+        row = self.ids.get(key)
+        if row is None:
+            row = self.free.pop() if self.free else self.__new_row()
+            self.ids[key] = row
+        for name, value in values.items():
+            self.arrays[name][row] = value
+        self.arrays["alive"][row] = True
+
+    def remove(self, key):
+        row = self.ids.pop(key)
+        self.arrays["alive"][row] = False
+        self.free.append(row)
+
+    def __new_row(self) -> int:
+        if self.size == len(self.arrays["alive"]):
+            for name, column in self.arrays.items():
+                grown = np.zeros(2 * len(column), column.dtype)
+                grown[:self.size] = column
+                self.arrays[name] = grown
+        self.size += 1
+        return self.size - 1
+
+    def column(self, name: str):
+        return self.arrays[name][:self.size]
+
+    def mask(self, status=None):
+        # Live rows, optionally only those with the given status
+        alive = self.column("alive")
+        if status is None:
+            return alive
+        return alive & (self.column("status") == bool(status))
+
+    def sum(self, name: str, status=None) -> int:
+        return int(self.column(name)[self.mask(status)].sum())
+
+    def count(self, status=None) -> int:
+        return int(np.count_nonzero(self.mask(status)))
+
+
+class ColumnStore:
+    """
+    Columnar copy of the students (fee, roll, status, batch id) and teachers (salary, status) tables kept by
+    Database(columns=True), for vectorized aggregates and group-by-batch breakdowns.
+    """
+
+    def __init__(self):
+        self.students = Columns({"fee": np.int64, "roll": object, "status": bool, "batch": np.int32})
+        self.teachers = Columns({"salary": np.int64, "status": bool})
+        self.batch_ids = {}  # Dict[batch_name: batch id]
+
+    def batch_id(self, batch_name: str) -> int:
+        return self.batch_ids.setdefault(batch_name, len(self.batch_ids))
+
+    def set_student(self, username: str, fee, roll, status, batch_name: str):
+        self.students.set(username, fee=fee, roll=roll, status=bool(status), batch=self.batch_id(batch_name))
+
+    def set_teacher(self, username: str, salary, status):
+        self.teachers.set(username, salary=salary, status=bool(status))
+
+    def by_batch(self, weights: str = None, status=None) -> dict:
+        """
+        Count the live students (or sum one of their columns) per batch.
+        :param weights: (Optional) Column to sum ("fee"), the rows are counted if not given
+        :param status: (Optional) Only the students with this status
+        :return: Dict[batch_name: count / sum]
+        """
+        mask = self.students.mask(status)
+        batches = self.students.column("batch")[mask]
+        values = self.students.column(weights)[mask] if weights else None
+        totals = np.bincount(batches, weights=values, minlength=len(self.batch_ids))
+        return {name: int(totals[batch_id]) for name, batch_id in self.batch_ids.items()}
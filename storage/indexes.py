@@ -0,0 +1,133 @@
+import base64
+import bisect
+import itertools
+import json
+
+
+def entry_value(entry: dict, name: str, field: str):
+    # Value of a field of a table entry: "status", "batch" (the batch name) or an attribute of the object
+    if field == "status":
+        return entry["status"]
+    if field == "batch":
+        return entry[name].batch.name
+    return getattr(entry[name], field)
+
+
+def sort_value(value):
+    # Key of a value in an ordered index: rolls are ints or strings, so numbers (and numeric strings) sort
+    # first by value, then the other strings, then None
+    if value is None:
+        return 2, 0, ""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return 0, value, ""
+    text = str(value)
+    if text.isdigit():
+        return 0, int(text), text
+    return 1, 0, text
+
+
+def encode_cursor(key: tuple) -> str:
+    # Opaque, URL safe page cursor for an ordered index key
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str, sort_value=True) -> tuple:
+    """
+    Decode a page cursor, checking that it has the shape of the keys it is compared with (cursors come from URLs).
+    :param cursor: Cursor (see encode_cursor)
+    :param sort_value: (Optional) The cursor holds a sort_value() key (Database), not a column value (SQLiteDatabase)
+    :return: (Sort value or column value, username)
+    """
+    try:
+        value, username = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor {cursor!r}.") from e
+    if sort_value:
+        valid = (isinstance(value, list) and len(value) == 3 and type(value[0]) is int and value[0] in (0, 1, 2)
+                 and type(value[1]) in (int, float) and type(value[2]) is str)
+        if valid:
+            value = tuple(value)
+    else:
+        valid = value is None or type(value) in (int, float, str)
+    if not valid or type(username) is not str:
+        raise ValueError(f"Invalid cursor {cursor!r}.")
+    return value, username
+
+
+class SortedKeys:
+    """
+    Immutable sorted sequence (the keys of an ordered index), stored in chunks: insert() and remove() return a new
+    sequence that shares every chunk but the changed one, so a published read view keeps its version without a
+    copy and a change costs O(sqrt n) instead of O(n).
+    """
+    __slots__ = ("_chunks", "_lasts", "_offsets")
+    CHUNK = 512
+
+    def __init__(self, keys=(), chunks=None):
+        """
+        :param keys: (Optional) Keys, sorted
+        :param chunks: (Optional) Sorted, non-empty lists of keys, in order (instead of keys)
+        """
+        if chunks is None:
+            keys = list(keys)
+            chunks = [keys[start:start + self.CHUNK] for start in range(0, len(keys), self.CHUNK)]
+        self._chunks = chunks
+        self._lasts = [chunk[-1] for chunk in chunks]
+        self._offsets = list(itertools.accumulate(map(len, chunks), initial=0))
+
+    def __len__(self):
+        return self._offsets[-1]
+
+    def bisect_left(self, key) -> int:
+        index = bisect.bisect_left(self._lasts, key)
+        if index == len(self._chunks):
+            return len(self)
+        return self._offsets[index] + bisect.bisect_left(self._chunks[index], key)
+
+    def bisect_right(self, key) -> int:
+        index = bisect.bisect_right(self._lasts, key)
+        if index == len(self._chunks):
+            return len(self)
+        return self._offsets[index] + bisect.bisect_right(self._chunks[index], key)
+
+    def insert(self, key) -> "SortedKeys":
+        if not self._chunks:
+            return SortedKeys(chunks=[[key]])
+        chunks = list(self._chunks)
+        index = min(bisect.bisect_left(self._lasts, key), len(chunks) - 1)
+        chunk = chunks[index] = list(chunks[index])
+        bisect.insort(chunk, key)
+        if len(chunk) > 2 * self.CHUNK:
+            chunks[index:index + 1] = [chunk[:self.CHUNK], chunk[self.CHUNK:]]
+        return SortedKeys(chunks=chunks)
+
+    def remove(self, key) -> "SortedKeys":
+        index = bisect.bisect_left(self._lasts, key)
+        if index == len(self._chunks):
+            return self
+        chunk = self._chunks[index]
+        position = bisect.bisect_left(chunk, key)
+        if chunk[position] != key:
+            return self
+        chunks = list(self._chunks)
+        chunk = chunk[:position] + chunk[position + 1:]
+        if chunk:
+            chunks[index] = chunk
+        else:
+            del chunks[index]
+        return SortedKeys(chunks=chunks)
+
+    def __getitem__(self, index: slice) -> list:
+        start, stop, _ = index.indices(len(self))
+        keys = []
+        chunk = bisect.bisect_right(self._offsets, start) - 1
+        while start < stop:
+            offset = self._offsets[chunk]
+            part = self._chunks[chunk][start - offset:stop - offset]
+            keys += part
+            start += len(part)
+            chunk += 1
+        return keys
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._chunks)
@@ -0,0 +1,96 @@
+import copyreg
+import io
+import os
+import pickle
+
+
+class JournalPickler(pickle.Pickler):
+    """
+    Pickler for journal records. Batches, students and teachers that are already stored in the database are
+    written as references (by name / username) so that a record stays small instead of dragging the whole
+    object graph (student -> batch -> every student of the batch) into the log.
+    """
+
+    def __init__(self, file, database, owned=None):
+        from basic_classes import Batch, Student, Teacher  # basic_classes imports this module
+
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.database = database
+        self.owned = owned  # Object the record is about, always written by value
+        self.classes = Batch, Student, Teacher
+
+    def persistent_id(self, obj):
+        if obj is self.owned:
+            return None
+        Batch, Student, Teacher = self.classes
+        if isinstance(obj, Batch) and self.database.get_batch(obj.name) is obj:
+            return "batch", obj.name
+        if isinstance(obj, Student) and self.database.get_student(obj.username) is obj:
+            return "student", obj.username
+        if isinstance(obj, Teacher) and self.database.get_teacher(obj.username) is obj:
+            return "teacher", obj.username
+        return None
+
+    def reducer_override(self, obj):
+        Student = self.classes[1]
+        if obj is self.owned and isinstance(obj, Student):
+            # The attendance of a student is kept by its batch (written by reference): write it with the student,
+            # as older versions did, so that a replayed add_student() gets it back
+            state = obj.__getstate__()
+            state["_Student__attendance"] = dict(obj.view_attendance()) or None
+            state["_Student__assignments"] = obj.legacy_assignments() or None
+            state["_Student__class_tests"] = obj.legacy_tests() or None
+            return copyreg.__newobj__, (Student,), state
+        return NotImplemented
+
+
+class JournalUnpickler(pickle.Unpickler):
+    """Resolves the references written by JournalPickler against the database being replayed."""
+
+    def __init__(self, file, database):
+        super().__init__(file)
+        self.database = database
+
+    def persistent_load(self, pid):
+        kind, key = pid
+        if kind == "batch":
+            return self.database.get_batch(key)
+        if kind == "student":
+            return self.database.get_student(key)
+        if kind == "teacher":
+            return self.database.get_teacher(key)
+        raise pickle.UnpicklingError(f"Unknown journal reference {pid!r}")
+
+
+def encode_record(database, owned, record: tuple) -> bytes:
+    """
+    Pickle a journal record (see Database._log).
+    :param database: Database the record refers to
+    :param owned: Object created by the change (written by value, everything else already stored is a reference)
+    :param record: (sequence number, operation, arguments)
+    """
+    buffer = io.BytesIO()
+    JournalPickler(buffer, database, owned).dump(record)
+    return buffer.getvalue()
+
+
+def append_records(path: str, records: list):
+    """Append encoded records to the log and wait until they are on disk."""
+    with open(path, "ab") as f:
+        f.write(b"".join(records))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_records(file, database):
+    """
+    Yield the (sequence number, operation, arguments) records of an open log. A record is only read once the
+    previous one was applied to the database, as its references are resolved against it.
+    A torn record at the end of the log (crash while appending) ends the log.
+    """
+    while True:
+        try:
+            # Every record is an independent pickle, so each one needs its own unpickler (memo)
+            yield JournalUnpickler(file, database).load()
+        except (EOFError, pickle.UnpicklingError):
+            return
@@ -0,0 +1,30 @@
+import functools
+import threading
+
+
+def synchronized(method):
+    """Run a Database method while holding the database lock (mutations never overlap a snapshot being written)."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            if self._writer is not None:  # Already changing the tables (this thread holds the lock)
+                return method(self, *args, **kwargs)
+            self._writer = threading.get_ident()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self._writer = None
+
+    return wrapper
+
+
+def transactional(method):
+    """Run a Database mutator as a transaction (see Database.transaction)."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._transaction():
+            return method(self, *args, **kwargs)
+
+    return wrapper
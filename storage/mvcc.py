@@ -0,0 +1,285 @@
+import threading
+import weakref
+
+
+class ReadView:
+    """
+    Immutable view of the Database tables (read-only mappings), as published at the end of a transaction.
+    """
+    __slots__ = ("students", "teachers", "batches", "totals", "indexes", "journal_seq", "ordered")
+
+    def __init__(self, students, teachers, batches, totals=None, indexes=None, journal_seq=0, ordered=None):
+        self.students = students  # Mapping[username: Dict[student: Student, status : str]]
+        self.teachers = teachers  # Mapping[username: Dict[teacher: Teacher, status : str]]
+        self.batches = batches  # Mapping[batch_name: Batch]
+        self.totals = totals or {"students": {}, "teachers": {}}  # See Database.__totals
+        self.indexes = indexes  # Dict[index_name: Mapping[key: Mapping[username: None]]], see Database.__indexes
+        self.journal_seq = journal_seq
+        self.ordered = ordered  # See Database.__ordered
+
+
+class Version:
+    """Version of the tables read by a view, kept alive by everything read from the view."""
+    __slots__ = ("number", "__weakref__")
+
+    def __init__(self, number: int):
+        self.number = number
+
+
+class Versions:
+    """Version counter of the read views of a Database (mvcc=True), shared by its versioned dicts."""
+
+    def __init__(self):
+        self.published = 0  # Number of the last published version
+        self.in_use = weakref.WeakSet()  # Version objects still referenced by readers
+
+    def publish(self) -> Version:
+        self.published += 1
+        version = Version(self.published)
+        self.in_use.add(version)
+        return version
+
+    def oldest(self) -> int:
+        # States older than the oldest version in use are never read again
+        return min((version.number for version in list(self.in_use)), default=self.published)
+
+
+REMOVED = object()  # Value of the history records of removed keys
+
+
+def version_record(chain, number: int):
+    # The last (version, value) record of a key's history that is visible at a version (None: all of them are newer)
+    for record in reversed(chain):
+        if record[0] <= number:
+            return record
+    return None
+
+
+class VersionedDict(dict):
+    """
+    Dict changed in place by the writer (mvcc=True) whose published versions stay readable: every change is also
+    logged with the version it will be published in, and at(version) reads the dict as it was then.
+    The versions share a copy of the dict as of the oldest version in use (the base) and the log of the changes
+    since, so publishing a change costs O(1) instead of a copy of the dict. The base is retaken once the log
+    outgrows a quarter of the dict, which keeps both the log and the cost of a change (amortized) bounded.
+    """
+    __slots__ = ("_versions", "_state", "_compact_at", "_last")
+    MIN_SIZE = 64  # Smaller dicts (index buckets) are copied on write instead
+
+    def __init__(self, versions: Versions, items=()):
+        super().__init__(items)
+        self._versions = versions
+        # (base, log: List[(version, key, value)] of the changes since the base, in order,
+        #  history: Dict[key: List[(version, value)]], the same changes by key)
+        self._state = (dict(self), [], {})
+        self._compact_at = max(self.MIN_SIZE, len(self) // 4)
+        self._last = None  # (state, version number, log position, contents) of the last contents() call
+
+    def at(self, version: Version) -> "DictVersion":
+        return DictVersion(self, version)
+
+    def contents(self, number: int) -> tuple:
+        """
+        Contents of the dict as of a version: the log replayed on a copy of the base, or of the last contents
+        read (readers of the latest versions only replay the changes since the previous one).
+        :param number: Version number
+        :return: (Dict in the order of the dict at that version, position of the first later change in the log)
+        """
+        state = self._state
+        base, log, _ = state
+        last = self._last
+        if last is not None and last[0] is state and last[1] <= number:
+            items, position = last[3].copy(), last[2]
+        else:
+            items, position = base.copy(), 0
+        while position < len(log) and log[position][0] <= number:
+            _, key, value = log[position]
+            if value is REMOVED:
+                items.pop(key, None)
+            else:
+                items[key] = value
+            position += 1
+        self._last = (state, number, position, items)
+        return items, position
+
+    def __record(self, key, value):
+        version = self._versions.published + 1
+        _, log, history = self._state
+        log.append((version, key, value))
+        history.setdefault(key, []).append((version, value))
+        if len(log) > self._compact_at:
+            self.__compact()
+
+    def __compact(self):
+        # Retake the base as of the oldest version in use, keeping the log of the later changes only.
+        # Readers holding the previous state keep reading it, so it is replaced, never changed.
+        base, position = self.contents(self._versions.oldest())
+        log = self._state[1][position:]
+        history = {}
+        for version, key, value in log:
+            history.setdefault(key, []).append((version, value))
+        self._state = (base, log, history)
+        self._compact_at = len(log) + max(self.MIN_SIZE, len(self) // 4)
+
+    def __setitem__(self, key, value):
+        self.__record(key, value)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.__record(key, REMOVED)
+        super().__delitem__(key)
+
+    def pop(self, key, *default):
+        if key in self:
+            self.__record(key, REMOVED)
+        return super().pop(key, *default)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def popitem(self):
+        key = next(reversed(self))
+        return key, self.pop(key)
+
+    def clear(self):
+        for key in list(self):
+            del self[key]
+
+    def __reduce_ex__(self, protocol):
+        return dict, (dict(self),)  # Snapshots store plain dicts
+
+
+class DictVersion(dict):
+    """
+    Read-only state of a VersionedDict as of a version. It is filled (materialized) the first time it is
+    iterated or read more than a few times, then read as a plain dict by all its readers; before that, lookups
+    read the history of the versioned dict. Values that are versioned dicts (index buckets) are read as of the
+    same version.
+    """
+    __slots__ = ("_dict", "_version", "_length", "_nested", "_filled", "_fill_lock", "_lookups")
+
+    def __init__(self, versioned: VersionedDict, version: Version, length: int = None, nested=False):
+        """
+        :param versioned: Versioned dict
+        :param version: Version to read
+        :param length: (Optional) Length of the dict at that version
+        :param nested: (Optional) Values may be versioned dicts (an index, whose buckets are)
+        """
+        super().__init__()
+        self._dict = versioned
+        self._version = version
+        self._length = length
+        self._nested = nested
+        self._filled = False
+        self._fill_lock = threading.Lock()  # Readers that need the dict filled at the same time fill it once
+        self._lookups = 0
+
+    def __fill(self):
+        if self._filled:
+            return
+        with self._fill_lock:
+            if not self._filled:
+                items = self._dict.contents(self._version.number)[0]
+                if self._nested:
+                    items = {key: self.__value(value) for key, value in items.items()}
+                dict.update(self, items)
+                self._filled = True
+
+    def __value(self, value):
+        return value.at(self._version) if isinstance(value, VersionedDict) else value
+
+    def __lookup(self, key):
+        # Read a key before the dict is filled, raises KeyError if it is missing
+        self._lookups += 1
+        if self._nested or self._lookups > VersionedDict.MIN_SIZE:  # An index is filled first: its buckets too
+            self.__fill()
+            return dict.__getitem__(self, key)
+        base, _, history = self._dict._state
+        chain = history.get(key)
+        record = version_record(chain, self._version.number) if chain else None
+        if record is None:
+            return self.__value(base[key])
+        if record[1] is REMOVED:
+            raise KeyError(key)
+        return self.__value(record[1])
+
+    def __missing__(self, key):
+        if self._filled:
+            raise KeyError(key)
+        return self.__lookup(key)
+
+    def get(self, key, default=None):
+        if self._filled:
+            return dict.get(self, key, default)
+        try:
+            return self.__lookup(key)
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        if self._filled:
+            return dict.__contains__(self, key)
+        try:
+            self.__lookup(key)
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self):
+        if self._length is None:
+            self.__fill()
+            self._length = dict.__len__(self)
+        return self._length
+
+    def __iter__(self):
+        self.__fill()
+        return dict.__iter__(self)
+
+    def keys(self):
+        self.__fill()
+        return dict.keys(self)
+
+    def items(self):
+        self.__fill()
+        return dict.items(self)
+
+    def values(self):
+        self.__fill()
+        return dict.values(self)
+
+    def __reversed__(self):
+        self.__fill()
+        return dict.__reversed__(self)
+
+    def copy(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        self.__fill()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        self.__fill()
+        return dict.__ne__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        self.__fill()
+        return f"{type(self).__name__}({dict.__repr__(self)})"
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("A published view is read-only.")
+
+    __setitem__ = __delitem__ = pop = popitem = clear = update = setdefault = __ior__ = _read_only
+
+    def __reduce_ex__(self, protocol):
+        return dict, (dict(self.items()),)
@@ -0,0 +1,99 @@
+import atexit
+import threading
+import time
+
+
+class BackgroundSaver(threading.Thread):
+    """
+    Persistence thread doing group commits: save requests that arrive within `window` seconds of each other are
+    written with a single flush. Every request gets a ticket, callers can wait until their ticket is durable.
+    """
+
+    def __init__(self, flush, window: float):
+        """
+        :param flush: Callable writing the current state of the database
+        :param window: Seconds to wait for more requests before flushing
+        """
+        super().__init__(name="database-saver", daemon=True)
+        self.flush = flush
+        self.window = window
+        self._condition = threading.Condition()
+        self._requested = 0  # Last ticket handed out
+        self._durable = 0  # Last ticket written (or failed)
+        self._first_request = None  # Time of the oldest request that is not written yet
+        self._waiters = {}  # Dict[ticket: exception of its flush or None], tickets that will be waited for
+        self._stopping = False
+        self.metrics = {"requests": 0, "flushes": 0, "max_batch_size": 0, "total_flush_time": 0.0,
+                        "max_flush_time": 0.0, "total_commit_latency": 0.0, "max_commit_latency": 0.0}
+        atexit.register(self.stop)
+
+    def request(self, wait=False) -> int:
+        """
+        :param wait: (Optional) The ticket will be waited for: the outcome of its flush is kept until wait()
+        :return: Ticket of the request
+        """
+        with self._condition:
+            self._requested += 1
+            if self._first_request is None:
+                self._first_request = time.perf_counter()
+            if wait:
+                self._waiters[self._requested] = None
+            self._condition.notify_all()
+            return self._requested
+
+    def wait(self, ticket: int):
+        """
+        Block until the flush containing the ticket is done (the ticket must be requested with wait=True).
+        Raises the exception of the flush if it failed.
+        """
+        with self._condition:
+            while self._durable < ticket:
+                self._condition.wait()
+            failure = self._waiters.pop(ticket, None)
+        if failure is not None:
+            raise failure
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self._requested == self._durable and not self._stopping:
+                    self._condition.wait()
+                if self._requested == self._durable:
+                    return
+                stopping = self._stopping
+            if not stopping:
+                time.sleep(self.window)  # Let concurrent requests join this flush
+            with self._condition:
+                first, last = self._durable + 1, self._requested
+                first_request, self._first_request = self._first_request, None
+            start = time.perf_counter()
+            try:
+                self.flush()
+                failure = None
+            except Exception as exception:
+                failure = exception
+            end = time.perf_counter()
+            with self._condition:
+                self._durable = last
+                if failure is not None:
+                    for ticket in self._waiters:
+                        if first <= ticket <= last:
+                            self._waiters[ticket] = failure
+                metrics = self.metrics
+                metrics["requests"] += last - first + 1
+                metrics["flushes"] += 1
+                metrics["max_batch_size"] = max(metrics["max_batch_size"], last - first + 1)
+                metrics["total_flush_time"] += end - start
+                metrics["max_flush_time"] = max(metrics["max_flush_time"], end - start)
+                metrics["total_commit_latency"] += end - first_request
+                metrics["max_commit_latency"] = max(metrics["max_commit_latency"], end - first_request)
+                self._condition.notify_all()
+
+    def stop(self):
+        """Write the outstanding requests and stop the thread."""
+        atexit.unregister(self.stop)
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self.is_alive():
+            self.join()
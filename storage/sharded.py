@@ -0,0 +1,95 @@
+from collections.abc import MutableMapping
+import os
+import pickle
+import urllib.parse
+
+
+class ShardedTable(MutableMapping):
+    """
+    Students table of a sharded snapshot. The index (username -> batch name) is always in memory, the entries are
+    read from the batch segment the first time a student of that batch is accessed.
+    """
+
+    def __init__(self, index: dict, load_segment):
+        """
+        :param index: Dict[username: batch_name] read from the index segment
+        :param load_segment: Callable(batch_name) loading a batch segment (it calls loaded() with the entries)
+        """
+        self.index = index
+        self._entries = {}
+        self._load_segment = load_segment
+
+    def loaded(self, entries: dict):
+        self._entries.update(entries)
+
+    def __getitem__(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self._load_segment(self.index[key])
+            entry = self._entries[key]
+        return entry
+
+    def __setitem__(self, key, entry):
+        self.index[key] = entry["student"].batch.name
+        self._entries[key] = entry
+
+    def __delitem__(self, key):
+        del self.index[key]
+        self._entries.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __iter__(self):
+        return iter(list(self.index))
+
+    def __len__(self):
+        return len(self.index)
+
+
+def segment_file(path: str, batch_name: str) -> str:
+    return f"{path}.batch-{urllib.parse.quote(batch_name, safe='')}"
+
+
+def read_file(path: str):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def write_file(path: str, data):
+    with open(path + '.tmp', "wb") as f:
+        pickle.dump(data, f)
+    os.replace(path + '.tmp', path)
+
+
+def write_segments(path: str, batch_names, get_batch, students, teachers: dict, totals: dict, journal_seq: int,
+                   dirty=None):
+    """
+    Write the segments of a sharded snapshot. The index is written last, as it refers to the batch segments.
+    :param path: Path of the index segment (the other segments are named after it)
+    :param batch_names: Names of the batches, in order
+    :param get_batch: Callable(batch_name) returning the batch with its students
+    :param students: Students table (Dict[username: entry] or ShardedTable)
+    :param teachers: Teachers table
+    :param totals: Counts and sums per status
+    :param journal_seq: Sequence number of the last journaled change
+    :param dirty: (Optional) Segments changed since the last save: ("batch", name), "teachers", "totals" and
+                  "index" (None: write all of them)
+    """
+    batch_names = list(batch_names)
+    for name in batch_names:
+        if dirty is None or ("batch", name) in dirty:
+            batch = get_batch(name)
+            entries = {student.username: students[student.username] for student in batch.students
+                       if student.username in students}
+            write_file(segment_file(path, name), (batch, entries))
+    if dirty is None or "teachers" in dirty:
+        write_file(path + '.teachers', dict(teachers))
+    if dirty is None or "totals" in dirty:
+        write_file(path + '.totals', totals)
+    if dirty is None or "index" in dirty or not os.path.exists(path):
+        if isinstance(students, ShardedTable):
+            index = dict(students.index)
+        else:
+            index = {username: entry["student"].batch.name for username, entry in students.items()}
+        write_file(path, {"format": "sharded", "students": index, "batches": batch_names, "journal_seq": journal_seq})
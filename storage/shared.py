@@ -0,0 +1,56 @@
+import contextlib
+import os
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, shared=True needs it
+    fcntl = None
+
+
+class FileLock:
+    """
+    Lock file shared by the processes using a database (shared=True): exclusive for writers, shared for readers.
+    The descriptor is opened by each process (a forked child must not use its parent's).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None  # Descriptor of the lock file
+        self._pid = None  # Process that opened _file
+        self.held = False
+
+    @contextlib.contextmanager
+    def hold(self, exclusive=True):
+        # No-op if this process already holds it (the caller serializes its threads)
+        if self.held:
+            yield
+            return
+        if self._pid != os.getpid():
+            self._file = os.open(self.path, os.O_RDWR | os.O_CREAT)
+            self._pid = os.getpid()
+        fcntl.flock(self._file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        self.held = True
+        try:
+            yield
+        finally:
+            self.held = False
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def close(self):
+        if self._file is not None and self._pid == os.getpid():
+            os.close(self._file)
+        self._file = self._pid = None
+
+
+def read_version(path: str) -> int:
+    try:
+        with open(path) as f:
+            return int(f.read() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_version(path: str, version: int):
+    with open(path + '.tmp', "w") as f:
+        f.write(str(version))
+    os.replace(path + '.tmp', path)
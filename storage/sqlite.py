@@ -0,0 +1,728 @@
+from datetime import date
+import contextlib
+import copy
+import os
+import pickle
+import sqlite3
+import threading
+import weakref
+
+from basic_classes import (AssignmentStore, AttendanceStore, Batch, ClassTest, Database, MarkStore, Roster, Student,
+                           Subject, Teacher, _chunks, _import_error, _import_rows, _import_students, _open_import)
+from storage.indexes import decode_cursor, encode_cursor
+from storage.locking import synchronized, transactional
+
+
+class SQLiteDatabase(Database):
+    """
+    Database backend that stores teachers, students, batches, attendance, tests and assignments in an indexed
+    SQLite file. Every add/update/remove is a row-level statement and aggregates run as SQL, so nothing is kept in
+    memory except the objects that are currently in use (they are tracked in an identity map, so asking twice for
+    the same student returns the same object, and objects asked for by name are kept until the next save()).
+    Like the pickle backend, changes only become durable on save(), which also writes back the loaded objects that
+    were changed directly (attendance, marks, assignments, ...): it compares them with the rows they were read
+    from and only rewrites what differs. Objects returned by the list queries (get_all_*, find_students, page) are
+    only written back if they are still in use at save().
+    Every query reads the file, so there is nothing to refresh() or mark_dirty(), and the aggregates can't drift.
+    Writes, save() and the queries that load objects hold the database lock, like the pickle backend.
+    There is no snapshot(): read views need the pickle backend (mvcc=True is rejected).
+    Created through Database(save_file, backend='sqlite').
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS batches (
+            name TEXT PRIMARY KEY,
+            data BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS students (
+            username TEXT PRIMARY KEY,
+            password TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            batch TEXT NOT NULL REFERENCES batches (name),
+            position INTEGER NOT NULL,
+            fee,
+            roll,
+            contact,
+            status INTEGER NOT NULL,
+            subjects BLOB
+        );
+        CREATE INDEX IF NOT EXISTS students_status ON students (status);
+        CREATE INDEX IF NOT EXISTS students_batch ON students (batch, position);
+        CREATE INDEX IF NOT EXISTS students_batch_status ON students (batch, status);
+        CREATE INDEX IF NOT EXISTS students_batch_roll ON students (batch, roll);
+        CREATE INDEX IF NOT EXISTS students_contact ON students (contact);
+        CREATE INDEX IF NOT EXISTS students_status_username ON students (status, username);
+        CREATE INDEX IF NOT EXISTS students_status_roll ON students (status, roll, username);
+        CREATE TABLE IF NOT EXISTS teachers (
+            username TEXT PRIMARY KEY,
+            password TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            contact,
+            salary,
+            status INTEGER NOT NULL,
+            join_date TEXT
+        );
+        CREATE INDEX IF NOT EXISTS teachers_status ON teachers (status);
+        CREATE INDEX IF NOT EXISTS teachers_status_username ON teachers (status, username);
+        CREATE TABLE IF NOT EXISTS attendance (
+            username TEXT NOT NULL REFERENCES students (username) ON DELETE CASCADE,
+            date TEXT NOT NULL,
+            present INTEGER NOT NULL,
+            PRIMARY KEY (username, date)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS tests (
+            username TEXT NOT NULL REFERENCES students (username) ON DELETE CASCADE,
+            subject TEXT NOT NULL,
+            name TEXT NOT NULL,
+            mark BLOB,
+            PRIMARY KEY (username, subject, name)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS assignments (
+            username TEXT NOT NULL REFERENCES students (username) ON DELETE CASCADE,
+            subject TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (username, subject, position)
+        ) WITHOUT ROWID;
+    """
+
+    STUDENT_COLUMNS = "username, password, first_name, last_name, batch, fee, roll, contact, subjects"
+    TEACHER_COLUMNS = "username, password, first_name, last_name, contact, salary, join_date"
+
+    def __init__(self, save_file='database.sqlite3', backend='sqlite'):
+        """
+        :param save_file: Path of the SQLite file
+        :param backend: Always 'sqlite'
+        """
+        self.save_file = save_file
+        self._connection = None
+        self._saver = None
+        self._lock = threading.RLock()  # The connection is shared by the threads (check_same_thread=False)
+        self._writer = None
+        self.journal = self.shared = self.mvcc = self.columns = False
+        self.load()
+
+    @synchronized
+    def load(self) -> bool:
+        """
+        Open the SQLite file (creating the tables if needed). Objects loaded before are forgotten.
+        :return: True if the file already existed
+        """
+        found = os.path.exists(self.save_file)
+        if self._connection is not None:
+            self._connection.close()
+        self._connection = sqlite3.connect(self.save_file, check_same_thread=False)
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        self._connection.executescript(self.SCHEMA)
+        self._students = weakref.WeakValueDictionary()  # Identity map: Dict[username: Student]
+        self._teachers = weakref.WeakValueDictionary()  # Identity map: Dict[username: Teacher]
+        self._batches = weakref.WeakValueDictionary()  # Identity map: Dict[batch_name: Batch]
+        self._pinned = {}  # Objects asked for by name since the last save, kept alive so that save() can write them back
+        self._saved = {}  # Dict[(kind, key): state of a loaded object as last read / written], see save()
+        self._position = self._connection.execute("SELECT COALESCE(MAX(position), 0) FROM students").fetchone()[0]
+        if not found:
+            print("...Initializing a new database.")
+        return found
+
+    @synchronized
+    def save(self, wait=True):
+        # Write back the loaded objects that changed since they were read (they may have been changed directly),
+        # then commit
+        for batch in list(self._batches.values()):
+            data = self.__pickle_batch(batch)
+            if data != self._saved.get(("batch", batch.name)):
+                self._connection.execute("UPDATE batches SET data = ? WHERE name = ?", (data, batch.name))
+                self._saved["batch", batch.name] = data
+        for teacher in list(self._teachers.values()):
+            row = self.__teacher_row(teacher)
+            if row != self._saved.get(("teacher", teacher.username)):
+                self._connection.execute(
+                    "UPDATE teachers SET password = ?, first_name = ?, last_name = ?, contact = ?, salary = ? "
+                    "WHERE username = ?", (*row, teacher.username))
+                self._saved["teacher", teacher.username] = row
+        for student in list(self._students.values()):
+            self.__sync_student(student)
+        self._connection.commit()
+        self._pinned = {}
+        # Forget the state of the objects that were garbage collected
+        loaded = {"batch": self._batches, "teacher": self._teachers, "student": self._students}
+        self._saved = {(kind, key): state for (kind, key), state in self._saved.items() if key in loaded[kind]}
+
+    def checkpoint(self):
+        self.save()
+
+    def close(self):
+        self._connection.close()
+
+    def refresh(self) -> bool:
+        # Every query reads the file: there is no in-memory copy to reload
+        return False
+
+    @contextlib.contextmanager
+    def _transaction(self, direct=False):
+        # Only serializes the threads, save() commits (there is no shared state to reload first)
+        with self._lock:
+            yield self
+
+    @property
+    def snapshot(self):
+        # Read views are a feature of the pickle backend (mvcc): hide the inherited method
+        raise AttributeError("'SQLiteDatabase' has no snapshot(), read views need the pickle backend.")
+
+    def mark_dirty(self, batch_name: str = None, teachers=False):
+        # save() writes back every loaded object that changed
+        pass
+
+    def verify_totals(self) -> bool:
+        # The aggregates are computed by SQL from the rows, there are no counters to check
+        return True
+
+    @synchronized
+    def reset(self):
+        print("trying to remove database file")
+        self._connection.close()
+        self._connection = None
+        for file in (self.save_file, self.save_file + '-wal', self.save_file + '-shm', self.save_file + '-journal'):
+            if os.path.exists(file):
+                os.remove(file)
+        self.load()
+
+    # Row <-> object conversion
+    @staticmethod
+    def __pickle_batch(batch) -> bytes:
+        without_students = copy.copy(batch)
+        without_students.students = Roster()
+        without_students.attendance = AttendanceStore()  # Stored in the attendance table
+        without_students.assignments = AssignmentStore()  # Stored in the assignments table
+        without_students.marks = MarkStore()  # Stored in the tests table
+        return pickle.dumps(without_students)
+
+    @staticmethod
+    def __subject_key(subject) -> str:
+        return subject.name if isinstance(subject, Subject) else str(subject)
+
+    def __next_position(self) -> int:
+        # Students of a batch are ordered by position, a new / moved student goes to the end
+        self._position += 1
+        return self._position
+
+    @staticmethod
+    def __teacher_row(teacher) -> tuple:
+        return teacher.getpassword(), teacher.first_name, teacher.last_name, teacher.contact, teacher.salary
+
+    @staticmethod
+    def __student_row(student) -> tuple:
+        # The students columns that save() writes
+        return (student.getpassword(), student.first_name, student.last_name, student.fee, student.roll,
+                student.contact, pickle.dumps(student.subjects_enrolled))
+
+    def __student_state(self, student) -> dict:
+        # The students row and the attendance, tests and assignments rows of a student
+        username = student.username
+        return {
+            "row": self.__student_row(student),
+            "attendance": [(username, attendance_date.isoformat(), bool(present))
+                           for attendance_date, present in student.view_attendance().items()],
+            "tests": [(username, self.__subject_key(subject), name, pickle.dumps(mark))
+                      for subject, tests in student.view_tests().items() for name, mark in tests.items()],
+            "assignments": [(username, self.__subject_key(subject), position, pickle.dumps(copy.copy(assignment)))
+                            for subject, assignments in student.view_assignments().items()
+                            for position, assignment in enumerate(assignments)],
+        }
+
+    def __sync_student(self, student, state: dict = None):
+        # Write the parts of a student that differ from its rows as last read / written
+        username = student.username
+        state = state or self.__student_state(student)
+        saved = self._saved.get(("student", username), {})
+        if state["row"] != saved.get("row"):
+            self._connection.execute(
+                "UPDATE students SET password = ?, first_name = ?, last_name = ?, fee = ?, roll = ?, contact = ?, "
+                "subjects = ? WHERE username = ?", (*state["row"], username))
+        for table, columns in (("attendance", "username, date, present"), ("tests", "username, subject, name, mark"),
+                               ("assignments", "username, subject, position, data")):
+            if state[table] != saved.get(table):
+                self._connection.execute(f"DELETE FROM {table} WHERE username = ?", (username,))
+                self._connection.executemany(
+                    f"INSERT OR REPLACE INTO {table} ({columns}) VALUES ({', '.join('?' * len(columns.split(', ')))})",
+                    state[table])
+        self._saved["student", username] = state
+
+    def __students_from_rows(self, rows) -> list[Student]:
+        """
+        Turn student rows into Student objects, reusing the ones already loaded.
+        Attendance, tests and assignments of the new objects are read with one query per table.
+        """
+        students = []
+        missing = {}
+        for row in rows:
+            student = self._students.get(row[0])
+            if student is None:
+                username, password, first_name, last_name, batch_name, fee, roll, contact, subjects = row
+                batch = self.__load_batch(batch_name)  # Loading the batch also loads its students
+                student = self._students.get(username)
+            if student is None:
+                student = Student(username, password, first_name, last_name, batch, fee, roll,
+                                  contact, subjects_enrolled=pickle.loads(subjects) if subjects else None)
+                missing[username] = student
+                self._students[username] = student
+            students.append(student)
+        if missing:
+            self.__load_student_details(missing)
+            for username, student in missing.items():
+                self._saved["student", username] = self.__student_state(student)
+        return students
+
+    def __load_student_details(self, students: dict):
+        usernames = list(students)
+        for start in range(0, len(usernames), 500):
+            chunk = usernames[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            for username, attendance_date, present in self._connection.execute(
+                    f"SELECT username, date, present FROM attendance WHERE username IN ({marks})", chunk):
+                students[username].view_attendance()[date.fromisoformat(attendance_date)] = bool(present)
+            subjects = {}
+            for username, subject, name, mark in self._connection.execute(
+                    f"SELECT username, subject, name, mark FROM tests WHERE username IN ({marks})", chunk):
+                student = students[username]
+                if username not in subjects:
+                    subjects[username] = {self.__subject_key(s): s for s in student.subjects_enrolled}
+                mark = pickle.loads(mark)
+                # Older versions kept a copy of the ClassTest until the test was marked
+                student.batch.marks.set_mark(subjects[username].get(subject, Subject(subject)), name, username,
+                                             mark.getmark() if isinstance(mark, ClassTest) else mark)
+            for username, subject, data in self._connection.execute(
+                    f"SELECT username, subject, data FROM assignments WHERE username IN ({marks}) "
+                    f"ORDER BY username, subject, position", chunk):
+                # Rows hold a standalone copy per student, the batch keeps one shared Assignment
+                students[username].batch.assignments.restore(pickle.loads(data), username)
+
+    def __teachers_from_rows(self, rows) -> list[Teacher]:
+        teachers = []
+        for row in rows:
+            teacher = self._teachers.get(row[0])
+            if teacher is None:
+                username, password, first_name, last_name, contact, salary, join_date = row
+                teacher = Teacher(username, password, first_name, last_name, contact, salary,
+                                  date.fromisoformat(join_date) if join_date else None)
+                self._teachers[username] = teacher
+                self._saved["teacher", username] = self.__teacher_row(teacher)
+            teachers.append(teacher)
+        return teachers
+
+    # Public API
+    @synchronized
+    def display_in_terminal(self):
+        print("Teachers:")
+        print('First Name', 'Last Name', 'Username', 'Password', 'Contact', 'Salary', 'Status')
+        for row in self._connection.execute(
+                "SELECT first_name, last_name, username, password, contact, salary, status FROM teachers"):
+            print(*row)
+        print("\nStudents:")
+        print('First Name', 'Last Name', 'Username', 'Password', 'Contact', 'Fee', 'Status')
+        for row in self._connection.execute(
+                "SELECT first_name, last_name, username, password, contact, fee, status FROM students"):
+            print(*row)
+        print("\nBatches:")
+        print('Batch Name', 'Students', 'Subjects')
+        for (name,) in self._connection.execute("SELECT name FROM batches ORDER BY rowid").fetchall():
+            batch = self.__load_batch(name)
+            print(batch.name, [i.username for i in batch.students], [i.name for i in batch.subjects])
+
+    def login(self, username, password, as_admin=False, as_teacher=False, as_student=False) -> bool:
+        if as_admin:
+            return True
+        for table, allowed in (("teachers", as_teacher), ("students", as_student)):
+            if allowed:
+                row = self._connection.execute(f"SELECT password FROM {table} WHERE username = ?",
+                                               (username,)).fetchone()
+                if row and row[0] == password:
+                    return True
+        return False
+
+    @transactional
+    def add_student(self, student, status=False):
+        """
+        Add a student to the database. Also add the student to the batch. (Assuming the batch is already present)
+        :param student:
+        :param status: Status of Student (True: Approved, False: Waiting for approval)
+        :return:
+        """
+        if self._connection.execute("SELECT 1 FROM students WHERE username = ?", (student.username,)).fetchone():
+            raise ValueError("Student already exists.")
+        batch = self.__load_batch(student.batch.name)
+        if batch is None:
+            raise ValueError("Batch not found.")
+        state = self.__student_state(student)
+        self._connection.execute(
+            "INSERT INTO students (password, first_name, last_name, fee, roll, contact, subjects, username, batch, "
+            "position, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (*state["row"], student.username, student.batch.name, self.__next_position(), bool(status)))
+        self._saved["student", student.username] = {"row": state["row"], "attendance": [], "tests": [],
+                                                    "assignments": []}
+        self.__sync_student(student, state)
+        self._students[student.username] = student
+        self._pinned["student", student.username] = student
+        if batch is not student.batch:
+            student.batch.move_records(student.username, batch)
+            student.batch = batch
+        batch.add_student(student)
+
+    @transactional
+    def add_teacher(self, teacher, status=False):
+        """
+        Add a teacher to the database.
+        :param teacher: Teacher object
+        :param status: Status of Teacher (True: Approved, False: Waiting for approval)
+        :return:
+        """
+        try:
+            self._connection.execute(
+                "INSERT INTO teachers (username, password, first_name, last_name, contact, salary, status, join_date)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (teacher.username, teacher.getpassword(), teacher.first_name, teacher.last_name, teacher.contact,
+                 teacher.salary, bool(status), teacher.join_date.isoformat() if teacher.join_date else None))
+        except sqlite3.IntegrityError:
+            raise ValueError("Teacher already exists.")
+        self._teachers[teacher.username] = teacher
+        self._saved["teacher", teacher.username] = self.__teacher_row(teacher)
+        self._pinned["teacher", teacher.username] = teacher
+
+    @transactional
+    def add_batch(self, batch):
+        """
+        Add a batch to the database.
+        :param batch: Batch object
+        :return:
+        """
+        data = self.__pickle_batch(batch)
+        try:
+            self._connection.execute("INSERT INTO batches (name, data) VALUES (?, ?)", (batch.name, data))
+        except sqlite3.IntegrityError:
+            raise ValueError("Batch already exists.")
+        self._batches[batch.name] = batch
+        self._saved["batch", batch.name] = data
+        for student in list(batch.students):
+            if self.get_student(student.username) is None:
+                batch.students.remove(student)
+
+    def __load_batch(self, batch_name: str) -> Batch | None:
+        batch = self._batches.get(batch_name)
+        if batch is not None:
+            return batch
+        row = self._connection.execute("SELECT data FROM batches WHERE name = ?", (batch_name,)).fetchone()
+        if row is None:
+            return None
+        batch = pickle.loads(row[0])
+        self._batches[batch_name] = batch
+        self._saved["batch", batch_name] = self.__pickle_batch(batch)
+        batch.students = Roster(self.__students_from_rows(self._connection.execute(
+            f"SELECT {self.STUDENT_COLUMNS} FROM students WHERE batch = ? ORDER BY position", (batch_name,))))
+        return batch
+
+    def __pin(self, kind: str, objects: list) -> list:
+        for obj in objects:
+            self._pinned[kind, obj.name if kind == "batch" else obj.username] = obj
+        return objects
+
+    @synchronized
+    def get_batch(self, batch_name: str) -> Batch | None:
+        """
+        Get the batch object from the database (with its students).
+        :param batch_name: Batch name
+        :return: Batch object
+        """
+        batch = self.__load_batch(batch_name)
+        if batch is not None:
+            self.__pin("batch", [batch])
+        return batch
+
+    @synchronized
+    def get_student(self, student_username: str) -> Student | None:
+        """
+        Get the student object from the database.
+        :param student_username: Student username
+        :return: Student object
+        """
+        student = self._students.get(student_username)
+        if student is None:
+            rows = self._connection.execute(f"SELECT {self.STUDENT_COLUMNS} FROM students WHERE username = ?",
+                                            (student_username,))
+            student = next(iter(self.__students_from_rows(rows)), None)
+        if student is not None:
+            self.__pin("student", [student])
+        return student
+
+    @synchronized
+    def get_teacher(self, teacher_username: str) -> Teacher | None:
+        """
+        Get the teacher object from the database.
+        :param teacher_username: Teacher username
+        :return: Teacher object
+        """
+        teachers = self.__teachers_from_rows(self._connection.execute(
+            f"SELECT {self.TEACHER_COLUMNS} FROM teachers WHERE username = ?", (teacher_username,)))
+        return self.__pin("teacher", teachers)[0] if teachers else None
+
+    @synchronized
+    def get_all_teachers(self, status=True) -> list[Teacher]:
+        return self.__teachers_from_rows(self._connection.execute(
+            f"SELECT {self.TEACHER_COLUMNS} FROM teachers WHERE status = ? ORDER BY rowid", (bool(status),)))
+
+    @synchronized
+    def get_all_students(self, status=True) -> list[Student]:
+        return self.__students_from_rows(self._connection.execute(
+            f"SELECT {self.STUDENT_COLUMNS} FROM students WHERE status = ? ORDER BY rowid", (bool(status),)))
+
+    def export_rows(self, kind: str, columns=None, status=None, batch_name: str = None):
+        # The rows come straight from a cursor over the table
+        columns = self._export_columns(kind, columns, batch_name)
+        conditions, values = [], []
+        if status is not None:
+            conditions.append("status = ?")
+            values.append(bool(status))
+        if batch_name is not None:
+            conditions.append("batch = ?")
+            values.append(batch_name)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        cursor = self._connection.execute(f"SELECT {', '.join(columns)} FROM {kind} {where}ORDER BY rowid", values)
+        flags = [column == "status" for column in columns]
+        return (tuple(bool(value) if flag else value for value, flag in zip(row, flags)) for row in cursor)
+
+    @synchronized
+    def page(self, kind: str, status=True, order_by: str = "username", size: int = 20, after: str = None,
+             before: str = None) -> dict:
+        # Keyset pagination on the (status, field, username) SQLite indexes (in SQLite order: numbers before text)
+        if order_by not in self.PAGE_KEYS.get(kind, ()):
+            raise ValueError(f"Can't page {kind!r} by {order_by!r}.")
+        if size < 1:
+            raise ValueError("The page size must be positive.")
+        fields = ("username",) if order_by == "username" else (order_by, "username")
+        columns = self.STUDENT_COLUMNS if kind == "students" else self.TEACHER_COLUMNS
+        position = columns.split(", ").index(order_by)
+        cursor = before if before is not None else after
+        cursor = decode_cursor(cursor, sort_value=False) if cursor is not None else None
+
+        def select(selected, comparison=None, descending=False, limit=size + 1):
+            # Rows on one side of the cursor, nearest first
+            condition, values = "", []
+            if comparison:
+                condition = f" AND ({', '.join(fields)}) {comparison} ({', '.join('?' * len(fields))})"
+                values = list(cursor)[-len(fields):]
+            direction = " DESC" if descending else ""
+            return self._connection.execute(
+                f"SELECT {selected} FROM {kind} WHERE status = ?{condition} "
+                f"ORDER BY {', '.join(field + direction for field in fields)} LIMIT ?",
+                [bool(status), *values, limit]).fetchall()
+
+        if before is not None:
+            rows = select(columns, "<", descending=True)
+            more_before, more_after = len(rows) > size, bool(select("1", ">=", limit=1))
+            rows = rows[:size][::-1]
+        else:
+            rows = select(columns, ">" if after is not None else None)
+            more_after, more_before = len(rows) > size, after is not None and bool(select("1", "<=", limit=1))
+            rows = rows[:size]
+        items = self.__students_from_rows(rows) if kind == "students" else self.__teachers_from_rows(rows)
+        return {"items": items,
+                "next": encode_cursor((rows[-1][position], rows[-1][0])) if rows and more_after else None,
+                "prev": encode_cursor((rows[0][position], rows[0][0])) if rows and more_before else None}
+
+    @synchronized
+    def find_students(self, index: str, *key) -> list[Student]:
+        # The STUDENT_INDEXES fields are students columns, each index has a matching SQLite index
+        if index not in self.STUDENT_INDEXES:
+            raise ValueError(f"Unknown index {index!r}.")
+        fields = self.STUDENT_INDEXES[index]
+        values = [bool(value) if field == "status" else value for field, value in zip(fields, key)]
+        return self.__students_from_rows(self._connection.execute(
+            f"SELECT {self.STUDENT_COLUMNS} FROM students WHERE {' AND '.join(f'{field} = ?' for field in fields)} "
+            f"ORDER BY rowid", values))
+
+    def get_total_salary(self, status=True) -> int:
+        return self._connection.execute("SELECT COALESCE(SUM(salary), 0) FROM teachers WHERE status = ?",
+                                        (bool(status),)).fetchone()[0]
+
+    def get_total_fees(self, status=True) -> int:
+        return self._connection.execute("SELECT COALESCE(SUM(fee), 0) FROM students WHERE status = ?",
+                                        (bool(status),)).fetchone()[0]
+
+    def get_student_count(self, status=None) -> int:
+        if status is not None:
+            return self._connection.execute("SELECT COUNT(*) FROM students WHERE status = ?",
+                                            (bool(status),)).fetchone()[0]
+        return self._connection.execute("SELECT COUNT(*) FROM students").fetchone()[0]
+
+    @synchronized
+    def import_students(self, source, file_format: str = None, status=False, chunk_size=1000,
+                        max_errors=100) -> dict:
+        report = {"rows": 0, "imported": 0, "failed": 0, "errors": []}
+        file, file_format = _open_import(source, file_format)
+        with file as f:
+            students = _import_students(_import_rows(f, file_format), self.get_batch, status, report, max_errors)
+            for chunk in _chunks(students, chunk_size):
+                for line_number, student, student_status in chunk:
+                    try:
+                        self.add_student(student, student_status)
+                        report["imported"] += 1
+                    except ValueError as error:
+                        _import_error(report, line_number, error, max_errors)
+        self.save()  # One commit for the whole import
+        return report
+
+    def get_fees_by_batch(self, status=True) -> dict:
+        return self.__by_batch("COALESCE(SUM(students.fee), 0)", status)
+
+    def get_student_count_by_batch(self, status=None) -> dict:
+        return self.__by_batch("COUNT(students.username)", status)
+
+    def __by_batch(self, aggregate: str, status) -> dict:
+        condition = "" if status is None else " AND students.status = ?"
+        return dict(self._connection.execute(
+            f"SELECT batches.name, {aggregate} FROM batches LEFT JOIN students ON students.batch = batches.name"
+            f"{condition} GROUP BY batches.name ORDER BY batches.rowid", () if status is None else (bool(status),)))
+
+    def get_test_statistics(self, subject: Subject = None, test_name: str = None, percentiles=(25, 50, 75),
+                            bins=10) -> dict:
+        return {name: self.get_batch(name).marks.statistics(subject, test_name, percentiles, bins)
+                for name, in self._connection.execute("SELECT name FROM batches ORDER BY rowid").fetchall()}
+
+    def get_teacher_count(self, status=None) -> int:
+        if status is not None:
+            return self._connection.execute("SELECT COUNT(*) FROM teachers WHERE status = ?",
+                                            (bool(status),)).fetchone()[0]
+        return self._connection.execute("SELECT COUNT(*) FROM teachers").fetchone()[0]
+
+    @transactional
+    def update_student(self, student_username: str, password=None, first_name=None, last_name=None,
+                       batch: Batch = None, fee=None, contact=None, roll=None, status=None):
+        """
+        Update the student details in the database. (Only the ones that are defined at login)
+        :param batch: Batch of the Student (Optional) (Removes student from current batch and adds to new batch)
+        :param student_username: Student username
+        :param password: Password of the student (Optional)
+        :param first_name: First name of the student (Optional)
+        :param last_name: Last name of the student (Optional)
+        :param fee: Fee of student
+        :param contact: Contact of student
+        :param roll: Roll of student
+        :param status: Status of Student (True: Approved, False: Waiting for approval)
+        :return:
+        """
+        student = self.get_student(student_username)
+        if student is None:
+            raise ValueError("Student not found.")
+        new_batch = self.__load_batch(batch.name) if batch else None
+        if batch and new_batch is None:
+            raise ValueError("Batch not found.")
+
+        changes = {}
+        if password:
+            student.setpassword(password)
+            changes["password"] = password
+        for column, value in (("first_name", first_name), ("last_name", last_name), ("fee", fee),
+                              ("contact", contact), ("roll", roll)):
+            if value:
+                setattr(student, column, value)
+                changes[column] = value
+        if status:
+            changes["status"] = bool(status)
+        if batch:
+            old_batch = self.__load_batch(student.batch.name)
+            old_batch.students.move(student, new_batch.students)
+            old_batch.move_records(student_username, new_batch)
+            student.batch = new_batch
+            changes["batch"] = batch.name
+            changes["position"] = self.__next_position()
+        if changes:
+            self._connection.execute(
+                f"UPDATE students SET {', '.join(f'{column} = ?' for column in changes)} WHERE username = ?",
+                (*changes.values(), student_username))
+            self._saved.setdefault(("student", student_username), {})["row"] = self.__student_row(student)
+
+    @transactional
+    def update_teacher(self, teacher_username: str,
+                       password: str = None,
+                       first_name: str = None,
+                       last_name: str = None,
+                       contact: str = None,
+                       salary: str = None,
+                       status: bool = None, ):
+        """
+        Update the teacher details in the database.
+        :param teacher_username: Teacher username (current)
+        :param password: Password of the teacher (Optional)
+        :param first_name: First name of the teacher (Optional)
+        :param last_name: Last name of the teacher (Optional)
+        :param contact: Contact of the teacher (Optional)
+        :param salary: Salary of Teacher (Optional)
+        :param status: Status of Teacher (Optional)(True: Approved, False: Waiting for approval)
+        :return:
+        """
+        teacher = self.get_teacher(teacher_username)
+        if teacher is None:
+            raise ValueError("Teacher not found.")
+
+        changes = {}
+        if password:
+            teacher.setpassword(password)
+            changes["password"] = password
+        for column, value in (("first_name", first_name), ("last_name", last_name), ("contact", contact),
+                              ("salary", salary)):
+            if value:
+                setattr(teacher, column, value)
+                changes[column] = value
+        if status:
+            changes["status"] = bool(status)
+        if changes:
+            self._connection.execute(
+                f"UPDATE teachers SET {', '.join(f'{column} = ?' for column in changes)} WHERE username = ?",
+                (*changes.values(), teacher_username))
+            self._saved["teacher", teacher_username] = self.__teacher_row(teacher)
+
+    @transactional
+    def update_batch(self, batch_name: str, students=None, subjects=None):
+        """
+        Update the batch details in the database.
+        Students of the list that are in the database are moved to the batch (in the order of the list).
+        :param batch_name: Batch name
+        :param students: List of students in the batch (Optional)
+        :param subjects: List of subjects in the batch (Optional)
+        :return:
+        """
+        batch = self.__load_batch(batch_name)
+        if batch is None:
+            raise ValueError("Batch not found.")
+        if students:
+            for student in students:
+                self._connection.execute("UPDATE students SET batch = ?, position = ? WHERE username = ?",
+                                         (batch_name, self.__next_position(), student.username))
+            batch.students = Roster(students)
+        if subjects:
+            batch.subjects = subjects
+        data = self._saved["batch", batch_name] = self.__pickle_batch(batch)
+        self._connection.execute("UPDATE batches SET data = ? WHERE name = ?", (data, batch_name))
+
+    @transactional
+    def remove_teacher(self, teacher_username: str):
+        if not self._connection.execute("DELETE FROM teachers WHERE username = ?", (teacher_username,)).rowcount:
+            raise ValueError("Teacher not found.")
+        self._teachers.pop(teacher_username, None)
+        self._pinned.pop(("teacher", teacher_username), None)
+        self._saved.pop(("teacher", teacher_username), None)
+
+    @transactional
+    def remove_student(self, student_username: str):
+        student = self.get_student(student_username)
+        if student is None:
+            raise ValueError("Student not found.")
+        self._connection.execute("DELETE FROM students WHERE username = ?", (student_username,))
+        self._students.pop(student_username, None)
+        self._pinned.pop(("student", student_username), None)
+        self._saved.pop(("student", student_username), None)
+        batch = self._batches.get(student.batch.name)
+        if batch is not None and student in batch.students:
+            batch.students.remove(student)
+        student.batch.remove_records(student_username)